@@ -1,7 +1,6 @@
 import os
 
 from apiflask import APIFlask
-from flask import send_from_directory
 
 from .auth import bp as auth_bp
 from .causes import bp as causes_bp
@@ -9,7 +8,10 @@ from .initiatives import bp as initiatives_bp
 from .initiatives import bp as initiatives_bp
 from .plan import bp as plan_bp
 from .problems import bp as problems_bp
+from .search import bp as search_bp
 from .commons import bp as common_bp
+from .commons import query_profiler
+from .commons.file_serving import send_upload
 
 app = APIFlask(__name__, template_folder="auth/templates/")
 
@@ -18,17 +20,21 @@ app.register_blueprint(problems_bp)
 app.register_blueprint(causes_bp)
 app.register_blueprint(initiatives_bp)
 app.register_blueprint(plan_bp)
+app.register_blueprint(search_bp)
 
 app.register_blueprint(common_bp)
 
 from . import commands
+from .commons import tasks as commons_tasks
 
 app.config.from_object("config.DevelopmentConfig")
 
-UPLOAD_FOLDER = os.path.join(os.getcwd(), "uploads")
+UPLOAD_FOLDER = os.getenv("UPLOAD_FILE_PATH") or os.path.join(os.getcwd(), "uploads")
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 
+query_profiler.init_app(app)
+
 
 @app.route('/uploads/<filename>')
 def serve_uploaded_file(filename):
-    return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+    return send_upload(filename)
@@ -20,3 +20,9 @@ class TokenUsedOrExpiredError(HTTPError):
     status_code = HTTPStatus.UNAUTHORIZED
     message = "Token used or expired"
     extra_data = dict()
+
+
+class InvalidCursorError(HTTPError):
+    status_code = HTTPStatus.BAD_REQUEST
+    message = "Invalid pagination cursor"
+    extra_data = dict()
@@ -1,6 +1,6 @@
 from datetime import datetime
 
-from sqlalchemy import Column, Integer, String, DateTime, Boolean
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, Index, func
 
 from db import db
 
@@ -17,3 +17,13 @@ class UserModel(db.Model):
     is_admin = Column(Boolean(), default=False)
 
     created_at = Column(DateTime(), default=datetime.utcnow)
+
+
+# lowercase "email name last_name", list_users matches it with LIKE and the trigram index serves unanchored patterns
+USER_SEARCH_TEXT = func.lower(UserModel.email + " " + UserModel.name + " " + UserModel.last_name)
+Index(
+    "ix_users_search_trgm",
+    USER_SEARCH_TEXT.label("search_text"),
+    postgresql_using="gin",
+    postgresql_ops={"search_text": "gin_trgm_ops"},
+)
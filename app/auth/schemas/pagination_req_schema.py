@@ -1,3 +1,5 @@
+from marshmallow import fields, validate
+
 from app.commons.schemas.request import PaginationReqSchema, get_orderable_schema, SearchReqSchema
 
 
@@ -6,4 +8,10 @@ class UserListRequestSchema(
     SearchReqSchema,
     get_orderable_schema(["id", "name", "last_name", "email", "is_active"])
 ):
-    pass
+    # opaque `nextCursor` of the previous page, replaces `page` to continue the listing without an OFFSET
+    cursor = fields.String(required=False, allow_none=True)
+    count_mode = fields.String(
+        data_key="count_mode",
+        load_default="exact",
+        validate=[validate.OneOf(["exact", "approximate", "none"])]
+    )
@@ -1,4 +1,6 @@
+import base64
 import datetime
+import json
 import math
 from functools import wraps
 from typing import Dict, List, Optional
@@ -6,13 +8,15 @@ from typing import Dict, List, Optional
 import bcrypt
 import jwt
 from flask import request, jsonify
-from sqlalchemy import select, Row, update, exists, desc, asc, func
+from sqlalchemy import select, Row, update, exists, desc, asc, func, false, tuple_
 
-from app.auth.errors import IncorrectPasswordError, RepeatedPasswordError, TokenUsedOrExpiredError
+from app.auth.errors import IncorrectPasswordError, RepeatedPasswordError, TokenUsedOrExpiredError, \
+    InvalidCursorError
 from app.auth.models.recovery_password_model import JWTBlackList
-from app.auth.models.user_model import UserModel
+from app.auth.models.user_model import UserModel, USER_SEARCH_TEXT
 from app.auth.utils import decode_jwt_token
 from app.commons.dto.pagination import PaginationResponse
+from app.commons.sqlalchemy_utils import estimate_count
 from db import db
 
 
@@ -84,38 +88,89 @@ def login_user(schema: Dict):
         }
 
 
+USER_SORT_COLUMNS = {
+    "id": UserModel.id,
+    "name": UserModel.name,
+    "last_name": UserModel.last_name,
+    "email": UserModel.email,
+    "is_active": func.coalesce(UserModel.is_active, false()),
+}
+
+
+def escape_like(term: str) -> str:
+    return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def encode_cursor(sort_value, user_id: int) -> str:
+    return base64.urlsafe_b64encode(json.dumps([sort_value, user_id]).encode()).decode()
+
+
+def decode_cursor(cursor: str):
+    try:
+        sort_value, user_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        raise InvalidCursorError
+    if not isinstance(user_id, int):
+        raise InvalidCursorError
+    return sort_value, user_id
+
+
 def list_users(schema: Dict):
+    """
+    Users matching `search` in the email, name or last name, case-insensitive. With a `cursor` the page starts
+    after the last user of the previous one instead of at an OFFSET. `count_mode` chooses between an exact count,
+    the planner estimate or no count at all.
+    """
+    sort_column = USER_SORT_COLUMNS[schema["order_field"]]
     select_stmt = select(
         UserModel.id,
         UserModel.email,
         UserModel.name,
         UserModel.last_name,
-        UserModel.is_active
+        UserModel.is_active,
+        sort_column.label("sort_value"),
     )
 
     if schema.get("search"):
-        select_stmt = select_stmt.where(
-            (UserModel.email.like(f"%{schema['search']}%")) |
-            (UserModel.name.like(f"%{schema['search']}%")) |
-            (UserModel.last_name.like(f"%{schema['search']}%"))
-        )
-
-    total_items = db.session.execute(select(func.count("*")).select_from(select_stmt)).scalar()
-    total_pages = math.ceil(total_items / schema["page_size"])
-
+        pattern = f"%{escape_like(schema['search'].strip().lower())}%"
+        select_stmt = select_stmt.where(USER_SEARCH_TEXT.like(pattern, escape="\\"))
+
+    count_mode = schema.get("count_mode", "exact")
+    if count_mode == "exact":
+        total_items = db.session.execute(select(func.count()).select_from(select_stmt.subquery())).scalar()
+    elif count_mode == "approximate":
+        total_items = estimate_count(select_stmt)
+    else:
+        total_items = None
+    total_pages = math.ceil(total_items / schema["page_size"]) if total_items is not None else None
+
+    # the id makes the order total, so the cursor of the last row points to a single position
     sort_method = asc if schema["sort_type"] == "asc" else desc
-    select_stmt = select_stmt.order_by(sort_method(schema["order_field"]))
+    select_stmt = select_stmt.order_by(sort_method(sort_column), sort_method(UserModel.id))
+    if schema.get("cursor"):
+        sort_value, user_id = decode_cursor(schema["cursor"])
+        after_cursor = tuple_(sort_column, UserModel.id) > tuple_(sort_value, user_id)
+        if schema["sort_type"] == "desc":
+            after_cursor = tuple_(sort_column, UserModel.id) < tuple_(sort_value, user_id)
+        select_stmt = select_stmt.where(after_cursor)
+    else:
+        select_stmt = select_stmt.offset((schema["page"] - 1) * schema["page_size"])
     select_stmt = select_stmt.limit(schema["page_size"])
-    select_stmt = select_stmt.offset((schema["page"] - 1) * schema["page_size"])
 
     user_model_row_ls: List[Row] = db.session.execute(select_stmt).all()
     cols = ["id", "email", "name", "lastName", "isActive"]
-    results = [dict(zip(cols, item.tuple())) for item in user_model_row_ls]
+    results = [dict(zip(cols, item.tuple()[:len(cols)])) for item in user_model_row_ls]
+
+    next_cursor = None
+    if len(user_model_row_ls) == schema["page_size"]:
+        last_row = user_model_row_ls[-1]
+        next_cursor = encode_cursor(last_row.sort_value, last_row.id)
 
     return PaginationResponse(
         total_items=total_items,
         total_pages=total_pages,
-        results=results
+        results=results,
+        next_cursor=next_cursor,
     )
 
 
@@ -1,6 +1,6 @@
 from typing import Optional
 
-from sqlalchemy import Column, Integer, ForeignKey, Boolean, select, exists, update
+from sqlalchemy import Column, Integer, ForeignKey, Boolean, select, exists, update, Index
 from sqlalchemy.orm import Mapped, relationship
 from sqlalchemy.sql import expression
 
@@ -17,6 +17,11 @@ class CauseAndProblemAssociation(db.Model):
     problem: Mapped["ProblemModel"] = relationship(back_populates="associated_causes")
     prioritized = Column(Boolean(), nullable=False, default=expression.false())
 
+    __table_args__ = (
+        Index("ix_cause_problem_association_cause_problem", "cause_id", "problem_id"),
+        Index("ix_cause_problem_association_problem", "problem_id"),
+    )
+
     @staticmethod
     def check_exist(cause_id, problem_id) -> bool:
         query = select(
@@ -2,7 +2,6 @@ from http import HTTPStatus
 from typing import Dict
 
 from apiflask import HTTPError, abort
-from flask import current_app
 
 from app.auth.auth_config import auth_token
 from app.causes import bp
@@ -55,8 +54,7 @@ def list_cause_indicators_controller(cause_id):
 @bp.input(CreateCustomCauseRequestSchema, location="files")
 @bp.auth_required(auth_token)
 def post_custom_causes(body: Dict):
-    path = current_app.config["UPLOAD_FOLDER"]
-    custom_cause_obj = services.create_custom_cause(body, path, auth_token.current_user["id"])
+    custom_cause_obj = services.create_custom_cause(body, auth_token.current_user["id"])
     return {
         "code": HTTPStatus.OK,
         "message": "Cause registered.",
@@ -68,8 +66,7 @@ def post_custom_causes(body: Dict):
 @bp.input(UpdateCustomCauseSchema, location="files")
 @bp.auth_required(auth_token)
 def update_custom_cause_controller(cause_id, body):
-    path = current_app.config["UPLOAD_FOLDER"]
-    services.update_custom_cause(cause_id, body, path)
+    services.update_custom_cause(cause_id, body)
     return {
         "code": HTTPStatus.OK,
         "message": "Cause updated"
@@ -1,14 +1,18 @@
+import os
 from datetime import datetime, timezone
 from enum import Enum
 from typing import List
 
 from dateutil.relativedelta import relativedelta
 from flask import url_for
-from sqlalchemy import Column, String, Integer, ForeignKey, JSON, ARRAY, DateTime, REAL, exists, select
+from sqlalchemy import Column, String, Integer, ForeignKey, JSON, ARRAY, DateTime, REAL, BigInteger, exists, select, \
+    Index
 from sqlalchemy.orm import relationship, Mapped
 
 from app.auth.models.user_model import UserModel
 from app.cause_problem_association.models import CauseAndProblemAssociation
+from app.commons.repositories.annex_metadata_repo import get_annex_previews
+from app.commons.sqlalchemy_utils import search_vector_index, trigram_index
 from app.constants import format_data_characteristics
 from db import db
 
@@ -37,6 +41,11 @@ class CauseModel(db.Model):
     )
 
 
+CAUSE_SEARCH_COLUMNS = [(CauseModel.name, "A"), (CauseModel.justification, "B")]
+search_vector_index("ix_cause_search_vector", *CAUSE_SEARCH_COLUMNS)
+trigram_index("ix_cause_name_trgm", CauseModel.name)
+
+
 class CustomCauseModel(CauseModel):
     __tablename__ = "custom_cause"
     __mapper_args__ = {
@@ -61,10 +70,12 @@ class CustomCauseModel(CauseModel):
 
     def to_dict(self):
         problem_list = [problem.id for problem in self.problems]
+        annex_previews = get_annex_previews(annex.path for annex in self.annexes)
         annexes_list = [{
             "id": annex.id,
             "fileName": annex.annexes_name,
-            "url": url_for("serve_uploaded_file", filename=annex.annexes_name, _external=True)
+            "url": url_for("serve_uploaded_file", filename=os.path.basename(annex.path), _external=True),
+            "preview": annex_previews.get(os.path.basename(annex.path)),
         } for annex in self.annexes]
 
         return {
@@ -92,6 +103,10 @@ class CustomCauseModel(CauseModel):
         }
 
 
+CUSTOM_CAUSE_SEARCH_COLUMNS = [(CustomCauseModel.evidences, "C")]
+search_vector_index("ix_custom_cause_search_vector", *CUSTOM_CAUSE_SEARCH_COLUMNS)
+
+
 class DefaultCauseModel(CauseModel):
     __tablename__ = "default_cause"
     __mapper_args__ = {
@@ -125,6 +140,10 @@ class CauseIndicatorModel(db.Model):
     measurement_unit = Column(String(), nullable=False)
     polarity = Column(String(), nullable=True)
 
+    __table_args__ = (
+        Index("ix_cause_indicator_cause", "cause_id"),
+    )
+
     def to_dict(self):
         return dict(
             id=self.id,
@@ -220,6 +239,13 @@ class CauseIndicatorDataModel(db.Model):
         }
 
 
+CAUSE_INDICATOR_LOAD_PROFILES = {
+    "kpi": ("trend", "trend_data", "concentration"),
+    # period backs the updated_at of trend_range read by the plan pdf
+    "export": ("period", "trend", "trend_data"),
+}
+
+
 class AnnexModel(db.Model):
     __tablename__ = "annex_model"
 
@@ -227,6 +253,8 @@ class AnnexModel(db.Model):
     annexes_name = Column(String(100), nullable=True)
     custom_cause_id = Column(ForeignKey(CustomCauseModel.__tablename__ + ".id"))
     path = Column(String(255), nullable=True)
+    sha256 = Column(String(64), nullable=True)
+    size = Column(BigInteger(), nullable=True)
     date = Column(DateTime, default=datetime.utcnow, nullable=False)
 
     def to_json(self):
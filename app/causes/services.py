@@ -1,4 +1,3 @@
-import os
 from http import HTTPStatus
 from typing import Optional, Dict, List
 
@@ -12,6 +11,9 @@ from app.causes.dto import CauseProblemPrioritizationDTO, CauseSummaryDTO, Updat
 from app.causes.models import DefaultCauseModel, CauseModel, CustomCauseModel, CauseIndicatorModel, \
     CauseIndicatorDataModel, AnnexModel
 from app.causes.repositories import count_causes, count_prioritized_causes, count_associated_causes
+from app.commons.storage import stage_upload
+from app.initiatives.models import InitiativeCauseAssociationModel
+from app.initiatives.repositories import refresh_initiative_coverage
 from app.problems.models import ProblemModel
 from db import db
 
@@ -46,7 +48,6 @@ def list_cause_indicators(
 
 def create_custom_cause(
         custom_cause: Dict,
-        path,
         user_id: int
 ):
     try:
@@ -67,12 +68,13 @@ def create_custom_cause(
             ))
 
         for annex_file in custom_cause.get("annexes", []):
-            filename = secure_filename(annex_file.filename)
-            annex_file.save(filepath := os.path.join(path, filename))
+            stored_file = stage_upload(annex_file)
             db.session.add(AnnexModel(
-                annexes_name=filename,
+                annexes_name=secure_filename(annex_file.filename),
                 custom_cause_id=custom_cause_obj.id,
-                path=filepath
+                path=stored_file.key,
+                sha256=stored_file.sha256,
+                size=stored_file.size,
             ))
 
         db.session.commit()
@@ -85,7 +87,6 @@ def create_custom_cause(
 def update_custom_cause(
         cause_id,
         custom_cause: Dict,
-        path
 ):
     try:
         custom_cause_obj = db.session.execute(
@@ -121,17 +122,23 @@ def update_custom_cause(
                 cause_id=custom_cause_obj.id,
                 problem_id=problem_id,
             ))
+        db.session.flush()
+        refresh_initiative_coverage(
+            select(InitiativeCauseAssociationModel.initiative_id)
+            .where(InitiativeCauseAssociationModel.cause_id == cause_id)
+        )
 
         for annex_id in custom_cause.get("annexes_to_remove", []):
             db.session.execute(delete(AnnexModel).where(AnnexModel.id == annex_id))
 
         for annex_file in custom_cause.get("annexes_to_add", []):
-            filename = secure_filename(annex_file.filename)
-            annex_file.save(filepath := os.path.join(path, filename))
+            stored_file = stage_upload(annex_file)
             db.session.add(AnnexModel(
-                annexes_name=filename,
+                annexes_name=secure_filename(annex_file.filename),
                 custom_cause_id=custom_cause_obj.id,
-                path=filepath
+                path=stored_file.key,
+                sha256=stored_file.sha256,
+                size=stored_file.size,
             ))
 
         db.session.commit()
@@ -147,6 +154,10 @@ def delete_custom_cause(
         db.session.execute(delete(AnnexModel).where(AnnexModel.custom_cause_id == cause_id))
         db.session.execute(delete(CustomCauseModel).where(CustomCauseModel.id == cause_id))
         db.session.execute(delete(CauseAndProblemAssociation).where(CauseAndProblemAssociation.cause_id == cause_id))
+        refresh_initiative_coverage(
+            select(InitiativeCauseAssociationModel.initiative_id)
+            .where(InitiativeCauseAssociationModel.cause_id == cause_id)
+        )
         db.session.execute(delete(CauseModel).where(CauseModel.id == cause_id))
         db.session.commit()
     except Exception:
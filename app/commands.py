@@ -1,8 +1,9 @@
 import csv
+from datetime import timedelta
 from typing import List, Optional
 
 import click
-from sqlalchemy import select, delete
+from sqlalchemy import select, delete, text
 
 from app import app
 from app.auth.models.user_model import UserModel
@@ -12,11 +13,18 @@ from app.cause_problem_association.models import CauseAndProblemAssociation
 from app.causes.models import DefaultCauseModel, CauseIndicatorModel
 from app.commons.models.municipal_department_model import MunicipalDepartmentModel
 from app.commons.models.neighborhood_model import NeighborhoodModel
+from app.commons.sqlalchemy_utils import CREATE_TRIGRAM_EXTENSION
+from app.commons.storage import get_storage
+from app.commons.upload_gc import collect_orphaned_uploads
 from app.initiatives.models import InitiativeModel, InitiativeCauseProblemAssociationModel, InitiativeOutcomeModel, \
     InitiativeOutcomeAssociationModel
+from app.initiatives import repositories as initiative_repositories
+from app.initiatives.queries import Queries
 from app.plan.models import MacroObjectiveModel, MacroObjectiveProblemAssociationModel, FocusModel, \
     FocusAssociationModel
+from app.problems import repositories as problem_repositories
 from app.problems.models import ProblemModel
+from app.problems.queries import Queries as ProblemQueries
 from db import db
 
 cost_level_dict = dict(
@@ -345,6 +353,50 @@ def load_focuses():
         db.session.commit()
 
 
+@app.cli.command("refresh_problem_ranking")
+def refresh_problem_ranking():
+    """Rebuild the problem ranking, run it after loading problem indicator data."""
+    problem_repositories.refresh_problem_ranking()
+    db.session.commit()
+
+
+@app.cli.command("refresh_initiative_coverage")
+def refresh_initiative_coverage():
+    """Rebuild the macro objective and focus coverage of every initiative, run it after loading plan data."""
+    initiative_repositories.refresh_initiative_coverage()
+    db.session.commit()
+
+
+@app.cli.command("create_views")
+def create_views():
+    """
+    Create or replace the database views and triggers, run it after `flask db upgrade` (migrations don't track
+    them).
+    """
+    db.session.execute(text(CREATE_TRIGRAM_EXTENSION))
+    db.session.execute(text(Queries.INITIATIVE_EFFECTIVE_ASSOCIATION_VIEW))
+    db.session.execute(text(ProblemQueries.REFRESH_PROBLEM_RANKING_FUNCTION))
+    db.session.execute(text(ProblemQueries.REFRESH_PROBLEM_RANKING_TRIGGERS))
+    db.session.commit()
+
+
+@app.cli.command("gc_uploads")
+@click.option("--dry-run", is_flag=True, help="Only report what would be removed.")
+@click.option("--quarantine/--delete", default=None, help="Move orphaned files aside instead of deleting them.")
+@click.option("--grace-hours", type=float, default=None, help="Keep files younger than this, UPLOADS_GC_GRACE_HOURS.")
+def gc_uploads(dry_run, quarantine, grace_hours):
+    """Remove uploaded files that are no longer referenced by any annex."""
+    report = collect_orphaned_uploads(
+        get_storage(),
+        grace_period=timedelta(hours=app.config["UPLOADS_GC_GRACE_HOURS"] if grace_hours is None else grace_hours),
+        quarantine=app.config["UPLOADS_GC_QUARANTINE"] if quarantine is None else quarantine,
+        dry_run=dry_run,
+    )
+    for key, value in report.to_dict().items():
+        click.echo(f"{key}: {value}")
+    click.echo(f"reclaimed: {report.reclaimed_bytes / 1024 / 1024:.2f} MiB")
+
+
 @app.cli.command("create_admin_user")
 def create_admin_user():
     email = input("email: ")
@@ -376,3 +428,5 @@ def load_data(ctx):
     ctx.invoke(load_initiatives)
     ctx.invoke(load_macro)
     ctx.invoke(load_focuses)
+    ctx.invoke(refresh_problem_ranking)
+    ctx.invoke(refresh_initiative_coverage)
@@ -0,0 +1,140 @@
+import io
+import mimetypes
+import os
+import re
+import zipfile
+from typing import Optional, Tuple
+from xml.etree import ElementTree
+
+try:
+    from pypdf import PdfReader
+except ImportError:  # pdf page count and text are skipped
+    PdfReader = None
+
+try:
+    from PIL import Image
+except ImportError:  # thumbnails are skipped
+    Image = None
+
+MAX_TEXT_LENGTH = 1_000_000
+# uncompressed size of an office package part, the markup is much bigger than its text
+MAX_OFFICE_PART_SIZE = 20 * 1024 * 1024
+THUMBNAIL_SIZE = (320, 320)
+
+FILE_SIGNATURES = [
+    (b"%PDF-", "application/pdf"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+]
+
+# parts of the office open xml packages with the document text
+OFFICE_TEXT_PARTS = {
+    ".docx": re.compile(r"^word/document\.xml$"),
+    ".xlsx": re.compile(r"^xl/sharedStrings\.xml$"),
+    ".pptx": re.compile(r"^ppt/slides/slide\d+\.xml$"),
+}
+TEXT_MIME_TYPES = {"text/plain", "text/csv"}
+
+
+def detect_mime_type(file_path: str, key: str) -> str:
+    with open(file_path, "rb") as file:
+        header = file.read(16)
+    for signature, mime_type in FILE_SIGNATURES:
+        if header.startswith(signature):
+            return mime_type
+    return mimetypes.guess_type(key)[0] or "application/octet-stream"
+
+
+def _xml_text(data: bytes) -> str:
+    return " ".join(text.strip() for text in ElementTree.fromstring(data).itertext() if text.strip())
+
+
+def _pdf_content(file_path: str) -> Tuple[Optional[int], Optional[str]]:
+    if PdfReader is None:
+        return None, None
+
+    reader = PdfReader(file_path)
+    texts = list()
+    length = 0
+    for page in reader.pages:
+        if length >= MAX_TEXT_LENGTH:
+            break
+        text = page.extract_text() or ""
+        texts.append(text)
+        length += len(text)
+    return len(reader.pages), "\n".join(texts)
+
+
+def _read_part(package: zipfile.ZipFile, name: str) -> Optional[bytes]:
+    """Uncompressed content of a package part, None when it is bigger than MAX_OFFICE_PART_SIZE (zip bombs)."""
+    if package.getinfo(name).file_size > MAX_OFFICE_PART_SIZE:
+        return None
+    # the declared size can lie, the read is bounded too
+    with package.open(name) as part:
+        data = part.read(MAX_OFFICE_PART_SIZE + 1)
+    return data if len(data) <= MAX_OFFICE_PART_SIZE else None
+
+
+def _office_content(file_path: str, extension: str) -> Tuple[Optional[int], Optional[str]]:
+    part_pattern = OFFICE_TEXT_PARTS[extension]
+    with zipfile.ZipFile(file_path) as package:
+        names = sorted(name for name in package.namelist() if part_pattern.match(name))
+        texts = list()
+        length = 0
+        for name in names:
+            if length >= MAX_TEXT_LENGTH:
+                break
+            data = _read_part(package, name)
+            if data is None:
+                continue
+            text = _xml_text(data)
+            texts.append(text)
+            length += len(text)
+
+        page_count = None
+        if extension == ".pptx":
+            page_count = len(names)
+        elif "docProps/app.xml" in package.namelist():
+            pages = re.search(rb"<Pages>(\d+)</Pages>", _read_part(package, "docProps/app.xml") or b"")
+            page_count = pages and int(pages.group(1))
+    return page_count, "\n".join(texts)
+
+
+def _thumbnail(file_path: str) -> Optional[bytes]:
+    if Image is None:
+        return None
+
+    with Image.open(file_path) as image:
+        image.thumbnail(THUMBNAIL_SIZE)
+        output = io.BytesIO()
+        image.convert("RGB").save(output, format="PNG")
+        return output.getvalue()
+
+
+def extract_annex_metadata(file_path: str, key: str) -> dict:
+    """Size, MIME type, page count, text and PNG thumbnail of an annex, what can't be computed is None."""
+    mime_type = detect_mime_type(file_path, key)
+    extension = os.path.splitext(key)[1].lower()
+
+    page_count, text, thumbnail = None, None, None
+    if mime_type == "application/pdf":
+        page_count, text = _pdf_content(file_path)
+    elif extension in OFFICE_TEXT_PARTS and zipfile.is_zipfile(file_path):
+        page_count, text = _office_content(file_path, extension)
+    elif mime_type in TEXT_MIME_TYPES:
+        with open(file_path, "rb") as file:
+            text = file.read(MAX_TEXT_LENGTH).decode("utf-8", errors="replace")
+    elif mime_type.startswith("image/"):
+        page_count = 1
+        thumbnail = _thumbnail(file_path)
+
+    return dict(
+        size=os.path.getsize(file_path),
+        mime_type=mime_type,
+        page_count=page_count,
+        # postgres text can't store NUL characters
+        text=text and text[:MAX_TEXT_LENGTH].replace("\x00", ""),
+        thumbnail=thumbnail,
+    )
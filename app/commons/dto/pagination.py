@@ -1,5 +1,5 @@
 import dataclasses
-from typing import List, Dict
+from typing import List, Dict, Optional
 
 
 @dataclasses.dataclass
@@ -20,17 +20,21 @@ class PaginationRequest:
 
 @dataclasses.dataclass
 class PaginationResponse:
-    total_items: int
-    total_pages: int
+    total_items: Optional[int]
+    total_pages: Optional[int]
     results: List[Dict]
+    next_cursor: Optional[str] = None
 
     @classmethod
     def from_dict(self, d):
         return self(**d)
 
     def to_dict(self):
-        return {
+        d = {
             "totalItems": self.total_items,
             "totalPages": self.total_pages,
             "results": self.results,
         }
+        if self.next_cursor:
+            d["nextCursor"] = self.next_cursor
+        return d
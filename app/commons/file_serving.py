@@ -0,0 +1,85 @@
+import mimetypes
+import os
+import re
+from http import HTTPStatus
+from typing import Optional
+
+from apiflask import abort
+from flask import current_app, request, send_from_directory, redirect, Response
+from sqlalchemy import select
+from werkzeug.security import safe_join
+
+from app.commons.models.annex_metadata_model import AnnexMetadataModel, AnnexScanStatus
+from app.commons.storage import get_storage
+from db import db
+
+# `<sha256><extension>` names never change content, see app.commons.storage
+CONTENT_ADDRESSED_NAME = re.compile(r"^(?P<sha256>[0-9a-f]{64})(\.[\w.]+)?$")
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+
+def _cache_headers(response: Response, filename: str, scan_status: Optional[str]):
+    match = CONTENT_ADDRESSED_NAME.match(filename)
+    response.cache_control.no_cache = None
+    if match:
+        response.set_etag(match.group("sha256"))
+    # a copy cached for a year could not be withdrawn if a later scan flags the file
+    if match and scan_status == AnnexScanStatus.clean:
+        response.cache_control.public = True
+        response.cache_control.max_age = IMMUTABLE_MAX_AGE
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.public = True
+        response.cache_control.max_age = current_app.config.get("UPLOADS_MAX_AGE", 3600)
+    return response
+
+
+def _refused_scan_statuses():
+    if current_app.config.get("ANNEX_SCAN_HOOK"):
+        return AnnexScanStatus.pending, AnnexScanStatus.not_scanned, AnnexScanStatus.failed, AnnexScanStatus.infected
+    return (AnnexScanStatus.infected,)
+
+
+def send_upload(filename: str) -> Response:
+    """
+    Serve an uploaded file according to UPLOADS_SERVE_MODE:
+    - flask: the worker streams the file, with Range and conditional request support
+    - x-accel: nginx serves it from the internal location UPLOADS_ACCEL_PREFIX (X-Accel-Redirect)
+    - x-sendfile: Apache or lighttpd serve it from disk (X-Sendfile)
+    Files in a remote storage are redirected to their download url. Files flagged by the scan hook are refused, and
+    with ANNEX_SCAN_HOOK set so are the files whose scan is pending or failed.
+    """
+    scan_status = db.session.execute(
+        select(AnnexMetadataModel.scan_status).where(AnnexMetadataModel.key == filename)
+    ).scalar()
+    if scan_status in _refused_scan_statuses():
+        abort(HTTPStatus.FORBIDDEN, f"File not cleared by the antivirus scan, scan_status={scan_status}")
+
+    storage_url = get_storage().url(filename)
+    if storage_url:
+        return redirect(storage_url, code=HTTPStatus.FOUND)
+
+    upload_folder = current_app.config["UPLOAD_FOLDER"]
+    file_path = safe_join(upload_folder, filename)
+    if file_path is None or not os.path.isfile(file_path):
+        abort(HTTPStatus.NOT_FOUND)
+
+    serve_mode = current_app.config.get("UPLOADS_SERVE_MODE", "flask")
+    if serve_mode == "x-accel":
+        response = Response(mimetype=mimetypes.guess_type(filename)[0] or "application/octet-stream")
+        response.headers["X-Accel-Redirect"] = current_app.config.get("UPLOADS_ACCEL_PREFIX", "/protected-uploads/") \
+            + filename
+        _cache_headers(response, filename, scan_status)
+        # nginx answers the Range requests, only the conditional part is done here
+        return response.make_conditional(request, accept_ranges=False)
+
+    # with x-sendfile USE_X_SENDFILE is on and send_from_directory only sets the header
+    match = CONTENT_ADDRESSED_NAME.match(filename)
+    response = send_from_directory(
+        upload_folder,
+        filename,
+        etag=match.group("sha256") if match else True,
+        conditional=True,
+        max_age=None,
+    )
+    return _cache_headers(response, filename, scan_status)
@@ -0,0 +1,43 @@
+from datetime import datetime
+
+from flask import url_for
+from sqlalchemy import Column, String, Integer, BigInteger, DateTime, TEXT
+
+from db import db
+
+
+class AnnexScanStatus:
+    # stored with the upload, until task_process_annex runs
+    pending = "pending"
+    not_scanned = "not_scanned"
+    clean = "clean"
+    infected = "infected"
+    # the scan hook raised or the file could not be read
+    failed = "failed"
+
+
+class AnnexMetadataModel(db.Model):
+    """Metadata computed by `task_process_annex`, keyed by storage key so duplicated uploads are processed once."""
+    __tablename__ = "annex_metadata"
+
+    key = Column(String(), primary_key=True)
+    size = Column(BigInteger(), nullable=True)
+    mime_type = Column(String(), nullable=True)
+    page_count = Column(Integer(), nullable=True)
+    text = Column(TEXT(), nullable=True)
+    thumbnail_key = Column(String(), nullable=True)
+    scan_status = Column(String(), nullable=False, default=AnnexScanStatus.not_scanned)
+    scan_detail = Column(String(), nullable=True)
+    error = Column(String(), nullable=True)
+    processed_at = Column(DateTime(), default=datetime.utcnow, nullable=False)
+
+    def to_preview(self):
+        return dict(
+            mimeType=self.mime_type,
+            size=self.size,
+            pageCount=self.page_count,
+            thumbnailUrl=self.thumbnail_key and url_for(
+                "serve_uploaded_file", filename=self.thumbnail_key, _external=True
+            ),
+            scanStatus=self.scan_status,
+        )
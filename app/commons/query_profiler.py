@@ -0,0 +1,91 @@
+import heapq
+import logging
+import time
+
+from flask import Flask, current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+
+def _config(key, default):
+    return current_app.config.get(key, default)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and "query_profile" in g:
+        context.query_start_time = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start_time = getattr(context, "query_start_time", None)
+    if start_time is None or not (has_request_context() and "query_profile" in g):
+        return
+
+    elapsed = time.perf_counter() - start_time
+    profile = g.query_profile
+    profile["count"] += 1
+    profile["total_time"] += elapsed
+
+    slowest = profile["slowest"]
+    item = (elapsed, profile["count"], statement)
+    if len(slowest) < profile["keep_slowest"]:
+        heapq.heappush(slowest, item)
+    else:
+        heapq.heappushpop(slowest, item)
+
+
+def _start_profile():
+    g.query_profile = dict(
+        count=0,
+        total_time=0.0,
+        slowest=list(),
+        keep_slowest=_config("QUERY_PROFILER_KEEP_SLOWEST", 3),
+    )
+
+
+def _finish_profile(response):
+    profile = g.pop("query_profile", None)
+    if profile is None:
+        return response
+
+    total_ms = profile["total_time"] * 1000
+    slowest = sorted(profile["slowest"], reverse=True)
+
+    server_timing = [f'db;dur={total_ms:.2f};desc="{profile["count"]} queries"']
+    server_timing += [
+        f"db-slow-{position};dur={elapsed * 1000:.2f}"
+        for position, (elapsed, _, _) in enumerate(slowest, start=1)
+    ]
+    response.headers.add("Server-Timing", ", ".join(server_timing))
+
+    max_queries = _config("QUERY_PROFILER_MAX_QUERIES", 30)
+    max_time_ms = _config("QUERY_PROFILER_MAX_DB_TIME_MS", 500)
+    if profile["count"] > max_queries or total_ms > max_time_ms:
+        logger.warning(
+            "Query budget exceeded on %s %s (endpoint=%s): %s queries, %.2f ms in database. Slowest: %s",
+            request.method,
+            request.path,
+            request.endpoint,
+            profile["count"],
+            total_ms,
+            " | ".join(f"{elapsed * 1000:.2f} ms: {' '.join(statement.split())}" for elapsed, _, statement in slowest),
+        )
+    return response
+
+
+def init_app(app: Flask):
+    """
+    Count the SQL statements and database time of every request. The totals are returned in a Server-Timing
+    header and requests above QUERY_PROFILER_MAX_QUERIES or QUERY_PROFILER_MAX_DB_TIME_MS are logged.
+    """
+    if not app.config.get("QUERY_PROFILER_ENABLED", True):
+        return
+
+    if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+
+    app.before_request(_start_profile)
+    app.after_request(_finish_profile)
@@ -0,0 +1,22 @@
+import os
+from typing import Dict, Iterable
+
+from sqlalchemy import select
+from sqlalchemy.orm import defer
+
+from app.commons.models.annex_metadata_model import AnnexMetadataModel
+from db import db
+
+
+def get_annex_previews(paths: Iterable[str]) -> Dict[str, Dict]:
+    """Previews of the processed annexes by storage path, annexes not processed yet are missing."""
+    keys = {os.path.basename(path) for path in paths if path}
+    if not keys:
+        return dict()
+
+    metadata_ls = db.session.execute(
+        select(AnnexMetadataModel)
+        .where(AnnexMetadataModel.key.in_(keys))
+        .options(defer(AnnexMetadataModel.text))
+    ).scalars()
+    return {item.key: item.to_preview() for item in metadata_ls}
@@ -1,5 +1,18 @@
-from sqlalchemy import asc, desc, nulls_first
+import functools
+
+from sqlalchemy import asc, desc, nulls_first, func, text, event, DDL, Index
 from sqlalchemy import nulls_last
+from sqlalchemy.orm import load_only
+
+from db import db
+
+SEARCH_CONFIG = text("'portuguese'::regconfig")
+
+# needed by the gin_trgm_ops indexes, create_all runs it through the event below and `flask db upgrade` through
+# migrations/env.py
+CREATE_TRIGRAM_EXTENSION = "CREATE EXTENSION IF NOT EXISTS pg_trgm"
+
+event.listen(db.metadata, "before_create", DDL(CREATE_TRIGRAM_EXTENSION).execute_if(dialect="postgresql"))
 
 
 def asc_(column):
@@ -8,3 +21,43 @@ def asc_(column):
 
 def desc_(column):
     return nulls_last(desc(column))
+
+
+def search_vector(*weighted_columns):
+    """
+    Portuguese tsvector of (column, weight) pairs. Queries have to build it with the same pairs to use the
+    index created by `search_vector_index`.
+    """
+    vectors = [
+        func.setweight(
+            func.to_tsvector(SEARCH_CONFIG, func.coalesce(column, text("''"))),
+            text(f"'{weight}'"),
+        )
+        for column, weight in weighted_columns
+    ]
+    return functools.reduce(lambda left, right: left.op("||")(right), vectors)
+
+
+def search_query(term: str):
+    return func.websearch_to_tsquery(SEARCH_CONFIG, term)
+
+
+def search_vector_index(name: str, *weighted_columns) -> Index:
+    return Index(name, search_vector(*weighted_columns), postgresql_using="gin")
+
+
+def trigram_index(name: str, column) -> Index:
+    return Index(name, column, postgresql_using="gin", postgresql_ops={column.key: "gin_trgm_ops"})
+
+
+def estimate_count(select_stmt) -> int:
+    """Row estimate of the planner for `select_stmt`, cheap but only as accurate as the last ANALYZE."""
+    connection = db.session.connection()
+    compiled = select_stmt.compile(dialect=connection.dialect)
+    plan = connection.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled}", compiled.params).scalar()
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+def load_profile(entity, profiles: dict, name: str):
+    """`load_only` of the columns listed under `name` in `profiles`, `entity` can be the model or an alias of it."""
+    return load_only(*[getattr(entity, column_name) for column_name in profiles[name]])
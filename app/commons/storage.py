@@ -0,0 +1,299 @@
+import abc
+import contextlib
+import dataclasses
+import hashlib
+import io
+import logging
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from datetime import datetime, timezone
+from typing import Optional, BinaryIO, Iterator, Tuple
+
+from flask import current_app
+from flask.signals import Namespace
+from sqlalchemy import event
+from sqlalchemy.dialects.postgresql import insert
+from werkzeug.datastructures import FileStorage
+from werkzeug.utils import secure_filename
+
+from app.commons.models.annex_metadata_model import AnnexMetadataModel, AnnexScanStatus
+from db import db, RoutingSession
+
+try:
+    import boto3
+    from botocore.exceptions import ClientError
+except ImportError:  # only needed with STORAGE_BACKEND=s3
+    boto3 = None
+    ClientError = None
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1024 * 1024
+STAGED_UPLOADS_KEY = "staged_uploads"
+
+# sent with `stored_file` once an upload is promoted after the commit
+upload_promoted = Namespace().signal("upload-promoted")
+
+
+@dataclasses.dataclass
+class StoredFile:
+    key: str
+    sha256: str
+    size: int
+    staged_path: Optional[str] = None
+
+
+class Storage(abc.ABC):
+    """
+    Content addressed file storage, files are stored once under `<sha256><extension>`.
+    Uploads are first streamed to a staging file and only promoted to their final key after the database commit.
+    """
+
+    def __init__(self, staging_dir: str):
+        self.staging_dir = staging_dir
+
+    def stage(self, file: FileStorage) -> StoredFile:
+        os.makedirs(self.staging_dir, exist_ok=True)
+        extension = "".join(Path(secure_filename(file.filename or "")).suffixes).lower()
+        fd, staged_path = tempfile.mkstemp(dir=self.staging_dir, suffix=".part")
+
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            with os.fdopen(fd, "wb") as staged_file:
+                for chunk in iter(lambda: file.stream.read(CHUNK_SIZE), b""):
+                    digest.update(chunk)
+                    staged_file.write(chunk)
+                    size += len(chunk)
+        except Exception:
+            os.remove(staged_path)
+            raise
+
+        sha256 = digest.hexdigest()
+        return StoredFile(key=f"{sha256}{extension}", sha256=sha256, size=size, staged_path=staged_path)
+
+    def discard(self, stored_file: StoredFile):
+        if stored_file.staged_path and os.path.exists(stored_file.staged_path):
+            os.remove(stored_file.staged_path)
+
+    def put(self, data: bytes, extension: str = "") -> str:
+        """Store generated content right away, outside of any database transaction."""
+        stored_file = self.stage(FileStorage(io.BytesIO(data), filename=f"file{extension}"))
+        self.promote(stored_file)
+        return stored_file.key
+
+    @contextlib.contextmanager
+    def local_copy(self, key: str):
+        """Path of a local file with the content of `key`, removed on exit."""
+        os.makedirs(self.staging_dir, exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=self.staging_dir, suffix=os.path.splitext(key)[1]) as copy:
+            with self.open(key) as source:
+                shutil.copyfileobj(source, copy, CHUNK_SIZE)
+            copy.flush()
+            yield copy.name
+
+    @abc.abstractmethod
+    def promote(self, stored_file: StoredFile):
+        """
+        Move a staged file to its key, a file with the same key is already the same content and only gets its
+        modification time refreshed, so the uploads GC sees it as recent again.
+        """
+
+    @abc.abstractmethod
+    def exists(self, key: str) -> bool:
+        pass
+
+    @abc.abstractmethod
+    def open(self, key: str) -> BinaryIO:
+        pass
+
+    @abc.abstractmethod
+    def delete(self, key: str):
+        pass
+
+    @abc.abstractmethod
+    def iter_keys(self) -> Iterator[Tuple[str, int, datetime]]:
+        """Stream (key, size, modified_at) of the stored files."""
+
+    @abc.abstractmethod
+    def quarantine(self, key: str):
+        """Move a file out of the served keys instead of deleting it."""
+
+    def iter_staged(self) -> Iterator[Tuple[str, int, datetime]]:
+        if not os.path.isdir(self.staging_dir):
+            return
+        with os.scandir(self.staging_dir) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    stat = entry.stat()
+                    yield entry.path, stat.st_size, datetime.fromtimestamp(stat.st_mtime, timezone.utc)
+
+    def url(self, key: str) -> Optional[str]:
+        """Direct download url, None when the file has to be served by the application."""
+        return None
+
+
+class LocalStorage(Storage):
+
+    def __init__(self, root: str):
+        # staging inside the root keeps the promotion an atomic rename on the same filesystem
+        super().__init__(os.path.join(root, ".staging"))
+        self.root = root
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.root, os.path.basename(key))
+
+    def promote(self, stored_file: StoredFile):
+        if self.exists(stored_file.key):
+            os.utime(self.path(stored_file.key))
+            self.discard(stored_file)
+        else:
+            # mkstemp creates 0600 files, the front proxy has to read them with x-accel/x-sendfile
+            os.chmod(stored_file.staged_path, 0o644)
+            os.replace(stored_file.staged_path, self.path(stored_file.key))
+        stored_file.staged_path = None
+
+    def exists(self, key: str) -> bool:
+        return os.path.exists(self.path(key))
+
+    def open(self, key: str) -> BinaryIO:
+        return open(self.path(key), "rb")
+
+    @contextlib.contextmanager
+    def local_copy(self, key: str):
+        yield self.path(key)
+
+    def delete(self, key: str):
+        if self.exists(key):
+            os.remove(self.path(key))
+
+    def iter_keys(self) -> Iterator[Tuple[str, int, datetime]]:
+        with os.scandir(self.root) as entries:
+            for entry in entries:
+                # skips .staging and .quarantine
+                if entry.is_file() and not entry.name.startswith("."):
+                    stat = entry.stat()
+                    yield entry.name, stat.st_size, datetime.fromtimestamp(stat.st_mtime, timezone.utc)
+
+    def quarantine(self, key: str):
+        quarantine_dir = os.path.join(self.root, ".quarantine")
+        os.makedirs(quarantine_dir, exist_ok=True)
+        os.replace(self.path(key), os.path.join(quarantine_dir, os.path.basename(key)))
+
+
+class S3Storage(Storage):
+    """S3 compatible storage, set S3_ENDPOINT_URL to use MinIO or another local stand-in."""
+    QUARANTINE_PREFIX = "quarantine/"
+
+    def __init__(self, bucket: str, endpoint_url: Optional[str] = None, url_expiration: int = 3600, **client_kwargs):
+        if boto3 is None:
+            raise RuntimeError("boto3 is required for STORAGE_BACKEND=s3")
+        super().__init__(os.path.join(tempfile.gettempdir(), "safecities-uploads"))
+        self.bucket = bucket
+        self.url_expiration = url_expiration
+        self.client = boto3.client("s3", endpoint_url=endpoint_url, **client_kwargs)
+
+    def promote(self, stored_file: StoredFile):
+        if self.exists(stored_file.key):
+            # a copy onto itself is the only way to refresh LastModified, S3 requires REPLACE for it
+            self.client.copy_object(
+                Bucket=self.bucket,
+                Key=stored_file.key,
+                CopySource=dict(Bucket=self.bucket, Key=stored_file.key),
+                MetadataDirective="REPLACE",
+            )
+        else:
+            self.client.upload_file(stored_file.staged_path, self.bucket, stored_file.key)
+        self.discard(stored_file)
+        stored_file.staged_path = None
+
+    def exists(self, key: str) -> bool:
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=key)
+            return True
+        except ClientError as e:
+            if e.response["Error"]["Code"] in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+
+    def open(self, key: str) -> BinaryIO:
+        return self.client.get_object(Bucket=self.bucket, Key=key)["Body"]
+
+    def delete(self, key: str):
+        self.client.delete_object(Bucket=self.bucket, Key=key)
+
+    def iter_keys(self) -> Iterator[Tuple[str, int, datetime]]:
+        for page in self.client.get_paginator("list_objects_v2").paginate(Bucket=self.bucket):
+            for item in page.get("Contents", list()):
+                if not item["Key"].startswith(self.QUARANTINE_PREFIX):
+                    yield item["Key"], item["Size"], item["LastModified"]
+
+    def quarantine(self, key: str):
+        self.client.copy_object(
+            Bucket=self.bucket, Key=self.QUARANTINE_PREFIX + key, CopySource=dict(Bucket=self.bucket, Key=key)
+        )
+        self.delete(key)
+
+    def url(self, key: str) -> Optional[str]:
+        return self.client.generate_presigned_url(
+            "get_object", Params=dict(Bucket=self.bucket, Key=key), ExpiresIn=self.url_expiration
+        )
+
+
+def get_storage() -> Storage:
+    storage = current_app.extensions.get("storage")
+    if storage is None:
+        config = current_app.config
+        if config.get("STORAGE_BACKEND", "local") == "s3":
+            storage = S3Storage(
+                bucket=config["S3_BUCKET"],
+                endpoint_url=config.get("S3_ENDPOINT_URL"),
+                url_expiration=config.get("S3_URL_EXPIRATION", 3600),
+                aws_access_key_id=config.get("S3_ACCESS_KEY_ID"),
+                aws_secret_access_key=config.get("S3_SECRET_ACCESS_KEY"),
+                region_name=config.get("S3_REGION"),
+            )
+        else:
+            storage = LocalStorage(config["UPLOAD_FOLDER"])
+        current_app.extensions["storage"] = storage
+    return storage
+
+
+def stage_upload(file: FileStorage) -> StoredFile:
+    """
+    Stream an upload to the staging area. It is promoted to its content address when the current session commits
+    and discarded if the session rolls back.
+    """
+    storage = get_storage()
+    stored_file = storage.stage(file)
+    db.session.info.setdefault(STAGED_UPLOADS_KEY, list()).append((storage, stored_file))
+    if current_app.config.get("ANNEX_PROCESSING_ENABLED", True):
+        # committed with the row referencing the file so it is not served before its scan, a content that was
+        # already processed keeps its status
+        db.session.execute(
+            insert(AnnexMetadataModel)
+            .values(key=stored_file.key, scan_status=AnnexScanStatus.pending, processed_at=datetime.utcnow())
+            .on_conflict_do_nothing(index_elements=[AnnexMetadataModel.key])
+        )
+    return stored_file
+
+
+@event.listens_for(RoutingSession, "after_commit")
+def _promote_staged_uploads(session):
+    for storage, stored_file in session.info.pop(STAGED_UPLOADS_KEY, list()):
+        try:
+            storage.promote(stored_file)
+        except Exception:
+            # the staged file is kept so the upload can still be recovered by hand
+            logger.exception("Could not promote upload %s", stored_file.key)
+            continue
+        upload_promoted.send(storage, stored_file=stored_file)
+
+
+@event.listens_for(RoutingSession, "after_rollback")
+def _discard_staged_uploads(session):
+    for storage, stored_file in session.info.pop(STAGED_UPLOADS_KEY, list()):
+        storage.discard(stored_file)
+
@@ -0,0 +1,96 @@
+import logging
+from datetime import datetime, timedelta
+
+import celery
+from flask import current_app
+from sqlalchemy import select, exists
+from werkzeug.utils import import_string
+
+from app.commons.annex_processing import extract_annex_metadata
+from app.commons.models.annex_metadata_model import AnnexMetadataModel, AnnexScanStatus
+from app.commons.storage import get_storage, upload_promoted
+from app.commons.upload_gc import collect_orphaned_uploads
+from db import db
+
+logger = logging.getLogger(__name__)
+
+
+def scan_annex(file_path: str):
+    """
+    Run the ANNEX_SCAN_HOOK, an import path of a callable receiving the file path and returning None for clean
+    files or a description of the threat found.
+    """
+    hook_path = current_app.config.get("ANNEX_SCAN_HOOK")
+    if not hook_path:
+        return AnnexScanStatus.not_scanned, None
+
+    try:
+        threat = import_string(hook_path)(file_path)
+    except Exception as e:
+        logger.exception("Scan hook failed on %s", file_path)
+        return AnnexScanStatus.failed, str(e)[:255]
+    if threat:
+        return AnnexScanStatus.infected, str(threat)
+    return AnnexScanStatus.clean, None
+
+
+@celery.shared_task
+def task_process_annex(key: str):
+    already_processed = db.session.execute(
+        select(exists().where(
+            AnnexMetadataModel.key == key,
+            AnnexMetadataModel.scan_status != AnnexScanStatus.pending,
+        ))
+    ).scalar()
+    if already_processed:
+        return
+
+    storage = get_storage()
+    metadata_model = AnnexMetadataModel(key=key, processed_at=datetime.utcnow())
+    try:
+        with storage.local_copy(key) as file_path:
+            metadata_model.scan_status, metadata_model.scan_detail = scan_annex(file_path)
+            metadata = extract_annex_metadata(file_path, key)
+
+        metadata_model.size = metadata["size"]
+        metadata_model.mime_type = metadata["mime_type"]
+        metadata_model.page_count = metadata["page_count"]
+        metadata_model.text = metadata["text"]
+        if metadata["thumbnail"]:
+            metadata_model.thumbnail_key = storage.put(metadata["thumbnail"], ".png")
+    except Exception as e:
+        logger.exception("Could not process annex %s", key)
+        metadata_model.error = str(e)[:255]
+        if metadata_model.scan_status is None:
+            # the file could not be read, so it was not scanned either
+            metadata_model.scan_status = (
+                AnnexScanStatus.failed if current_app.config.get("ANNEX_SCAN_HOOK") else AnnexScanStatus.not_scanned
+            )
+
+    if metadata_model.scan_status == AnnexScanStatus.infected:
+        # the stored scan_status makes send_upload refuse the file
+        logger.warning("Annex %s flagged by the scan hook: %s", key, metadata_model.scan_detail)
+
+    db.session.merge(metadata_model)
+    db.session.commit()
+
+
+@celery.shared_task
+def task_collect_orphaned_uploads():
+    report = collect_orphaned_uploads(
+        get_storage(),
+        grace_period=timedelta(hours=current_app.config.get("UPLOADS_GC_GRACE_HOURS", 24)),
+        quarantine=current_app.config.get("UPLOADS_GC_QUARANTINE", False),
+    )
+    return report.to_dict()
+
+
+@upload_promoted.connect
+def _queue_annex_processing(sender, stored_file, **kwargs):
+    if not current_app.config.get("ANNEX_PROCESSING_ENABLED", True):
+        return
+    try:
+        task_process_annex.delay(stored_file.key)
+    except Exception:
+        # the upload is already committed, a missing broker must not fail the request
+        logger.exception("Could not queue the processing of annex %s", stored_file.key)
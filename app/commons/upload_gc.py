@@ -0,0 +1,125 @@
+import dataclasses
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Set
+
+from sqlalchemy import select, union, delete, exists, or_
+
+from app.causes.models import AnnexModel
+from app.commons.models.annex_metadata_model import AnnexMetadataModel
+from app.commons.models.file_model import FileModel
+from app.commons.storage import Storage
+from app.problems.models import AnnexCustomProblemModel
+from db import db
+
+logger = logging.getLogger(__name__)
+
+YIELD_PER = 1000
+
+
+@dataclasses.dataclass
+class UploadsGCReport:
+    dry_run: bool
+    quarantine: bool
+    scanned_files: int = 0
+    scanned_bytes: int = 0
+    orphaned_files: int = 0
+    reclaimed_bytes: int = 0
+    staged_files_removed: int = 0
+    metadata_rows_removed: int = 0
+
+    def to_dict(self):
+        return dataclasses.asdict(self)
+
+
+def _referenced_keys() -> Set[str]:
+    paths_query = union(
+        select(FileModel.path),
+        select(AnnexModel.path),
+        select(AnnexCustomProblemModel.path),
+    )
+    referenced = set()
+    for path in db.session.execute(paths_query, execution_options=dict(yield_per=YIELD_PER)).scalars():
+        if path:
+            referenced.add(os.path.basename(path))
+
+    thumbnails_query = (
+        select(AnnexMetadataModel.key, AnnexMetadataModel.thumbnail_key)
+        .where(AnnexMetadataModel.thumbnail_key.isnot(None))
+    )
+    for key, thumbnail_key in db.session.execute(thumbnails_query, execution_options=dict(yield_per=YIELD_PER)):
+        if key in referenced:
+            referenced.add(thumbnail_key)
+    return referenced
+
+
+def _path_matches(path_column, key: str):
+    # older rows store the upload path, newer ones the bare key
+    return or_(path_column == key, path_column.endswith(f"/{key}", autoescape=True))
+
+
+def _is_still_referenced(key: str) -> bool:
+    """Check `key` against the committed rows right before removing it, it may have been uploaded again since."""
+    # a thumbnail is referenced through the annex it was generated from
+    keys = [key] + list(db.session.execute(
+        select(AnnexMetadataModel.key).where(AnnexMetadataModel.thumbnail_key == key)
+    ).scalars())
+    conditions = [
+        exists().where(or_(*[_path_matches(model.path, candidate_key) for candidate_key in keys]))
+        for model in (FileModel, AnnexModel, AnnexCustomProblemModel)
+    ]
+    return db.session.execute(select(or_(*conditions))).scalar()
+
+
+def collect_orphaned_uploads(
+        storage: Storage,
+        grace_period: timedelta,
+        quarantine: bool = False,
+        dry_run: bool = False,
+) -> UploadsGCReport:
+    """
+    Remove, or quarantine, the stored files that no FileModel or annex row references anymore and the staging
+    files left by interrupted uploads. Files younger than `grace_period` are kept, their rows may not be committed yet.
+    """
+    report = UploadsGCReport(dry_run=dry_run, quarantine=quarantine)
+    referenced = _referenced_keys()
+    deadline = datetime.now(timezone.utc) - grace_period
+
+    removed_keys = list()
+    for key, size, modified_at in storage.iter_keys():
+        report.scanned_files += 1
+        report.scanned_bytes += size
+        if key in referenced or modified_at > deadline:
+            continue
+        if _is_still_referenced(key):
+            continue
+
+        report.orphaned_files += 1
+        report.reclaimed_bytes += size
+        removed_keys.append(key)
+        if dry_run:
+            continue
+        if quarantine:
+            storage.quarantine(key)
+        else:
+            storage.delete(key)
+
+    for staged_path, size, modified_at in storage.iter_staged():
+        if modified_at > deadline:
+            continue
+        report.staged_files_removed += 1
+        report.reclaimed_bytes += size
+        if not dry_run:
+            os.remove(staged_path)
+
+    if not dry_run:
+        for start in range(0, len(removed_keys), YIELD_PER):
+            result = db.session.execute(
+                delete(AnnexMetadataModel).where(AnnexMetadataModel.key.in_(removed_keys[start:start + YIELD_PER]))
+            )
+            report.metadata_rows_removed += result.rowcount
+        db.session.commit()
+
+    logger.info("Uploads garbage collection: %s", report.to_dict())
+    return report
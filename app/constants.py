@@ -1,4 +1,4 @@
-from typing import Dict, List
+from typing import Dict, List, Tuple, Callable, Any
 
 DATA_PROPERTIES_MAPPING = {
 
@@ -28,23 +28,65 @@ DATA_PROPERTIES_MAPPING = {
 }
 
 
-def format_data_characteristics(data: Dict) -> List:
-    output = list()
-    for db_field, property_paths in DATA_PROPERTIES_MAPPING.items():
+
+def _compile_data_characteristics_template(mapping: Dict) -> Tuple:
+    """Group the mapping into (first level, ((second level, ((property, db field), ...)), ...)) in mapping order."""
+    tree = dict()
+    for db_field, property_paths in mapping.items():
         if len(property_paths) != 3:
             continue
+        first_level, second_level, property_name = property_paths
+        tree.setdefault(first_level, dict()).setdefault(second_level, list()).append((property_name, db_field))
+
+    return tuple(
+        (first_level, tuple((second_level, tuple(leaves)) for second_level, leaves in second_levels.items()))
+        for first_level, second_levels in tree.items()
+    )
 
-        if not isinstance(data[db_field], list):
-            continue
 
-        first_node = next((item for item in output if item["name"] == property_paths[0]), None)
-        if not first_node:
-            output.append(first_node := dict(name=property_paths[0], iconName=None, data=list()))
+DATA_CHARACTERISTICS_TEMPLATE = _compile_data_characteristics_template(DATA_PROPERTIES_MAPPING)
 
-        second_node = next((item for item in first_node["data"] if item["name"] == property_paths[1]), None)
-        if not second_node:
-            first_node["data"].append(second_node := dict(name=property_paths[1], data=list()))
+DATA_CHARACTERISTICS_FIELDS = tuple(
+    db_field
+    for _, second_levels in DATA_CHARACTERISTICS_TEMPLATE
+    for _, leaves in second_levels
+    for _, db_field in leaves
+)
 
-        second_node["data"].append({property_paths[2]: data[db_field]})
 
+def _build_data_characteristics_tree(leaf_value: Callable[[str], Any]) -> List:
+    # leaf_value returns None for the properties without data, empty levels are left out
+    output = list()
+    for first_level, second_levels in DATA_CHARACTERISTICS_TEMPLATE:
+        first_level_data = list()
+        for second_level, leaves in second_levels:
+            second_level_data = list()
+            for property_name, db_field in leaves:
+                value = leaf_value(db_field)
+                if value is not None:
+                    second_level_data.append({property_name: value})
+            if second_level_data:
+                first_level_data.append(dict(name=second_level, data=second_level_data))
+        if first_level_data:
+            output.append(dict(name=first_level, iconName=None, data=first_level_data))
     return output
+
+
+def format_data_characteristics(data: Dict) -> List:
+    return _build_data_characteristics_tree(
+        lambda db_field: data[db_field] if isinstance(data[db_field], list) else None
+    )
+
+
+def format_data_characteristics_series(rows: List[Dict], key: str = "period") -> List:
+    """
+    Tree of several rows at once, e.g. the periods of a problem. Each property holds the
+    `{"<key>": ..., "data": [...]}` of every row, `data` is None where that row has no data.
+    """
+    series = dict()
+    for db_field in DATA_CHARACTERISTICS_FIELDS:
+        values = [row[db_field] if isinstance(row[db_field], list) else None for row in rows]
+        if any(value is not None for value in values):
+            series[db_field] = [{key: row[key], "data": value} for row, value in zip(rows, values)]
+
+    return _build_data_characteristics_tree(series.get)
@@ -91,37 +91,7 @@ def delete_initiative_controller(initiative_id: str):
 @bp.input(ListInitiativeAssociationRequestSchema, location="query")
 @bp.auth_required(auth_token)
 def list_initiative_association_controller(query: Dict):
-    initiative_ids = query["initiative_ids"]
-
-    output = dict()
-    for item in services.list_initiative_association(initiative_ids):
-        initiative_dict = output.get(
-            item.initiative_id,
-            dict(initiativeId=item.initiative_id, initiativeName=item.initiative_name, causes=dict())
-        )
-        output[item.initiative_id] = initiative_dict
-
-    for item in services.list_initiative_association(initiative_ids):
-        cause_dict = output[item.initiative_id]["causes"]
-        t = cause_dict.get(
-            item.cause_id,
-            dict(causeId=item.cause_id, causeName=item.cause_name, problems=dict())
-        )
-        cause_dict[item.cause_id] = t
-
-    for item in services.list_initiative_association(initiative_ids):
-        problem_dict = output[item.initiative_id]["causes"][item.cause_id]["problems"]
-        problem_dict[item.problem_id] = problem_dict.get(
-            item.problem_id,
-            dict(problemId=item.problem_id, problemName=item.problem_name, prioritized=item.prioritized)
-        )
-
-    output = list(output.values())
-    for item in output:
-        item["causes"] = list(item["causes"].values())
-        for cause in item["causes"]:
-            cause["problems"] = list(cause["problems"].values())
-
+    output = services.build_initiative_association_tree(query["initiative_ids"])
     return dict(data=output)
 
 
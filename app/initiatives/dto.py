@@ -8,6 +8,7 @@ from sqlalchemy.sql.functions import count
 
 from app.cause_problem_association.models import CauseAndProblemAssociation
 from app.commons.models.file_model import FileModel
+from app.commons.repositories.annex_metadata_repo import get_annex_previews
 from app.initiatives.models import InitiativeModel, InitiativeCauseProblemAssociationModel, \
     InitiativeCauseAssociationModel
 from app.problems.models import ProblemModel
@@ -86,7 +87,8 @@ class InitiativeDetailDTO:
                 select(FileModel).where(FileModel.id.in_(
                     initiative_model.annex_ids
                 ))
-            ).scalars()
+            ).scalars().all()
+        annex_previews = get_annex_previews(item.path for item in file_model_ls)
 
         return InitiativeDetailDTO(
             id=initiative_model.id,
@@ -107,7 +109,8 @@ class InitiativeDetailDTO:
                 dict(
                     id=item.id,
                     fileName=item.filename,
-                    url=url_for("serve_uploaded_file", filename=item.id, _external=True)
+                    url=url_for("serve_uploaded_file", filename=os.path.basename(item.path), _external=True),
+                    preview=annex_previews.get(os.path.basename(item.path)),
                 )
                 for item in file_model_ls
             ]
@@ -2,10 +2,13 @@ from datetime import datetime
 from typing import List
 from uuid import uuid4
 
-from sqlalchemy import Column, String, Integer, ForeignKey, Boolean, Table, DateTime, ARRAY, select
+from sqlalchemy import Column, String, Integer, ForeignKey, Boolean, Table, DateTime, ARRAY, select, MetaData, \
+    DDL, event
 from sqlalchemy.orm import relationship, Mapped
 
 from app.causes.models import CauseModel
+from app.commons.sqlalchemy_utils import search_vector_index, trigram_index
+from app.initiatives.queries import Queries
 from db import db
 
 municipal_department_per_initiative_association_table = Table(
@@ -53,89 +56,37 @@ class InitiativeModel(db.Model):
 
     @property
     def associated_macro_objectives(self):
-        from app.cause_problem_association.models import CauseAndProblemAssociation
-        from app.plan.models import MacroObjectiveProblemAssociationModel
-
-        if self.is_default:
-            query = (
-                select(MacroObjectiveProblemAssociationModel.macro_objective)
-                .select_from(InitiativeModel)
-                .outerjoin(
-                    InitiativeCauseProblemAssociationModel,
-                    InitiativeCauseProblemAssociationModel.initiative_id == InitiativeModel.id
-                )
-                .outerjoin(
-                    MacroObjectiveProblemAssociationModel,
-                    MacroObjectiveProblemAssociationModel.problem_id == InitiativeCauseProblemAssociationModel.problem_id
-                )
-                .where(InitiativeModel.id == self.id)
-                .distinct()
-            )
-        else:
-            query = (
-                select(MacroObjectiveProblemAssociationModel.macro_objective)
-                .select_from(InitiativeModel)
-                .outerjoin(
-                    InitiativeCauseAssociationModel,
-                    InitiativeCauseAssociationModel.initiative_id == InitiativeModel.id
-                )
-                .outerjoin(
-                    CauseAndProblemAssociation,
-                    CauseAndProblemAssociation.cause_id == InitiativeCauseAssociationModel.cause_id
-                )
-                .outerjoin(
-                    MacroObjectiveProblemAssociationModel,
-                    MacroObjectiveProblemAssociationModel.problem_id == CauseAndProblemAssociation.problem_id
-                )
-                .where(InitiativeModel.id == self.id)
-                .distinct()
+        from app.plan.models import MacroObjectiveModel
+
+        query = (
+            select(MacroObjectiveModel)
+            .join(
+                InitiativeMacroObjectiveCoverageModel,
+                InitiativeMacroObjectiveCoverageModel.macro_objective_id == MacroObjectiveModel.id
             )
-        return db.session.execute(query).all()
+            .where(InitiativeMacroObjectiveCoverageModel.initiative_id == self.id)
+        )
+        return db.session.execute(query).scalars().all()
 
     @property
     def associated_focuses(self):
-        from app.causes.models import CauseIndicatorModel
-        from app.plan.models import FocusAssociationModel
-
-        if self.is_default:
-            query = (
-                select(FocusAssociationModel.focus)
-                .select_from(InitiativeModel)
-                .outerjoin(
-                    InitiativeCauseProblemAssociationModel,
-                    InitiativeCauseProblemAssociationModel.initiative_id == InitiativeModel.id
-                )
-                .outerjoin(
-                    CauseIndicatorModel,
-                    CauseIndicatorModel.cause_id == InitiativeCauseProblemAssociationModel.cause_id
-                )
-                .outerjoin(
-                    FocusAssociationModel,
-                    FocusAssociationModel.cause_indicator_id == CauseIndicatorModel.id
-                )
-                .where(InitiativeModel.id == self.id)
-                .distinct()
-            )
-        else:
-            query = (
-                select(FocusAssociationModel.focus)
-                .select_from(InitiativeModel)
-                .outerjoin(
-                    InitiativeCauseAssociationModel,
-                    InitiativeCauseAssociationModel.initiative_id == InitiativeModel.id
-                )
-                .outerjoin(
-                    CauseIndicatorModel,
-                    CauseIndicatorModel.cause_id == InitiativeCauseAssociationModel.cause_id
-                )
-                .outerjoin(
-                    FocusAssociationModel,
-                    FocusAssociationModel.cause_indicator_id == CauseIndicatorModel.id
-                )
-                .where(InitiativeModel.id == self.id)
-                .distinct()
-            )
-        return db.session.execute(query).all()
+        from app.plan.models import FocusModel
+
+        query = (
+            select(FocusModel)
+            .join(InitiativeFocusCoverageModel, InitiativeFocusCoverageModel.focus_id == FocusModel.id)
+            .where(InitiativeFocusCoverageModel.initiative_id == self.id)
+        )
+        return db.session.execute(query).scalars().all()
+
+
+INITIATIVE_SEARCH_COLUMNS = [
+    (InitiativeModel.name, "A"),
+    (InitiativeModel.justification, "B"),
+    (InitiativeModel.evidences, "C"),
+]
+search_vector_index("ix_initiative_search_vector", *INITIATIVE_SEARCH_COLUMNS)
+trigram_index("ix_initiative_name_trgm", InitiativeModel.name)
 
 
 class InitiativeCauseAssociationModel(db.Model):
@@ -156,6 +107,20 @@ class InitiativeCauseProblemAssociationModel(db.Model):
     problem_id = Column(ForeignKey("problem" + ".id"), primary_key=True)
 
 
+# read-only view over both association tables, kept out of db.metadata so create_all and the migrations don't
+# take it for a table, the DDL events below create and drop it with the schema
+initiative_effective_association = Table(
+    "initiative_effective_association",
+    MetaData(),
+    Column("initiative_id", Integer()),
+    Column("cause_id", Integer()),
+    Column("problem_id", Integer()),
+)
+
+event.listen(db.metadata, "after_create", DDL(Queries.INITIATIVE_EFFECTIVE_ASSOCIATION_VIEW))
+event.listen(db.metadata, "before_drop", DDL(Queries.DROP_INITIATIVE_EFFECTIVE_ASSOCIATION_VIEW))
+
+
 class InitiativePrioritizationModel(db.Model):
     __tablename__ = "initiative_prioritization"
 
@@ -164,6 +129,22 @@ class InitiativePrioritizationModel(db.Model):
     problem_id = Column(ForeignKey("problem" + ".id"), primary_key=True)
 
 
+class InitiativeMacroObjectiveCoverageModel(db.Model):
+    """Macro objectives reached by the problems of an initiative, kept up to date by `refresh_initiative_coverage`."""
+    __tablename__ = "initiative_macro_objective_coverage"
+
+    initiative_id = Column(ForeignKey("initiative" + ".id", ondelete="CASCADE"), primary_key=True)
+    macro_objective_id = Column(ForeignKey("macro_objective" + ".id", ondelete="CASCADE"), primary_key=True)
+
+
+class InitiativeFocusCoverageModel(db.Model):
+    """Focuses reached by the cause indicators of an initiative, kept up to date by `refresh_initiative_coverage`."""
+    __tablename__ = "initiative_focus_coverage"
+
+    initiative_id = Column(ForeignKey("initiative" + ".id", ondelete="CASCADE"), primary_key=True)
+    focus_id = Column(ForeignKey("focus" + ".id", ondelete="CASCADE"), primary_key=True)
+
+
 class InitiativeAnnexFileModel(db.Model):
     uuid = Column(String(), default=str(uuid4()), primary_key=True)
     filename = Column(String(), nullable=False)
@@ -1,4 +1,22 @@
 class Queries:
+    # effective (initiative, cause, problem) edges: default initiatives list them in
+    # initiative_cause_problem_association, custom ones reach every problem associated with their causes
+    INITIATIVE_EFFECTIVE_ASSOCIATION_VIEW = """
+    CREATE OR REPLACE VIEW initiative_effective_association AS
+    SELECT icpa.initiative_id, icpa.cause_id, icpa.problem_id
+    FROM initiative_cause_problem_association icpa
+    JOIN initiative i ON i.id = icpa.initiative_id
+    WHERE i.is_default = true
+    UNION ALL
+    SELECT ica.initiative_id, ica.cause_id, cpa.problem_id
+    FROM initiative_cause_association ica
+    JOIN initiative i ON i.id = ica.initiative_id
+    JOIN cause_problem_association cpa ON cpa.cause_id = ica.cause_id
+    WHERE i.is_default = false
+    """
+
+    DROP_INITIATIVE_EFFECTIVE_ASSOCIATION_VIEW = "DROP VIEW IF EXISTS initiative_effective_association"
+
     CUSTOM_INITIATIVE_LIST = """
     SELECT sub.* FROM
     (
@@ -1,35 +1,21 @@
 import logging
 from typing import List
 
-from sqlalchemy import text, select, exists, delete, distinct
+from sqlalchemy import text, select, exists, delete, distinct, and_, insert
 from sqlalchemy.sql.functions import count
 
 from app.cause_problem_association.models import CauseAndProblemAssociation
-from app.causes.models import CauseModel
+from app.causes.models import CauseModel, CauseIndicatorModel
 from app.commons.models.municipal_department_model import MunicipalDepartmentModel
-from app.initiatives.models import InitiativeModel, InitiativeCauseAssociationModel, \
-    InitiativePrioritizationModel, InitiativeCauseProblemAssociationModel, InitiativeOutcomeModel, \
-    InitiativeOutcomeAssociationModel
+from app.initiatives.models import InitiativeModel, InitiativePrioritizationModel, InitiativeOutcomeModel, \
+    InitiativeOutcomeAssociationModel, InitiativeMacroObjectiveCoverageModel, InitiativeFocusCoverageModel, \
+    initiative_effective_association
 from app.initiatives.queries import Queries
 from app.problems.models import ProblemModel
 from db import db
 
 
-def get_initiative_types(initiative_ids: List[int]):
-    default_initiative_ids = db.session.execute(
-        select(InitiativeModel.id)
-        .where(InitiativeModel.id.in_(initiative_ids), InitiativeModel.is_default == True)
-    ).scalars()
-
-    custom_initiative_ids = db.session.execute(
-        select(InitiativeModel.id)
-        .where(InitiativeModel.id.in_(initiative_ids), InitiativeModel.is_default == False)
-    ).scalars()
-
-    return default_initiative_ids, custom_initiative_ids
-
-
-def list_default_initiative_association(initiative_ids: List[int]):
+def list_initiative_association(initiative_ids: List[int]):
     query = select(
         InitiativeModel.id,
         InitiativeModel.name,
@@ -43,95 +29,90 @@ def list_default_initiative_association(initiative_ids: List[int]):
             InitiativePrioritizationModel.problem_id == ProblemModel.id
         ).label("prioritized"),
         CauseAndProblemAssociation.prioritized
-    ).select_from(InitiativeModel)
+    ).select_from(initiative_effective_association)
 
-    query = query.join(
-        InitiativeCauseProblemAssociationModel,
-        InitiativeCauseProblemAssociationModel.initiative_id == InitiativeModel.id
-    )
+    query = query.join(InitiativeModel, InitiativeModel.id == initiative_effective_association.c.initiative_id)
     query = query.join(
         CauseAndProblemAssociation,
-        CauseAndProblemAssociation.cause_id == InitiativeCauseProblemAssociationModel.cause_id
+        and_(
+            CauseAndProblemAssociation.cause_id == initiative_effective_association.c.cause_id,
+            CauseAndProblemAssociation.problem_id == initiative_effective_association.c.problem_id,
+        )
     )
-    query = query.join(CauseModel, CauseModel.id == InitiativeCauseProblemAssociationModel.cause_id)
-    query = query.join(ProblemModel, ProblemModel.id == InitiativeCauseProblemAssociationModel.problem_id)
-    query = query.where(InitiativeModel.id.in_(initiative_ids))
-    query = query.where(ProblemModel.prioritized==True)
-    query = query.where(CauseAndProblemAssociation.prioritized==True)
-    query = query.where(CauseAndProblemAssociation.problem_id == InitiativeCauseProblemAssociationModel.problem_id)
-    query = query.order_by(InitiativeModel.id, CauseModel.id, ProblemModel.id)
-
-    # todo: validar esta logica con sergio, por que tengo que validar de que si o si el problema esta priorizado?
-    # query = query.where(InitiativeModel.id == initiative_id, ProblemModel.prioritized == True)
+    query = query.join(CauseModel, CauseModel.id == initiative_effective_association.c.cause_id)
+    query = query.join(ProblemModel, ProblemModel.id == initiative_effective_association.c.problem_id)
+    query = query.where(initiative_effective_association.c.initiative_id.in_(initiative_ids))
+    query = query.where(ProblemModel.prioritized == True)
+    query = query.where(CauseAndProblemAssociation.prioritized == True)
+    # default initiatives first, as when they were listed by two queries
+    query = query.order_by(InitiativeModel.is_default.desc(), InitiativeModel.id, CauseModel.id, ProblemModel.id)
 
     rs = db.session.execute(query).all()
     return rs
 
 
-def list_custom_initiative_association(initiative_ids: List[int]):
-    query = select(
-        InitiativeModel.id,
-        InitiativeModel.name,
-        CauseModel.id,
-        CauseModel.name,
-        ProblemModel.id,
-        ProblemModel.name,
-        exists().where(
-            InitiativePrioritizationModel.initiative_id == InitiativeModel.id,
-            InitiativePrioritizationModel.cause_id == CauseModel.id,
-            InitiativePrioritizationModel.problem_id == ProblemModel.id
-        ).label("prioritized"),
-        CauseAndProblemAssociation.prioritized
-    ).select_from(InitiativeModel)
-    query = query.join(
-        InitiativeCauseAssociationModel,
-        InitiativeCauseAssociationModel.initiative_id == InitiativeModel.id
-    )
-    query = query.join(
-        CauseAndProblemAssociation,
-        CauseAndProblemAssociation.cause_id == InitiativeCauseAssociationModel.cause_id
+def check_initiative_prioritization_is_valid(initiative_id: int, cause_id: int, problem_id: str):
+    query = (
+        select(
+            exists()
+            .where(
+                initiative_effective_association.c.initiative_id == initiative_id,
+                initiative_effective_association.c.cause_id == cause_id,
+                initiative_effective_association.c.problem_id == problem_id,
+            )
+        )
     )
-    query = query.join(CauseModel, CauseModel.id == CauseAndProblemAssociation.cause_id)
-    query = query.join(ProblemModel, ProblemModel.id == CauseAndProblemAssociation.problem_id)
-    query = query.where(InitiativeModel.id.in_(initiative_ids))
-    query = query.where(CauseAndProblemAssociation.prioritized==True)
-    query = query.where(ProblemModel.prioritized==True)
-    query = query.order_by(InitiativeModel.id, CauseModel.id, ProblemModel.id)
+    return db.session.execute(query).scalar()
 
-    rs = db.session.execute(query).all()
-    return rs
 
+def refresh_initiative_coverage(initiative_ids=None) -> None:
+    """
+    Rebuild the macro objective and focus coverage of the given initiatives (all when None), `initiative_ids` can
+    be a list or a select of ids. Run it after changing their causes, the problems of those causes or the
+    macro objective and focus mappings, the caller commits.
+    """
+    from app.plan.models import MacroObjectiveProblemAssociationModel, FocusAssociationModel
 
-def check_initiative_prioritization_is_valid(initiative_id: int, cause_id: int, problem_id: str):
-    is_default = db.session.execute(
-        select(InitiativeModel.is_default).where(InitiativeModel.id == initiative_id)
-    ).scalar()
+    macro_objective_query = (
+        select(
+            initiative_effective_association.c.initiative_id,
+            MacroObjectiveProblemAssociationModel.macro_objective_id,
+        )
+        .join(
+            MacroObjectiveProblemAssociationModel,
+            MacroObjectiveProblemAssociationModel.problem_id == initiative_effective_association.c.problem_id
+        )
+        .distinct()
+    )
+    focus_query = (
+        select(initiative_effective_association.c.initiative_id, FocusAssociationModel.focus_id)
+        .join(CauseIndicatorModel, CauseIndicatorModel.cause_id == initiative_effective_association.c.cause_id)
+        .join(FocusAssociationModel, FocusAssociationModel.cause_indicator_id == CauseIndicatorModel.id)
+        .distinct()
+    )
+    delete_macro_objective_stmt = delete(InitiativeMacroObjectiveCoverageModel)
+    delete_focus_stmt = delete(InitiativeFocusCoverageModel)
 
-    if is_default:
-        query = (
-            select(
-                exists()
-                .where(
-                    InitiativeCauseProblemAssociationModel.initiative_id == initiative_id,
-                    InitiativeCauseProblemAssociationModel.cause_id == cause_id,
-                    InitiativeCauseProblemAssociationModel.problem_id == problem_id,
-                )
-            )
+    if initiative_ids is not None:
+        macro_objective_query = macro_objective_query.where(
+            initiative_effective_association.c.initiative_id.in_(initiative_ids)
         )
-    else:
-        query = (
-            select(
-                exists()
-                .where(
-                    InitiativeCauseAssociationModel.cause_id == CauseAndProblemAssociation.cause_id,  # inner join
-                    InitiativeCauseAssociationModel.initiative_id == initiative_id,
-                    InitiativeCauseAssociationModel.cause_id == cause_id,
-                    CauseAndProblemAssociation.problem_id == problem_id,
-                )
-            )
+        focus_query = focus_query.where(initiative_effective_association.c.initiative_id.in_(initiative_ids))
+        delete_macro_objective_stmt = delete_macro_objective_stmt.where(
+            InitiativeMacroObjectiveCoverageModel.initiative_id.in_(initiative_ids)
         )
+        delete_focus_stmt = delete_focus_stmt.where(InitiativeFocusCoverageModel.initiative_id.in_(initiative_ids))
 
-    return db.session.execute(query).scalar()
+    db.session.execute(delete_macro_objective_stmt)
+    db.session.execute(delete_focus_stmt)
+    db.session.execute(
+        insert(InitiativeMacroObjectiveCoverageModel).from_select(
+            ["initiative_id", "macro_objective_id"], macro_objective_query
+        )
+    )
+    db.session.execute(
+        insert(InitiativeFocusCoverageModel).from_select(["initiative_id", "focus_id"], focus_query)
+    )
 
 
 def prioritize_initiative(initiative_id: int, cause_id: int, problem_id: str):
@@ -19,7 +19,7 @@ from app.initiatives.models import InitiativeModel, InitiativePrioritizationMode
     municipal_department_per_initiative_association_table, InitiativeCauseAssociationModel, InitiativeOutcomeModel
 from app.initiatives.repositories import InitiativeRepository
 from app.problems.models import ProblemModel
-from db import db
+from db import db, read_replica
 
 
 def check_municipal_department_id_exist(municipal_department_id):
@@ -85,6 +85,8 @@ def create_initiative(initiative_dict: Dict):
                 for cause_id in initiative_dict["cause_ids"]
             ]
         )
+        db.session.flush()
+        repositories.refresh_initiative_coverage([initiative_obj.id])
 
         db.session.commit()
         return initiative_obj
@@ -168,6 +170,8 @@ def update_initiative(initiative_model: InitiativeModel, initiative_dict: Dict):
                     InitiativeCauseAssociationModel.cause_id.in_(cause_id_to_delete_ls)
                 )
             )
+            db.session.flush()
+            repositories.refresh_initiative_coverage([initiative_model.id])
 
         db.session.commit()
         return initiative_model
@@ -209,12 +213,7 @@ def delete_initiative(initiative_id):
 
 
 def list_initiative_association(initiative_ids: List[int]) -> Generator[InitiativeAssociationDto, None, None]:
-    default_initiative_ids, custom_initiative_ids = repositories.get_initiative_types(initiative_ids)
-    default_initiative_ids = list(default_initiative_ids)
-    custom_initiative_ids = list(custom_initiative_ids)
-
-    initiative_association_ls = repositories.list_default_initiative_association(default_initiative_ids)
-    initiative_association_ls += repositories.list_custom_initiative_association(custom_initiative_ids)
+    initiative_association_ls = repositories.list_initiative_association(initiative_ids)
     for initiative_id, initiative_name, cause_id, cause_name, problem_id, problem_name, prioritized, problem_prioritized in initiative_association_ls:
         yield InitiativeAssociationDto(
             initiative_id=initiative_id,
@@ -228,6 +227,36 @@ def list_initiative_association(initiative_ids: List[int]) -> Generator[Initiati
         )
 
 
+@read_replica
+def build_initiative_association_tree(initiative_ids: List[int]) -> List[Dict]:
+    """initiative -> cause -> problem tree of the associations, built in a single pass over them."""
+    initiatives = dict()
+    for item in list_initiative_association(initiative_ids):
+        initiative_dict = initiatives.get(item.initiative_id)
+        if initiative_dict is None:
+            initiative_dict = initiatives[item.initiative_id] = dict(
+                initiativeId=item.initiative_id, initiativeName=item.initiative_name, causes=dict()
+            )
+
+        cause_dict = initiative_dict["causes"].get(item.cause_id)
+        if cause_dict is None:
+            cause_dict = initiative_dict["causes"][item.cause_id] = dict(
+                causeId=item.cause_id, causeName=item.cause_name, problems=dict()
+            )
+
+        cause_dict["problems"].setdefault(
+            item.problem_id,
+            dict(problemId=item.problem_id, problemName=item.problem_name, prioritized=item.prioritized)
+        )
+
+    output = list(initiatives.values())
+    for initiative_dict in output:
+        initiative_dict["causes"] = list(initiative_dict["causes"].values())
+        for cause_dict in initiative_dict["causes"]:
+            cause_dict["problems"] = list(cause_dict["problems"].values())
+    return output
+
+
 def bulk_update_initiative_prioritization(
         to_prioritize: List[InitiativePrioritizationRequestDTO],
         to_deprioritize: List[InitiativePrioritizationRequestDTO]
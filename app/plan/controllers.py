@@ -2,27 +2,35 @@ from http import HTTPStatus
 from typing import List
 
 from apiflask import abort
+from flask import g
 from sqlalchemy import select, and_
 from sqlalchemy.orm import joinedload, aliased
 from sqlalchemy.sql.functions import max
 
 from app.auth.auth_config import auth_token
-from app.causes.models import CauseIndicatorDataModel, CauseIndicatorModel
+from app.causes.models import CauseIndicatorDataModel, CauseIndicatorModel, CAUSE_INDICATOR_LOAD_PROFILES
 from app.commons.schemas.request import factory_response_schema
-from app.commons.sqlalchemy_utils import desc_
+from app.commons.sqlalchemy_utils import load_profile
 from app.plan import bp, services
 from app.plan.dto import CreateOrUpdateMacroObjectiveGoalRequestDTO, CreateOrUpdatePlanRequestDTO, \
     UpdateFocusGoalRequestDTO, SetDiagnosisToProblemIndRequestDTO, SetDiagnosisToCauseIndRequestDTO, \
-    SetTacticalDimensionDTO
-from app.plan.models import ProblemDiagnosisModel, CauseIndicatorDiagnosisModel, TacticalDimensionModel, PlanModel
+    SetTacticalDimensionDTO, FreezePlanVersionRequestDTO
+from app.plan.models import ProblemDiagnosisModel, CauseIndicatorDiagnosisModel, TacticalDimensionModel
 from app.plan.schemas.request_schemas import CreateOrUpdatePlanRequestSchema, \
     UpdateMacroObjectiveGoalRequestSchema, UpdateFocusGoalRequestSchema, SetDiagnosisToProblemIndRequestSchema, \
-    SetDiagnosisToCauseIndRequestSchema, SetTacticalDimensionRequestSchema
+    SetDiagnosisToCauseIndRequestSchema, SetTacticalDimensionRequestSchema, FreezePlanVersionRequestSchema
 from app.plan.schemas.response_schemas import ListMacroObjectivesResponseSchema, ListFocusesResponseSchema, \
-    DetailPlanResponseSchema, TacticalDimensionResSchema
-from app.problems.models import ProblemModel, ProblemIndicatorDataModel
+    DetailPlanResponseSchema, TacticalDimensionResSchema, PlanListItemResponseSchema, PlanVersionResponseSchema, \
+    DetailPlanVersionResponseSchema
+from app.problems.models import ProblemModel, ProblemIndicatorDataModel, PROBLEM_INDICATOR_LOAD_PROFILES
 from app.problems.services import format_relative_frequency
-from db import db
+from db import db, read_replica
+
+
+@bp.before_request
+def reset_current_plan():
+    # `g` outlives the request when an app context was already pushed, the plan is resolved again for each request
+    g.pop("current_plan", None)
 
 
 @bp.get("/status")
@@ -49,6 +57,43 @@ def get_plan_controller():
     abort(HTTPStatus.NOT_FOUND)
 
 
+@bp.get("/all")
+@bp.output(PlanListItemResponseSchema(many=True))
+@bp.auth_required(auth_token)
+def list_plans_controller():
+    return services.list_plans()
+
+
+@bp.post("/new")
+@bp.input(CreateOrUpdatePlanRequestSchema, location="json")
+@bp.output(factory_response_schema(PlanListItemResponseSchema))
+@bp.auth_required(auth_token)
+def create_plan_controller(create_plan_request_dto: CreateOrUpdatePlanRequestDTO):
+    return dict(data=services.create_plan(create_plan_request_dto))
+
+
+@bp.get("/versions")
+@bp.output(PlanVersionResponseSchema(many=True))
+@bp.auth_required(auth_token)
+def list_plan_versions_controller():
+    return services.list_plan_versions()
+
+
+@bp.post("/versions")
+@bp.input(FreezePlanVersionRequestSchema, location="json")
+@bp.output(factory_response_schema(PlanVersionResponseSchema))
+@bp.auth_required(auth_token)
+def freeze_plan_version_controller(dto: FreezePlanVersionRequestDTO):
+    return dict(data=services.freeze_plan_version(dto, auth_token.current_user["id"]))
+
+
+@bp.get("/versions/<int:plan_version_id>")
+@bp.output(factory_response_schema(DetailPlanVersionResponseSchema))
+@bp.auth_required(auth_token)
+def get_plan_version_controller(plan_version_id: int):
+    return dict(data=services.get_plan_version(plan_version_id))
+
+
 @bp.get("/macro-objectives/all")
 @bp.output(ListMacroObjectivesResponseSchema(many=True))
 @bp.auth_required(auth_token)
@@ -64,8 +109,8 @@ def update_macro_objectives_goals_controller(
         macro_obj_id: int,
         dto_ls: List[CreateOrUpdateMacroObjectiveGoalRequestDTO]
 ):
-    services.bulk_create_or_update_macro_objective_goals(macro_obj_id, dto_ls)
-    return dict()
+    goal_ids = services.bulk_create_or_update_macro_objective_goals(macro_obj_id, dto_ls)
+    return dict(data=goal_ids)
 
 
 @bp.get("/macro-objectives/focus/all")
@@ -84,8 +129,8 @@ def update_focus_goals_controller(
         focus_id: int,
         dto_ls: List[UpdateFocusGoalRequestDTO]
 ):
-    services.update_focus_goals(macro_obj_id, focus_id, dto_ls)
-    return dict()
+    goal_ids = services.update_focus_goals(macro_obj_id, focus_id, dto_ls)
+    return dict(data=goal_ids)
 
 
 @bp.get("/problem-diagnoses")
@@ -183,7 +228,7 @@ def set_tactical_dimension_controller(dto: SetTacticalDimensionDTO):
 #
 #     return macro_output
 
-def _get_causes():
+def _get_causes(plan_id: int):
     last_period_by_cause_ind_id_subquery = (
         select(
             CauseIndicatorDataModel.cause_indicator_id,
@@ -216,6 +261,7 @@ def _get_causes():
             cause_ind_data_subquery
         )
         .select_from(CauseIndicatorDiagnosisModel)
+        .options(load_profile(cause_ind_data_subquery, CAUSE_INDICATOR_LOAD_PROFILES, "export"))
         .outerjoin(
             CauseIndicatorModel,
             CauseIndicatorModel.id == CauseIndicatorDiagnosisModel.cause_indicator_id
@@ -224,14 +270,16 @@ def _get_causes():
             cause_ind_data_subquery,
             cause_ind_data_subquery.cause_indicator_id == CauseIndicatorModel.code
         )
+        .where(CauseIndicatorDiagnosisModel.plan_id == plan_id)
     )
 
     return list(db.session.execute(query).all())
 
 
-def _get_ini():
+def _get_ini(plan_id: int):
     query = (
         select(TacticalDimensionModel)
+        .where(TacticalDimensionModel.plan_id == plan_id)
     )
     return list(
         db.session.execute(query).scalars()
@@ -240,6 +288,15 @@ def _get_ini():
 
 @bp.get("/pdf")
 def get_pdf():
+    # the plan is resolved on the primary, a lagging replica would answer 404 for a plan that was just created
+    plan_model = services.get_current_plan()
+    if not plan_model:
+        abort(HTTPStatus.NOT_FOUND)
+    return _get_pdf_output(plan_model)
+
+
+@read_replica
+def _get_pdf_output(plan_model):
     last_period_by_problem_id_subquery = (
         select(ProblemIndicatorDataModel.problem_id, max(ProblemIndicatorDataModel.period).label("period"))
         .group_by(ProblemIndicatorDataModel.problem_id)
@@ -264,7 +321,10 @@ def get_pdf():
     rs = db.session.execute(
         select(ProblemDiagnosisModel, ProblemModel, problem_ind_data_subquery)
         .select_from(ProblemDiagnosisModel)
-        .options(joinedload(ProblemDiagnosisModel.problem))
+        .options(
+            joinedload(ProblemDiagnosisModel.problem),
+            load_profile(problem_ind_data_subquery, PROBLEM_INDICATOR_LOAD_PROFILES, "export"),
+        )
         .outerjoin(
             ProblemModel,
             ProblemModel.id == ProblemDiagnosisModel.problem_id
@@ -272,6 +332,7 @@ def get_pdf():
             problem_ind_data_subquery,
             problem_ind_data_subquery.problem_id == ProblemModel.code
         )
+        .where(ProblemDiagnosisModel.plan_id == plan_model.id)
     ).all()
 
     output = dict(
@@ -281,12 +342,6 @@ def get_pdf():
         initiative_plans=list(),
     )
 
-    plan_model = db.session.execute(
-        select(PlanModel)
-        .order_by(desc_(PlanModel.id))
-        .limit(1)
-    ).scalar()
-
     output["plan"] = dict(
         title=plan_model.title,
         start_at=plan_model.start_at.isoformat() if plan_model.start_at else None,
@@ -317,7 +372,7 @@ def get_pdf():
 
         output["problem_diagnoses"].append(diagnosis_dict)
 
-    for cause_diagnosis_model, cause_indicator_model, cause_ind_data_model in _get_causes():
+    for cause_diagnosis_model, cause_indicator_model, cause_ind_data_model in _get_causes(plan_model.id):
         diagnosis_dict = dict(
             cause_indicator_name=cause_indicator_model.name,
             diagnosis=cause_diagnosis_model.diagnosis,
@@ -331,6 +386,6 @@ def get_pdf():
 
         output["cause_indicator_diagnoses"].append(diagnosis_dict)
 
-    output["initiative_plans"] = TacticalDimensionResSchema().dump(_get_ini(), many=True)
+    output["initiative_plans"] = TacticalDimensionResSchema().dump(_get_ini(plan_model.id), many=True)
 
     return output
@@ -11,6 +11,11 @@ class CreateOrUpdatePlanRequestDTO:
     end_at: Optional[date]
 
 
+@dataclass
+class FreezePlanVersionRequestDTO:
+    name: Optional[str] = None
+
+
 @dataclass
 class MacroObjectiveDTO:
     @dataclass
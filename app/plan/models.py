@@ -1,8 +1,9 @@
 from datetime import datetime
 from typing import List
 
-from sqlalchemy import Column, Integer, String, ForeignKey, Date, DateTime, REAL, ARRAY, TEXT, UniqueConstraint
-from sqlalchemy.orm import Mapped, relationship
+from sqlalchemy import Column, Integer, String, ForeignKey, Date, DateTime, REAL, ARRAY, TEXT, UniqueConstraint, Index, \
+    LargeBinary, event
+from sqlalchemy.orm import Mapped, relationship, deferred
 
 from app.causes.models import CauseIndicatorModel, CauseModel
 from app.commons.models.municipal_department_model import MunicipalDepartmentModel
@@ -26,6 +27,33 @@ class PlanModel(db.Model):
     strategic_dimension_updated_at = Column(DateTime(), nullable=True)
 
 
+class PlanVersionModel(db.Model):
+    """
+    Frozen version of a plan: goals, diagnoses and tactical dimensions as a zlib compressed JSON snapshot, see
+    app.plan.services.freeze_plan_version. Versions are never updated.
+    """
+    __tablename__ = "plan_version"
+    __table_args__ = (
+        UniqueConstraint("plan_id", "version", ),
+    )
+
+    id = Column(Integer(), primary_key=True)
+    plan_id = Column(ForeignKey(PlanModel.__tablename__ + ".id", ondelete="CASCADE"), nullable=False)
+    version = Column(Integer(), nullable=False)
+    name = Column(String(), nullable=True)
+
+    snapshot = deferred(Column(LargeBinary(), nullable=False))
+    snapshot_size = Column(Integer(), nullable=False)
+
+    created_at = Column(DateTime(), default=datetime.utcnow, nullable=False)
+    created_by_id = Column(ForeignKey("users.id"), nullable=True)
+
+
+@event.listens_for(PlanVersionModel, "before_update")
+def _reject_plan_version_update(mapper, connection, target):
+    raise ValueError(f"Plan versions are immutable, plan_version_id={target.id}")
+
+
 class MacroObjectiveModel(db.Model):
     __tablename__ = "macro_objective"
 
@@ -108,6 +136,10 @@ class FocusAssociationModel(db.Model):
     macro_objective: Mapped["MacroObjectiveModel"] = relationship()
     focus: Mapped["FocusModel"] = relationship()
 
+    __table_args__ = (
+        Index("ix_focus_association_cause_indicator", "cause_indicator_id"),
+    )
+
 
 class FocusGoalModel(db.Model):
     __tablename__ = "focus_goal"
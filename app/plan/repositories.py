@@ -1,24 +1,27 @@
+import copy
 from datetime import datetime
-from typing import Optional, List
+from typing import Optional, List, Dict, Tuple
 
-from sqlalchemy import select, func, exists, tuple_, delete, not_, desc, and_, update
-from sqlalchemy.orm import aliased
+from sqlalchemy import select, func, exists, tuple_, delete, not_, desc, and_, update, union_all, or_, text
+from sqlalchemy.dialects.postgresql import insert, aggregate_order_by
+from sqlalchemy.orm import aliased, selectinload, undefer
 
 from app.cause_problem_association.models import CauseAndProblemAssociation
 from app.causes.models import CauseIndicatorModel, CauseModel
-from app.initiatives.models import InitiativeModel, InitiativePrioritizationModel
+from app.initiatives.models import InitiativeModel, InitiativePrioritizationModel, InitiativeMacroObjectiveCoverageModel, \
+    InitiativeFocusCoverageModel
 from app.plan.dto import MacroObjectiveDTO, CreateOrUpdateMacroObjectiveGoalRequestDTO, \
     CreateOrUpdatePlanRequestDTO, FocusListItemDTO, UpdateFocusGoalRequestDTO, \
     ProblemDiagnosisListItemDTO, SetDiagnosisToProblemIndRequestDTO, \
     FocusIndicatorIncludedInPLanListItemDTO, SetDiagnosisToCauseIndRequestDTO, TacticalDimensionListItemDTO, \
     SetTacticalDimensionDTO
-from app.plan.models import PlanModel, MacroObjectiveModel, \
+from app.plan.models import PlanModel, PlanVersionModel, MacroObjectiveModel, \
     MacroObjectiveProblemAssociationModel, FocusModel, FocusAssociationModel, FocusGoalModel, \
     MacroObjectiveCustomIndicatorModel, MacroObjectiveGoalModel, FocusCustomIndicatorModel, \
     ProblemDiagnosisModel, CauseIndicatorDiagnosisModel, TacticalDimensionModel, TacticalDimensionDepartmentRoleModel, \
     TacticalDimensionGoalModel
 from app.problems.models import ProblemModel
-from db import db
+from db import db, read_replica
 
 
 def get_last_plan_id() -> Optional[int]:
@@ -47,13 +50,18 @@ def get_plan(plan_id: int):
     return db.session.execute(query).scalar()
 
 
-def create_plan(dto: CreateOrUpdatePlanRequestDTO):
+def list_plans() -> List[PlanModel]:
+    return db.session.execute(select(PlanModel).order_by(desc(PlanModel.id))).scalars().all()
+
+
+def create_plan(dto: CreateOrUpdatePlanRequestDTO) -> PlanModel:
     plan_model = PlanModel(
         title=dto.title,
         start_at=dto.start_at,
         end_at=dto.end_at,
     )
     db.session.add(plan_model)
+    return plan_model
 
 
 def update_plan(plan_id: int, dto: CreateOrUpdatePlanRequestDTO):
@@ -83,11 +91,40 @@ def list_macro_objectives():
     ]
 
 
-def list_macro_objectives_with_goals(plan_id: int) -> List[MacroObjectiveDTO]:
+# plan_id -> (cache key, macro objectives), see get_macro_objectives_cache_key
+_macro_objectives_cache: Dict[int, Tuple[tuple, List[MacroObjectiveDTO]]] = dict()
+
+
+def get_macro_objectives_cache_key(plan_model: PlanModel) -> tuple:
+    """
+    (plan_id, strategic_dimension_updated_at, prioritized problem ids), every write to the macro objective goals and
+    custom indicators touches strategic_dimension_updated_at.
+    """
+    problem_ids = db.session.execute(
+        select(ProblemModel.id).where(ProblemModel.prioritized == True)
+    ).scalars()
+    return plan_model.id, plan_model.strategic_dimension_updated_at, tuple(sorted(problem_ids))
+
+
+def clear_macro_objectives_cache(plan_id: Optional[int] = None):
+    if plan_id is None:
+        _macro_objectives_cache.clear()
+    else:
+        _macro_objectives_cache.pop(plan_id, None)
+
+
+# reads the primary like the cache key, a lagging replica could store stale goals under a fresh key
+def list_macro_objectives_with_goals(plan_id: int, cache_key: Optional[tuple] = None) -> List[MacroObjectiveDTO]:
+    if cache_key is not None:
+        cached_key, cached_output = _macro_objectives_cache.get(plan_id, (None, None))
+        if cached_key == cache_key:
+            return copy.deepcopy(cached_output)
+
     macro_query = (
         select(
             MacroObjectiveModel
         ).select_from(MacroObjectiveModel)
+        .options(selectinload(MacroObjectiveModel.custom_indicators))
     )
     macro_rs = db.session.execute(macro_query).scalars()
 
@@ -104,7 +141,6 @@ def list_macro_objectives_with_goals(plan_id: int) -> List[MacroObjectiveDTO]:
 
     macro_goal_query = (
         select(
-            MacroObjectiveGoalModel.macro_objective_id,
             MacroObjectiveGoalModel,
         ).select_from(MacroObjectiveGoalModel)
         .outerjoin(ProblemModel, ProblemModel.id == MacroObjectiveGoalModel.problem_id)
@@ -115,7 +151,6 @@ def list_macro_objectives_with_goals(plan_id: int) -> List[MacroObjectiveDTO]:
     )
     macro_goal_query2 = (
         select(
-            MacroObjectiveGoalModel.macro_objective_id,
             MacroObjectiveGoalModel,
         ).select_from(MacroObjectiveGoalModel)
         .where(
@@ -123,8 +158,9 @@ def list_macro_objectives_with_goals(plan_id: int) -> List[MacroObjectiveDTO]:
             MacroObjectiveGoalModel.problem_id == None
         )
     )
-    macro_goal_rs = db.session.execute(macro_goal_query).all()
-    macro_goal_rs += db.session.execute(macro_goal_query2).all()
+    macro_goal_rs = db.session.execute(
+        select(MacroObjectiveGoalModel).from_statement(union_all(macro_goal_query, macro_goal_query2))
+    ).scalars()
 
     output = dict()
 
@@ -159,9 +195,9 @@ def list_macro_objectives_with_goals(plan_id: int) -> List[MacroObjectiveDTO]:
         )
         macro_dto.problems.append(problem_dto)
 
-    for macro_objective_id, macro_goal_model in macro_goal_rs:
-        macro_dto: MacroObjectiveDTO = output[macro_objective_id]
+    for macro_goal_model in macro_goal_rs:
         macro_goal_model: MacroObjectiveGoalModel
+        macro_dto: MacroObjectiveDTO = output[macro_goal_model.macro_objective_id]
         macro_goal_dto = MacroObjectiveDTO.GoalDTO(
             id=macro_goal_model.id,
             problem_id=macro_goal_model.problem_id,
@@ -173,7 +209,10 @@ def list_macro_objectives_with_goals(plan_id: int) -> List[MacroObjectiveDTO]:
         )
         macro_dto.goals.append(macro_goal_dto)
 
-    return list(output.values())
+    output = list(output.values())
+    if cache_key is not None:
+        _macro_objectives_cache[plan_id] = (cache_key, copy.deepcopy(output))
+    return output
 
 
 def delete_unused_macro_objective_goals(
@@ -192,74 +231,116 @@ def delete_unused_macro_objective_goals(
     db.session.execute(query)
 
 
-def create_or_update_macro_objective_goal(
-        plan_id: int,
-        macro_objective_id: int,
-        create_macro_objective_goal_dto: CreateOrUpdateMacroObjectiveGoalRequestDTO
-) -> MacroObjectiveGoalModel:
-    model = MacroObjectiveGoalModel(
-        plan_id=plan_id,
-        macro_objective_id=macro_objective_id,
-        problem_id=create_macro_objective_goal_dto.problem_id,
-        custom_indicator_id=create_macro_objective_goal_dto.custom_indicator_id,
-
-        initial_rate=create_macro_objective_goal_dto.initial_rate,
-        goal_value=create_macro_objective_goal_dto.goal_value,
-        goal_justification=create_macro_objective_goal_dto.goal_justification,
-        end_at=create_macro_objective_goal_dto.end_at,
-    )
-    if create_macro_objective_goal_dto.id:
-        model.id = create_macro_objective_goal_dto.id
-        db.session.merge(model)
-    else:
-        db.session.add(model)
-        db.session.flush()
-    return model
+def _bulk_upsert_goals(goal_model, rows: List[dict], where=None) -> List[int]:
+    """
+    Insert or update `rows` in one statement and return their ids. Rows without id get the next value of the
+    serial sequence, rows with an id are only updated when `where` holds for the stored row.
+    """
+    if not rows:
+        return []
+
+    # ON CONFLICT DO UPDATE can't touch a row twice, the last one wins as it did with one merge per row
+    rows = list({row["id"]: row for row in rows if row["id"]}.values()) + [row for row in rows if not row["id"]]
+    next_id = func.nextval(func.pg_get_serial_sequence(goal_model.__tablename__, "id"))
+    insert_stmt = insert(goal_model).values([dict(row, id=row["id"] or next_id) for row in rows])
+    insert_stmt = insert_stmt.on_conflict_do_update(
+        index_elements=[goal_model.id],
+        set_={column: insert_stmt.excluded[column] for column in rows[0] if column != "id"},
+        where=where,
+    ).returning(goal_model.id)
+    return db.session.execute(insert_stmt).scalars().all()
+
+
+def _bulk_upsert_custom_indicators(custom_indicator_model, owner: dict, custom_indicator_dto_ls) -> List[str]:
+    """
+    Insert or update the custom indicators of `owner` in one statement and return their ids, indicators of another
+    owner are not updated.
+    """
+    rows = {
+        str(dto.id): dict(
+            owner,
+            id=str(dto.id),
+            name=dto.name,
+            formula_description=dto.formula_description,
+            unit_metric=dto.unit_metric,
+            source=dto.source,
+            frequency=dto.frequency,
+            baseline_value=dto.baseline_value,
+            baseline_year=dto.baseline_year,
+            observation=dto.observation,
+        )
+        for dto in custom_indicator_dto_ls
+    }
+    if not rows:
+        return []
+
+    insert_stmt = insert(custom_indicator_model).values(list(rows.values()))
+    insert_stmt = insert_stmt.on_conflict_do_update(
+        index_elements=[custom_indicator_model.id],
+        set_={column: insert_stmt.excluded[column] for column in next(iter(rows.values())) if column != "id"},
+        where=and_(*[getattr(custom_indicator_model, column) == value for column, value in owner.items()]),
+    ).returning(custom_indicator_model.id)
+    return db.session.execute(insert_stmt).scalars().all()
 
 
-def create_or_update_macro_objective_custom_indicator(
+def bulk_create_or_update_macro_objective_goals(
+        plan_id: int,
         macro_objective_id: int,
-        dto: CreateOrUpdateMacroObjectiveGoalRequestDTO.CustomIndicatorDTO
-) -> MacroObjectiveCustomIndicatorModel:
-    model = MacroObjectiveCustomIndicatorModel(
-        macro_objective_id=macro_objective_id,
-        id=str(dto.id),
-
-        name=dto.name,
-        formula_description=dto.formula_description,
-        unit_metric=dto.unit_metric,
-        source=dto.source,
-        frequency=dto.frequency,
-        baseline_value=dto.baseline_value,
-        baseline_year=dto.baseline_year,
-        observation=dto.observation,
-    )
-    db.session.merge(model)
-    return model
-
-
-def check_macro_objective_and_problem_are_related(macro_objective_id: int, problem_id: int):
-    query = select(exists().where(
-        MacroObjectiveProblemAssociationModel.macro_objective_id == macro_objective_id,
-        MacroObjectiveProblemAssociationModel.problem_id == problem_id,
-    ))
-    return db.session.execute(query).scalar()
+        create_or_update_macro_objective_goal_dto_ls: List[CreateOrUpdateMacroObjectiveGoalRequestDTO]
+) -> Tuple[List[str], List[int]]:
+    """
+    Upsert the custom indicators and then the goals of a macro objective, two statements in total. Returns the ids
+    of both.
+    """
+    custom_indicator_ids = _bulk_upsert_custom_indicators(
+        MacroObjectiveCustomIndicatorModel,
+        dict(macro_objective_id=macro_objective_id),
+        [
+            custom_indicator_dto
+            for goal_dto in create_or_update_macro_objective_goal_dto_ls
+            for custom_indicator_dto in goal_dto.custom_indicators or []
+        ],
+    )
+    rows = [
+        dict(
+            id=dto.id,
+            plan_id=plan_id,
+            macro_objective_id=macro_objective_id,
+            problem_id=dto.problem_id,
+            custom_indicator_id=dto.custom_indicator_id,
+            initial_rate=dto.initial_rate,
+            goal_value=dto.goal_value,
+            goal_justification=dto.goal_justification,
+            end_at=dto.end_at,
+        )
+        for dto in create_or_update_macro_objective_goal_dto_ls
+    ]
+    return custom_indicator_ids, _bulk_upsert_goals(
+        MacroObjectiveGoalModel,
+        rows,
+        where=and_(
+            MacroObjectiveGoalModel.plan_id == plan_id,
+            MacroObjectiveGoalModel.macro_objective_id == macro_objective_id,
+        ),
+    )
 
 
 def find_macro_objective_problem_association(items):
-    where_conditions = [
-        tuple_(MacroObjectiveProblemAssociationModel.macro_objective_id,
-               MacroObjectiveProblemAssociationModel.problem_id) == (macro_objective_id, problem_id)
-        for macro_objective_id, problem_id in items
-    ]
+    if not items:
+        return []
     query = select(
         MacroObjectiveProblemAssociationModel.macro_objective_id,
         MacroObjectiveProblemAssociationModel.problem_id
+    ).where(
+        tuple_(
+            MacroObjectiveProblemAssociationModel.macro_objective_id,
+            MacroObjectiveProblemAssociationModel.problem_id,
+        ).in_(list(items))
     )
-    query = query.filter(tuple_(*where_conditions))
     return db.session.execute(query).all()
 
 
+@read_replica
 def list_focuses(plan_id: int) -> List[FocusListItemDTO]:
     macro_query = (
         select(
@@ -292,6 +373,7 @@ def list_focuses(plan_id: int) -> List[FocusListItemDTO]:
             FocusAssociationModel.macro_objective_id,
             FocusModel
         )
+        .options(selectinload(FocusModel.custom_indicators))
     )
     focus_rs = db.session.execute(focus_query).all()
 
@@ -317,8 +399,9 @@ def list_focuses(plan_id: int) -> List[FocusListItemDTO]:
             FocusGoalModel.cause_indicator_id == None,
         )
     )
-    focus_goal_rs = list(db.session.execute(focus_goal_query).scalars())
-    focus_goal_rs += list(db.session.execute(focus_goal_query2).scalars())
+    focus_goal_rs = db.session.execute(
+        select(FocusGoalModel).from_statement(union_all(focus_goal_query, focus_goal_query2))
+    ).scalars().all()
 
     cause_indicator_query = (
         select(
@@ -383,8 +466,8 @@ def list_focuses(plan_id: int) -> List[FocusListItemDTO]:
 
     for focus_goal_model in focus_goal_rs:
         focus_goal_model: FocusGoalModel
-        key = f"{focus_goal_model.macro_objective_id}-{focus_goal_model.focus_id}"
-        temp_ls = focus_goal_dict.get(key, list())
+        key = (focus_goal_model.macro_objective_id, focus_goal_model.focus_id)
+        temp_ls = focus_goal_dict.setdefault(key, list())
         focus_goal_dto = FocusListItemDTO.FocusDTO.FocusGoalDTO(
             focus_id=focus_goal_model.focus_id,
             cause_indicator_id=focus_goal_model.cause_indicator_id,
@@ -395,23 +478,20 @@ def list_focuses(plan_id: int) -> List[FocusListItemDTO]:
             end_at=focus_goal_model.end_at,
         )
         temp_ls.append(focus_goal_dto)
-        focus_goal_dict[key] = temp_ls
 
     for macro_objective_id, focus_id, cause_indicator_model in cause_indicator_rs:
         cause_indicator_model: CauseIndicatorModel
-        key = f"{macro_objective_id}-{focus_id}"
-        temp_ls = cause_ind_dict.get(key, list())
+        temp_ls = cause_ind_dict.setdefault((macro_objective_id, focus_id), list())
         cause_ind_dto = FocusListItemDTO.FocusDTO.CauseIndicatorDTO(
             id=cause_indicator_model.id,
             name=cause_indicator_model.name,
         )
         temp_ls.append(cause_ind_dto)
-        cause_ind_dict[key] = temp_ls
 
     for macro_objective_id, focus_model in focus_rs:
         focus_list_dto = output[macro_objective_id]
-        focus_goal_dto_ls = focus_goal_dict.get(f"{macro_objective_id}-{focus_model.id}", list())
-        cause_ind_dto_ls = cause_ind_dict.get(f"{macro_objective_id}-{focus_model.id}", list())
+        focus_goal_dto_ls = focus_goal_dict.get((macro_objective_id, focus_model.id), list())
+        cause_ind_dto_ls = cause_ind_dict.get((macro_objective_id, focus_model.id), list())
         focus_dto = FocusListItemDTO.FocusDTO(
             id=focus_model.id,
             name=focus_model.name,
@@ -440,48 +520,45 @@ def list_focuses(plan_id: int) -> List[FocusListItemDTO]:
     return list(output.values())
 
 
-def create_or_update_focus_goal(plan_id: int, macro_objective_id: int, focus_id: int, dto: UpdateFocusGoalRequestDTO):
-    model = FocusGoalModel(
-        plan_id=plan_id,
-        macro_objective_id=macro_objective_id,
-        focus_id=focus_id,
-
-        cause_indicator_id=dto.cause_indicator_id,
-        custom_indicator_id=dto.custom_indicator_id,
-
-        initial_rate=dto.initial_rate,
-        goal_value=dto.goal_value,
-        goal_justification=dto.goal_justification,
-        end_at=dto.end_at,
-    )
-    if dto.id:
-        model.id = dto.id
-        db.session.merge(model)
-    else:
-        db.session.add(model)
-        db.session.flush()
-    return model
-
-
-def create_or_update_focus_custom_indicator(
+def bulk_create_or_update_focus_goals(
+        plan_id: int,
+        macro_objective_id: int,
         focus_id: int,
-        dto: UpdateFocusGoalRequestDTO.CustomIndicatorDTO
-) -> MacroObjectiveCustomIndicatorModel:
-    model = FocusCustomIndicatorModel(
-        focus_id=focus_id,
-        id=str(dto.id),
-
-        name=dto.name,
-        formula_description=dto.formula_description,
-        unit_metric=dto.unit_metric,
-        source=dto.source,
-        frequency=dto.frequency,
-        baseline_value=dto.baseline_value,
-        baseline_year=dto.baseline_year,
-        observation=dto.observation,
+        focus_goal_dto_ls: List[UpdateFocusGoalRequestDTO],
+) -> Tuple[List[str], List[int]]:
+    custom_indicator_ids = _bulk_upsert_custom_indicators(
+        FocusCustomIndicatorModel,
+        dict(focus_id=focus_id),
+        [
+            custom_indicator_dto
+            for goal_dto in focus_goal_dto_ls
+            for custom_indicator_dto in goal_dto.custom_indicators or []
+        ],
+    )
+    rows = [
+        dict(
+            id=dto.id,
+            plan_id=plan_id,
+            macro_objective_id=macro_objective_id,
+            focus_id=focus_id,
+            cause_indicator_id=dto.cause_indicator_id,
+            custom_indicator_id=dto.custom_indicator_id,
+            initial_rate=dto.initial_rate,
+            goal_value=dto.goal_value,
+            goal_justification=dto.goal_justification,
+            end_at=dto.end_at,
+        )
+        for dto in focus_goal_dto_ls
+    ]
+    return custom_indicator_ids, _bulk_upsert_goals(
+        FocusGoalModel,
+        rows,
+        where=and_(
+            FocusGoalModel.plan_id == plan_id,
+            FocusGoalModel.macro_objective_id == macro_objective_id,
+            FocusGoalModel.focus_id == focus_id,
+        ),
     )
-    db.session.merge(model)
-    return model
 
 
 def list_selected_macro_objective_indicator(last_plan_id: int):
@@ -519,29 +596,37 @@ def list_selected_macro_objective_indicator(last_plan_id: int):
     return output
 
 
-def set_diagnosis_to_problem_indicator(
-        plan_id: Optional[int],
-        dto: SetDiagnosisToProblemIndRequestDTO
-):
-    diagnosis_model = db.session.execute(
-        select(ProblemDiagnosisModel)
-        .where(
-            ProblemDiagnosisModel.plan_id == plan_id,
-            ProblemDiagnosisModel.problem_id == dto.problem_id,
-        )
-        .limit(1)
-    ).scalar()
-    if diagnosis_model:
-        diagnosis_model.kpi_graphs = dto.diagnosis_graphs
-        diagnosis_model.diagnosis = dto.diagnosis
-    else:
-        diagnosis_model = ProblemDiagnosisModel(
-            plan_id=plan_id,
-            problem_id=dto.problem_id,
-            kpi_graphs=dto.diagnosis_graphs,
-            diagnosis=dto.diagnosis,
-        )
-        db.session.add(diagnosis_model)
+def _bulk_upsert_diagnoses(diagnosis_model, key_columns: List[str], rows: List[dict]):
+    """
+    Insert or update `rows` in one statement on the unique `key_columns`. Rows whose diagnosis and graphs didn't change
+    are left untouched, no new row versions nor index entries for them.
+    """
+    # ON CONFLICT DO UPDATE can't touch a row twice, the last one wins
+    rows = list({tuple(row[column] for column in key_columns): row for row in rows}.values())
+    if not rows:
+        return
+
+    insert_stmt = insert(diagnosis_model).values(rows)
+    insert_stmt = insert_stmt.on_conflict_do_update(
+        index_elements=key_columns,
+        set_=dict(kpi_graphs=insert_stmt.excluded.kpi_graphs, diagnosis=insert_stmt.excluded.diagnosis),
+        where=or_(
+            diagnosis_model.kpi_graphs.is_distinct_from(insert_stmt.excluded.kpi_graphs),
+            diagnosis_model.diagnosis.is_distinct_from(insert_stmt.excluded.diagnosis),
+        ),
+    )
+    db.session.execute(insert_stmt)
+
+
+def bulk_set_problem_diagnoses(plan_id: int, dto_ls: List[SetDiagnosisToProblemIndRequestDTO]):
+    _bulk_upsert_diagnoses(
+        ProblemDiagnosisModel,
+        ["plan_id", "problem_id"],
+        [
+            dict(plan_id=plan_id, problem_id=dto.problem_id, kpi_graphs=dto.diagnosis_graphs, diagnosis=dto.diagnosis)
+            for dto in dto_ls
+        ],
+    )
 
 
 def delete_problem_indicator_diagnoses(plan_id: int):
@@ -620,25 +705,32 @@ def list_cause_diagnoses(last_plan_id: int):
     return list(output.values())
 
 
-def set_diagnosis_to_cause_indicator(plan_id, cause_id, dto: SetDiagnosisToCauseIndRequestDTO):
-    diagnosis_model = CauseIndicatorDiagnosisModel(
-        plan_id=plan_id,
-        cause_id=cause_id,
-        cause_indicator_id=dto.cause_indicator_id,
-        kpi_graphs=dto.kpi_graphs,
-        diagnosis=dto.diagnosis,
+def bulk_set_cause_diagnoses(plan_id: int, cause_id: int, dto_ls: List[SetDiagnosisToCauseIndRequestDTO]):
+    _bulk_upsert_diagnoses(
+        CauseIndicatorDiagnosisModel,
+        ["plan_id", "cause_id", "cause_indicator_id"],
+        [
+            dict(
+                plan_id=plan_id,
+                cause_id=cause_id,
+                cause_indicator_id=dto.cause_indicator_id,
+                kpi_graphs=dto.kpi_graphs,
+                diagnosis=dto.diagnosis,
+            )
+            for dto in dto_ls
+        ],
     )
-    db.session.merge(diagnosis_model)
 
 
-def delete_cause_indicator_diagnoses(plan_id: int, cause_id: int):
-    query = (
-        delete(CauseIndicatorDiagnosisModel)
-        .where(
-            CauseIndicatorDiagnosisModel.plan_id == plan_id,
-            CauseIndicatorDiagnosisModel.cause_id == cause_id,
-        )
+def delete_unused_cause_indicator_diagnoses(plan_id: int, cause_id: int, cause_indicator_ids_in_use: List[int]):
+    query = delete(CauseIndicatorDiagnosisModel).where(
+        CauseIndicatorDiagnosisModel.plan_id == plan_id,
+        CauseIndicatorDiagnosisModel.cause_id == cause_id,
     )
+    if cause_indicator_ids_in_use:
+        query = query.where(
+            not_(CauseIndicatorDiagnosisModel.cause_indicator_id.in_(cause_indicator_ids_in_use)),
+        )
     db.session.execute(query)
 
 
@@ -660,19 +752,28 @@ def list_tactical_dimensions(last_plan_id: int):
     prioritized_initiatives_subquery = aliased(InitiativeModel, prioritized_initiatives_subquery)
 
     query = (
-        select(prioritized_initiatives_subquery, tactical_dim_subquery)
+        select(
+            prioritized_initiatives_subquery,
+            tactical_dim_subquery,
+            select(func.count())
+            .where(InitiativeMacroObjectiveCoverageModel.initiative_id == prioritized_initiatives_subquery.id)
+            .scalar_subquery(),
+            select(func.count())
+            .where(InitiativeFocusCoverageModel.initiative_id == prioritized_initiatives_subquery.id)
+            .scalar_subquery(),
+        )
         .select_from(prioritized_initiatives_subquery)
         .outerjoin(tactical_dim_subquery, tactical_dim_subquery.initiative_id == prioritized_initiatives_subquery.id)
     )
 
     query_rs = db.session.execute(query).all()
 
-    for initiative_model, tactical_dim_model in query_rs:
+    for initiative_model, tactical_dim_model, total_macro_objectives, total_focuses in query_rs:
         dto = TacticalDimensionListItemDTO(
             initiative_id=initiative_model.id,
             initiative_name=initiative_model.name,
-            total_macro_objectives=len(initiative_model.associated_macro_objectives),
-            total_focuses=len(initiative_model.associated_focuses),
+            total_macro_objectives=total_macro_objectives,
+            total_focuses=total_focuses,
         )
         dto.tactical_dimension = TacticalDimensionListItemDTO.TacticalDimensionDTO()
         if tactical_dim_model:
@@ -707,60 +808,103 @@ def list_tactical_dimensions(last_plan_id: int):
         yield dto
 
 
+def _diff_child_rows(stored_models, incoming_rows: List[dict], key_columns: List[str]):
+    """
+    Match the incoming rows with the stored models on `key_columns`, preferring identical rows. Returns the rows to
+    insert, the (id, row) pairs whose other columns changed and the ids of the stored models left unmatched.
+    """
+    stored_by_key = dict()
+    for model in stored_models:
+        key = tuple(getattr(model, column) for column in key_columns)
+        stored_by_key.setdefault(key, []).append(model)
+
+    rows_to_insert, rows_to_update = list(), list()
+    for row in incoming_rows:
+        candidates = stored_by_key.get(tuple(row[column] for column in key_columns))
+        if not candidates:
+            rows_to_insert.append(row)
+            continue
+
+        def is_identical(model):
+            return all(getattr(model, column) == value for column, value in row.items())
+
+        model = next(filter(is_identical, candidates), candidates[0])
+        candidates.remove(model)
+        if not is_identical(model):
+            rows_to_update.append(dict(row, id=model.id))
+
+    ids_to_delete = [model.id for models in stored_by_key.values() for model in models]
+    return rows_to_insert, rows_to_update, ids_to_delete
+
+
+def _apply_child_rows_diff(child_model, tactical_dimension_id: int, stored_models, incoming_rows, key_columns):
+    rows_to_insert, rows_to_update, ids_to_delete = _diff_child_rows(stored_models, incoming_rows, key_columns)
+    if ids_to_delete:
+        db.session.execute(delete(child_model).where(child_model.id.in_(ids_to_delete)))
+    if rows_to_update:
+        db.session.execute(update(child_model), rows_to_update)
+    if rows_to_insert:
+        db.session.execute(
+            insert(child_model),
+            [dict(row, tactical_dimension_id=tactical_dimension_id) for row in rows_to_insert],
+        )
+
+
 def create_or_update_tactical_dimension(plan_id: int, dto: SetTacticalDimensionDTO):
-    preexisting_id = db.session.execute(
-        select(TacticalDimensionModel.id)
+    """
+    Save the tactical dimension of an initiative writing only what changed: the dimension is updated by the unit of
+    work when one of its columns differs, goals and department roles are diffed against the stored rows.
+    """
+    tactical_dim_model = db.session.execute(
+        select(TacticalDimensionModel)
         .where(
             TacticalDimensionModel.plan_id == plan_id,
             TacticalDimensionModel.initiative_id == dto.initiative_id,
         )
+        .options(
+            selectinload(TacticalDimensionModel.goals),
+            selectinload(TacticalDimensionModel.department_roles),
+        )
         .limit(1)
     ).scalar()
 
-    tactical_dim_model = TacticalDimensionModel(
-        id=preexisting_id,
-        plan_id=plan_id,
-        initiative_id=dto.initiative_id,
-        diagnosis=dto.diagnosis,
-        neighborhood_id=dto.neighborhood_id,
-        sociodemographic_targeting=dto.sociodemographic_targeting,
-        start_at=dto.start_at,
-        end_at=dto.end_at,
-        total_cost=dto.total_cost,
-    )
-    if tactical_dim_model.id:
-        db.session.merge(tactical_dim_model)
-        db.session.execute(
-            delete(TacticalDimensionDepartmentRoleModel).where(
-                TacticalDimensionDepartmentRoleModel.tactical_dimension_id == tactical_dim_model.id
-            )
-        )
-        db.session.execute(
-            delete(TacticalDimensionGoalModel).where(
-                TacticalDimensionGoalModel.tactical_dimension_id == tactical_dim_model.id
-            )
-        )
+    stored_goals, stored_department_roles = list(), list()
+    if tactical_dim_model:
+        stored_goals = list(tactical_dim_model.goals)
+        stored_department_roles = list(tactical_dim_model.department_roles)
     else:
+        tactical_dim_model = TacticalDimensionModel(plan_id=plan_id, initiative_id=dto.initiative_id)
         db.session.add(tactical_dim_model)
-        db.session.flush()
-
-    for department_role_dto in dto.department_roles:
-        department_role_model = TacticalDimensionDepartmentRoleModel(
-            tactical_dimension_id=tactical_dim_model.id,
-            department_id=department_role_dto.department_id,
-            role=department_role_dto.role,
-        )
-        db.session.add(department_role_model)
-
-    for goal_dto in dto.goals:
-        goal_model = TacticalDimensionGoalModel(
-            tactical_dimension_id=tactical_dim_model.id,
-            initiative_outcome_id=goal_dto.initiative_outcome_id,
-            goal=goal_dto.goal,
-            date=goal_dto.date,
-        )
-        db.session.add(goal_model)
 
+    tactical_dim_model.diagnosis = dto.diagnosis
+    tactical_dim_model.neighborhood_id = dto.neighborhood_id
+    tactical_dim_model.sociodemographic_targeting = dto.sociodemographic_targeting
+    tactical_dim_model.start_at = dto.start_at
+    tactical_dim_model.end_at = dto.end_at
+    # the schema loads decimals, compared with the stored floats they would always look changed
+    tactical_dim_model.total_cost = float(dto.total_cost)
+    db.session.flush()
+
+    _apply_child_rows_diff(
+        TacticalDimensionDepartmentRoleModel,
+        tactical_dim_model.id,
+        stored_department_roles,
+        [
+            dict(department_id=int(department_role_dto.department_id), role=department_role_dto.role)
+            for department_role_dto in dto.department_roles
+        ],
+        ["department_id"],
+    )
+    _apply_child_rows_diff(
+        TacticalDimensionGoalModel,
+        tactical_dim_model.id,
+        stored_goals,
+        [
+            dict(initiative_outcome_id=goal_dto.initiative_outcome_id, goal=float(goal_dto.goal), date=goal_dto.date)
+            for goal_dto in dto.goals
+        ],
+        ["initiative_outcome_id", "date"],
+    )
     return tactical_dim_model
 
 
@@ -781,8 +925,105 @@ def update_tactical_dimension_updated_at(plan_id: int):
 
 
 def update_strategic_dimension_updated_at(plan_id: int):
+    clear_macro_objectives_cache(plan_id)
     db.session.execute(
         update(PlanModel)
         .where(PlanModel.id == plan_id)
         .values(strategic_dimension_updated_at=datetime.utcnow())
     )
+
+
+def _json_rows(model, *where):
+    """JSON array of the rows of `model` matching `where`, ordered by id, built by postgres."""
+    rows = aggregate_order_by(model.__table__.table_valued(), model.id)
+    return (
+        select(func.coalesce(func.json_agg(rows), text("'[]'::json")))
+        .select_from(model)
+        .where(*where)
+        .scalar_subquery()
+    )
+
+
+def get_plan_snapshot(plan_id: int) -> dict:
+    """Goals, custom indicators, diagnoses and tactical dimensions of a plan, read in one statement."""
+    tactical_dimension_ids = select(TacticalDimensionModel.id).where(TacticalDimensionModel.plan_id == plan_id)
+    query = select(func.json_build_object(
+        "plan", _json_rows(PlanModel, PlanModel.id == plan_id),
+        "macro_objective_goals", _json_rows(MacroObjectiveGoalModel, MacroObjectiveGoalModel.plan_id == plan_id),
+        "macro_objective_custom_indicators", _json_rows(
+            MacroObjectiveCustomIndicatorModel,
+            MacroObjectiveCustomIndicatorModel.id.in_(
+                select(MacroObjectiveGoalModel.custom_indicator_id).where(MacroObjectiveGoalModel.plan_id == plan_id)
+            ),
+        ),
+        "focus_goals", _json_rows(FocusGoalModel, FocusGoalModel.plan_id == plan_id),
+        "focus_custom_indicators", _json_rows(
+            FocusCustomIndicatorModel,
+            FocusCustomIndicatorModel.id.in_(
+                select(FocusGoalModel.custom_indicator_id).where(FocusGoalModel.plan_id == plan_id)
+            ),
+        ),
+        "problem_diagnoses", _json_rows(ProblemDiagnosisModel, ProblemDiagnosisModel.plan_id == plan_id),
+        "cause_indicator_diagnoses", _json_rows(
+            CauseIndicatorDiagnosisModel, CauseIndicatorDiagnosisModel.plan_id == plan_id
+        ),
+        "tactical_dimensions", _json_rows(TacticalDimensionModel, TacticalDimensionModel.plan_id == plan_id),
+        "tactical_dimension_goals", _json_rows(
+            TacticalDimensionGoalModel, TacticalDimensionGoalModel.tactical_dimension_id.in_(tactical_dimension_ids)
+        ),
+        "tactical_dimension_department_roles", _json_rows(
+            TacticalDimensionDepartmentRoleModel,
+            TacticalDimensionDepartmentRoleModel.tactical_dimension_id.in_(tactical_dimension_ids),
+        ),
+    ))
+    snapshot = db.session.execute(query).scalar()
+    snapshot["plan"] = snapshot["plan"][0]
+    return snapshot
+
+
+def create_plan_version(
+        plan_id: int,
+        name: Optional[str],
+        snapshot: bytes,
+        snapshot_size: int,
+        created_by_id: Optional[int],
+) -> PlanVersionModel:
+    # concurrent freezes of the plan would read the same max(version), the row lock makes them take turns
+    db.session.execute(select(PlanModel.id).where(PlanModel.id == plan_id).with_for_update())
+    next_version = (
+        select(func.coalesce(func.max(PlanVersionModel.version), 0) + 1)
+        .where(PlanVersionModel.plan_id == plan_id)
+        .scalar_subquery()
+    )
+    plan_version_model = PlanVersionModel(
+        plan_id=plan_id,
+        version=next_version,
+        name=name,
+        snapshot=snapshot,
+        snapshot_size=snapshot_size,
+        created_by_id=created_by_id,
+    )
+    db.session.add(plan_version_model)
+    db.session.flush()
+    return plan_version_model
+
+
+def list_plan_versions(plan_id: int) -> List[PlanVersionModel]:
+    query = (
+        select(PlanVersionModel)
+        .where(PlanVersionModel.plan_id == plan_id)
+        .order_by(desc(PlanVersionModel.version))
+    )
+    return db.session.execute(query).scalars().all()
+
+
+def get_plan_version(plan_id: int, plan_version_id: int) -> Optional[PlanVersionModel]:
+    query = (
+        select(PlanVersionModel)
+        .where(
+            PlanVersionModel.plan_id == plan_id,
+            PlanVersionModel.id == plan_version_id,
+        )
+        .options(undefer(PlanVersionModel.snapshot))
+    )
+    return db.session.execute(query).scalar()
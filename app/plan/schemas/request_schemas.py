@@ -5,7 +5,7 @@ from app.commons.repositories import neighborhood_repo
 from app.initiatives import repositories as initiative_repo
 from app.plan.dto import CreateOrUpdateMacroObjectiveGoalRequestDTO, CreateOrUpdatePlanRequestDTO, \
     UpdateFocusGoalRequestDTO, SetDiagnosisToProblemIndRequestDTO, SetDiagnosisToCauseIndRequestDTO, \
-    SetTacticalDimensionDTO
+    SetTacticalDimensionDTO, FreezePlanVersionRequestDTO
 
 
 class CreateOrUpdatePlanRequestSchema(Schema):
@@ -20,6 +20,16 @@ class CreateOrUpdatePlanRequestSchema(Schema):
     end_at = fields.Date(required=False)
 
 
+class FreezePlanVersionRequestSchema(Schema):
+    __model__ = FreezePlanVersionRequestDTO
+
+    @post_load
+    def make_object(self, data, **kwargs):
+        return self.__model__(**data)
+
+    name = fields.String(required=False, allow_none=True, validate=validate.Length(max=255))
+
+
 class UpdateMacroObjectiveGoalRequestSchema(Schema):
     __model__ = CreateOrUpdateMacroObjectiveGoalRequestDTO
 
@@ -97,6 +97,25 @@ class DetailPlanResponseSchema(Schema):
     end_at = fields.Date(data_key="endAt")
 
 
+class PlanListItemResponseSchema(DetailPlanResponseSchema):
+    id = fields.Integer()
+    updated_at = fields.DateTime(data_key="updatedAt")
+
+
+class PlanVersionResponseSchema(Schema):
+    id = fields.Integer()
+    plan_id = fields.Integer(data_key="planId")
+    version = fields.Integer()
+    name = fields.String()
+    snapshot_size = fields.Integer(data_key="snapshotSize")
+    created_at = fields.DateTime(data_key="createdAt")
+    created_by_id = fields.Integer(data_key="createdById")
+
+
+class DetailPlanVersionResponseSchema(PlanVersionResponseSchema):
+    snapshot = fields.Dict()
+
+
 class TacticalDimensionResSchema(SQLAlchemyAutoSchema):
     class Meta:
         model = TacticalDimensionModel
@@ -1,7 +1,10 @@
+import json
+import zlib
 from http import HTTPStatus
 from typing import List, Optional
 
 from apiflask import abort
+from flask import g, request, has_request_context
 from sqlalchemy import distinct, select
 from sqlalchemy.sql.functions import count
 
@@ -12,9 +15,10 @@ from app.initiatives import repositories as initiative_repo
 from app.plan import repositories
 from app.plan.dto import MacroObjectiveDTO, CreateOrUpdateMacroObjectiveGoalRequestDTO, \
     CreateOrUpdatePlanRequestDTO, FocusListItemDTO, UpdateFocusGoalRequestDTO, SetDiagnosisToProblemIndRequestDTO, \
-    SetDiagnosisToCauseIndRequestDTO, SetTacticalDimensionDTO
-from app.plan.models import PlanModel, CauseIndicatorDiagnosisModel, ProblemDiagnosisModel, TacticalDimensionModel, \
-    MacroObjectiveProblemAssociationModel, FocusAssociationModel, MacroObjectiveGoalModel, FocusGoalModel
+    SetDiagnosisToCauseIndRequestDTO, SetTacticalDimensionDTO, FreezePlanVersionRequestDTO
+from app.plan.models import PlanModel, PlanVersionModel, CauseIndicatorDiagnosisModel, ProblemDiagnosisModel, \
+    TacticalDimensionModel, MacroObjectiveProblemAssociationModel, FocusAssociationModel, MacroObjectiveGoalModel, \
+    FocusGoalModel
 from app.problems import repositories as problem_repo
 from app.problems.models import ProblemModel
 from db import db
@@ -25,22 +29,54 @@ def create_empty_plan():
 
 
 def create_or_update_plan(create_or_update_plan_request_dto: CreateOrUpdatePlanRequestDTO):
-    plan_id = repositories.get_last_plan_id()
+    plan_id = get_current_plan_id()
     if plan_id:
         repositories.update_plan(plan_id, create_or_update_plan_request_dto)
     else:
         repositories.create_plan(create_or_update_plan_request_dto)
     db.session.commit()
+    g.pop("current_plan", None)
 
 
-def get_current_plan() -> PlanModel:
-    plan_id = repositories.get_last_plan_id()
-    if plan_id:
-        return repositories.get_plan(plan_id)
+def create_plan(create_plan_request_dto: CreateOrUpdatePlanRequestDTO) -> PlanModel:
+    """Start a new plan, the previous ones stay available through the `plan_id` query argument."""
+    try:
+        plan_model = repositories.create_plan(create_plan_request_dto)
+        db.session.commit()
+    except:
+        db.session.rollback()
+        raise
+    g.pop("current_plan", None)
+    return plan_model
+
+
+def list_plans() -> List[PlanModel]:
+    return repositories.list_plans()
+
+
+def get_current_plan() -> Optional[PlanModel]:
+    """
+    Plan the request works on, the one of the `plan_id` query argument or else the last one. The row is loaded once
+    and kept on `g` for the rest of the request.
+    """
+    if "current_plan" not in g:
+        plan_id = request.args.get("plan_id", type=int) if has_request_context() else None
+        if plan_id is None:
+            g.current_plan = repositories.get_last_plan()
+        else:
+            g.current_plan = repositories.get_plan(plan_id)
+            if not g.current_plan:
+                abort(HTTPStatus.NOT_FOUND, f"Plan not found, plan_id={plan_id}")
+    return g.current_plan
+
+
+def get_current_plan_id() -> Optional[int]:
+    plan_model = get_current_plan()
+    return plan_model and plan_model.id
 
 
 def get_status():
-    plan_model = repositories.get_last_plan()
+    plan_model = get_current_plan()
 
     def _calculate_bi_progress(plan_model: Optional[PlanModel]):
         if not plan_model:
@@ -163,9 +199,10 @@ def get_status():
 
 
 def list_macro_objectives() -> List[MacroObjectiveDTO]:
-    plan_id = repositories.get_last_plan_id()
-    if plan_id:
-        return repositories.list_macro_objectives_with_goals(plan_id)
+    plan_model = get_current_plan()
+    if plan_model:
+        cache_key = repositories.get_macro_objectives_cache_key(plan_model)
+        return repositories.list_macro_objectives_with_goals(plan_model.id, cache_key)
     else:
         return repositories.list_macro_objectives()
 
@@ -174,45 +211,70 @@ def bulk_create_or_update_macro_objective_goals(
         macro_objective_id: int,
         create_or_update_macro_objective_goal_dto_ls: List[CreateOrUpdateMacroObjectiveGoalRequestDTO]
 ):
-    plan_id = repositories.get_last_plan_id()
+    plan_id = get_current_plan_id()
     if not plan_id:
         abort(
             HTTPStatus.BAD_REQUEST,
             f"Before creating a MacroObjectiveGoal you must create a Plan"
         )
+    problem_pairs = {
+        (macro_objective_id, str(goal_dto.problem_id))
+        for goal_dto in create_or_update_macro_objective_goal_dto_ls
+        if goal_dto.problem_id
+    }
+    related_pairs = {
+        (related_macro_objective_id, str(problem_id))
+        for related_macro_objective_id, problem_id in repositories.find_macro_objective_problem_association(problem_pairs)
+    }
+    unrelated_problem_ids = sorted(problem_id for _, problem_id in problem_pairs - related_pairs)
+    if unrelated_problem_ids:
+        abort(
+            HTTPStatus.BAD_REQUEST,
+            f"Macro Objective and Problem are not related, macro_objective_id={macro_objective_id} problem_ids={unrelated_problem_ids}"
+        )
+
     try:
         repositories.delete_unused_macro_objective_goals(
             plan_id,
             macro_objective_id,
             [item.id for item in create_or_update_macro_objective_goal_dto_ls if item.id]
         )
-
-        for goal_dto in create_or_update_macro_objective_goal_dto_ls:
-            if goal_dto.problem_id:
-                is_valid = repositories.check_macro_objective_and_problem_are_related(
-                    macro_objective_id,
-                    goal_dto.problem_id
-                )
-                if not is_valid:
-                    abort(
-                        HTTPStatus.BAD_REQUEST,
-                        f"Macro Objective and Problem are not related, macro_objective_id={macro_objective_id} problem_id={goal_dto.problem_id}"
-                    )
-
-            for custom_indicator_dto in goal_dto.custom_indicators:
-                repositories.create_or_update_macro_objective_custom_indicator(macro_objective_id, custom_indicator_dto)
-
-            repositories.create_or_update_macro_objective_goal(plan_id, macro_objective_id, goal_dto)
+        custom_indicator_ids, goal_ids = repositories.bulk_create_or_update_macro_objective_goals(
+            plan_id,
+            macro_objective_id,
+            create_or_update_macro_objective_goal_dto_ls,
+        )
+        _abort_on_foreign_custom_indicators(create_or_update_macro_objective_goal_dto_ls, custom_indicator_ids)
+        _abort_on_foreign_goals(create_or_update_macro_objective_goal_dto_ls, goal_ids)
 
         repositories.update_strategic_dimension_updated_at(plan_id)
         db.session.commit()
     except:
         db.session.rollback()
         raise
+    return goal_ids
+
+
+def _abort_on_foreign_goals(goal_dto_ls, goal_ids: List[int]):
+    """Goals sent with an id of another plan, macro objective or focus are not updated by the bulk upsert."""
+    foreign_goal_ids = {goal_dto.id for goal_dto in goal_dto_ls if goal_dto.id} - set(goal_ids)
+    if foreign_goal_ids:
+        abort(HTTPStatus.BAD_REQUEST, f"Goals not found, ids={sorted(foreign_goal_ids)}")
+
+
+def _abort_on_foreign_custom_indicators(goal_dto_ls, custom_indicator_ids: List[str]):
+    """Custom indicators sent with an id of another macro objective or focus are not updated by the bulk upsert."""
+    foreign_custom_indicator_ids = {
+        str(custom_indicator_dto.id)
+        for goal_dto in goal_dto_ls
+        for custom_indicator_dto in goal_dto.custom_indicators or []
+    } - {str(custom_indicator_id) for custom_indicator_id in custom_indicator_ids}
+    if foreign_custom_indicator_ids:
+        abort(HTTPStatus.BAD_REQUEST, f"Custom indicators not found, ids={sorted(foreign_custom_indicator_ids)}")
 
 
 def list_focuses() -> List[FocusListItemDTO]:
-    plan_id = repositories.get_last_plan_id()
+    plan_id = get_current_plan_id()
     return repositories.list_focuses(plan_id)
 
 
@@ -221,22 +283,24 @@ def update_focus_goals(
         focus_id: int,
         focus_goal_dto_ls: List[UpdateFocusGoalRequestDTO],
 ):
-    plan_id = repositories.get_last_plan_id()
+    plan_id = get_current_plan_id()
     try:
-        for dto in focus_goal_dto_ls:
-            for custom_indicator_dto in dto.custom_indicators:
-                repositories.create_or_update_focus_custom_indicator(focus_id, custom_indicator_dto)
-            repositories.create_or_update_focus_goal(plan_id, macro_objective_id, focus_id, dto)
+        custom_indicator_ids, goal_ids = repositories.bulk_create_or_update_focus_goals(
+            plan_id, macro_objective_id, focus_id, focus_goal_dto_ls
+        )
+        _abort_on_foreign_custom_indicators(focus_goal_dto_ls, custom_indicator_ids)
+        _abort_on_foreign_goals(focus_goal_dto_ls, goal_ids)
 
         repositories.update_strategic_dimension_updated_at(plan_id)
         db.session.commit()
     except:
         db.session.rollback()
         raise
+    return goal_ids
 
 
 def list_problem_diagnosis():
-    last_plan_id = repositories.get_last_plan_id()
+    last_plan_id = get_current_plan_id()
     if not last_plan_id:
         return []
     return repositories.list_selected_macro_objective_indicator(last_plan_id)
@@ -245,10 +309,9 @@ def list_problem_diagnosis():
 def set_problem_diagnosis(
         set_diagnosis_dto_ls: List[SetDiagnosisToProblemIndRequestDTO]
 ):
-    plan_id = repositories.get_last_plan_id()
+    plan_id = get_current_plan_id()
     try:
-        for dto in set_diagnosis_dto_ls:
-            repositories.set_diagnosis_to_problem_indicator(plan_id, dto)
+        repositories.bulk_set_problem_diagnoses(plan_id, set_diagnosis_dto_ls)
         repositories.update_diagnosis_updated_at(plan_id)
         db.session.commit()
     except:
@@ -257,23 +320,26 @@ def set_problem_diagnosis(
 
 
 def list_cause_diagnosis():
-    last_plan_id = repositories.get_last_plan_id()
+    last_plan_id = get_current_plan_id()
     if not last_plan_id:
         return []
     return repositories.list_cause_diagnoses(last_plan_id)
 
 
 def set_cause_diagnosis(cause_id: int, set_diagnosis_dto_ls: List[SetDiagnosisToCauseIndRequestDTO]):
-    plan_id = repositories.get_last_plan_id()
+    plan_id = get_current_plan_id()
     if not plan_id:
         abort(
             HTTPStatus.BAD_REQUEST,
             f"Before creating a CauseDiagnosis you must create a Plan"
         )
     try:
-        repositories.delete_cause_indicator_diagnoses(plan_id, cause_id)
-        for dto in set_diagnosis_dto_ls:
-            repositories.set_diagnosis_to_cause_indicator(plan_id, cause_id, dto)
+        repositories.delete_unused_cause_indicator_diagnoses(
+            plan_id,
+            cause_id,
+            [dto.cause_indicator_id for dto in set_diagnosis_dto_ls]
+        )
+        repositories.bulk_set_cause_diagnoses(plan_id, cause_id, set_diagnosis_dto_ls)
         repositories.update_diagnosis_updated_at(plan_id)
         db.session.commit()
     except:
@@ -282,14 +348,14 @@ def set_cause_diagnosis(cause_id: int, set_diagnosis_dto_ls: List[SetDiagnosisTo
 
 
 def list_tactical_dimensions():
-    last_plan_id = repositories.get_last_plan_id()
+    last_plan_id = get_current_plan_id()
     if not last_plan_id:
         return []
     return list(repositories.list_tactical_dimensions(last_plan_id))
 
 
 def set_tactical_dimension(dto: SetTacticalDimensionDTO):
-    plan_id = repositories.get_last_plan_id()
+    plan_id = get_current_plan_id()
     if not plan_id:
         abort(
             HTTPStatus.BAD_REQUEST,
@@ -301,3 +367,55 @@ def set_tactical_dimension(dto: SetTacticalDimensionDTO):
         db.session.commit()
     except:
         db.session.rollback()
+
+
+def freeze_plan_version(dto: FreezePlanVersionRequestDTO, user_id: int) -> PlanVersionModel:
+    """
+    Store the goals, diagnoses and tactical dimensions of the current plan as a new immutable version. The snapshot
+    is built by one query and kept as zlib compressed JSON, reading a version never touches the live tables.
+    """
+    plan_id = get_current_plan_id()
+    if not plan_id:
+        abort(
+            HTTPStatus.BAD_REQUEST,
+            f"Before freezing a PlanVersion you must create a Plan"
+        )
+    snapshot = json.dumps(repositories.get_plan_snapshot(plan_id), separators=(",", ":")).encode()
+    try:
+        plan_version_model = repositories.create_plan_version(
+            plan_id,
+            dto.name,
+            zlib.compress(snapshot),
+            len(snapshot),
+            user_id,
+        )
+        db.session.commit()
+    except:
+        db.session.rollback()
+        raise
+    return plan_version_model
+
+
+def list_plan_versions() -> List[PlanVersionModel]:
+    plan_id = get_current_plan_id()
+    if not plan_id:
+        return []
+    return repositories.list_plan_versions(plan_id)
+
+
+def get_plan_version(plan_version_id: int) -> dict:
+    plan_id = get_current_plan_id()
+    plan_version_model = plan_id and repositories.get_plan_version(plan_id, plan_version_id)
+    if not plan_version_model:
+        abort(HTTPStatus.NOT_FOUND, f"Plan version not found, plan_version_id={plan_version_id}")
+
+    return dict(
+        id=plan_version_model.id,
+        plan_id=plan_version_model.plan_id,
+        version=plan_version_model.version,
+        name=plan_version_model.name,
+        snapshot_size=plan_version_model.snapshot_size,
+        created_at=plan_version_model.created_at,
+        created_by_id=plan_version_model.created_by_id,
+        snapshot=json.loads(zlib.decompress(plan_version_model.snapshot)),
+    )
@@ -6,7 +6,7 @@ from typing import Dict
 import jsonschema
 from apiflask import abort
 from apiflask.views import MethodView
-from flask import current_app, Response
+from flask import Response
 from marshmallow import ValidationError
 from sqlalchemy import select
 from sqlalchemy.orm import aliased
@@ -17,13 +17,14 @@ from app.problems import bp
 from app.problems.models import ProblemIndicatorDataModel, ProblemModel
 from app.problems.schemas import ProblemListRequestSchema, BulkProblemPrioritizationRequest, \
     ListAssociatedCausesReqSchema, CreateCustomProblemsSchema, UpdateCustomProblemsSchema, \
-    relative_frequency_data_schema
+    relative_frequency_data_schema, PeriodRangeRequestSchema, ProblemComparisonRequestSchema
 from app.problems.services import list_problems, count_potentials_problems, count_prioritized_problems, \
     count_critical_problems, prioritize_problem, deprioritize_problem, get_problem, count_problems, \
     list_associated_causes, get_problem_data_characteristics, get_problem_kpi, list_problem_options, \
     create_custom_problem, get_problem_rate, get_custom_problem, delete_custom_problem, get_problem_model, \
-    check_problem_name_already_used, update_custom_problem_service
-from db import db
+    check_problem_name_already_used, update_custom_problem_service, get_problem_data_characteristics_history, \
+    get_problem_kpi_history, compare_problems
+from db import db, read_replica
 
 
 @bp.get("")
@@ -39,6 +40,17 @@ def list_problems_controller(query):
     }
 
 
+@bp.get("/compare")
+@bp.input(ProblemComparisonRequestSchema, location="query")
+@bp.auth_required(auth_token)
+def compare_problems_controller(query: Dict):
+    comparison = compare_problems(query["problem_ids"])
+    return {
+        "code": HTTPStatus.OK,
+        "data": comparison
+    }
+
+
 @bp.get("/<problem_id>")
 @bp.auth_required(auth_token)
 def get_problem_controller(problem_id: str):
@@ -69,6 +81,28 @@ def get_problem_controller(problem_id: str):
     }
 
 
+@bp.get("/<int:problem_id>/data-characteristics/history")
+@bp.input(PeriodRangeRequestSchema, location="query")
+@bp.auth_required(auth_token)
+def get_problem_data_characteristics_history_controller(problem_id: int, query: Dict):
+    history = get_problem_data_characteristics_history(problem_id, **query)
+    return {
+        "code": HTTPStatus.OK,
+        "data": history
+    }
+
+
+@bp.get("/<int:problem_id>/kpi/history")
+@bp.input(PeriodRangeRequestSchema, location="query")
+@bp.auth_required(auth_token)
+def get_problem_kpi_history_controller(problem_id: int, query: Dict):
+    history = get_problem_kpi_history(problem_id, **query)
+    return {
+        "code": HTTPStatus.OK,
+        "data": history
+    }
+
+
 @bp.get("/<problem_id>/causes")
 @bp.input(ListAssociatedCausesReqSchema, location="query")
 @bp.auth_required(auth_token)
@@ -162,8 +196,7 @@ def list_problem_options_controller():
 @bp.input(CreateCustomProblemsSchema, location="files")
 @bp.auth_required(auth_token)
 def post_custom_problem(body: Dict):
-    path = current_app.config["UPLOAD_FOLDER"]
-    custom_problem_obj = create_custom_problem(body, path, auth_token.current_user["id"])
+    custom_problem_obj = create_custom_problem(body, auth_token.current_user["id"])
     return {
         "code": HTTPStatus.OK,
         "message": "Custom problem registered.",
@@ -175,7 +208,6 @@ def post_custom_problem(body: Dict):
 @bp.input(UpdateCustomProblemsSchema, location="files")
 @bp.auth_required(auth_token)
 def update_custom_problem(problem_id, body):
-    path = current_app.config["UPLOAD_FOLDER"]
     name_already_used = ("name" in body) and check_problem_name_already_used(body["name"], ignore_id=problem_id)
     if name_already_used:
         raise ValidationError({"name": ["Name already used"]})
@@ -190,7 +222,7 @@ def update_custom_problem(problem_id, body):
             "Default Problem can't be edited"
         )
 
-    update_custom_problem_service(problem_model, body, path)
+    update_custom_problem_service(problem_model, body)
     return {
         "code": HTTPStatus.OK,
         "message": "Custom problem updated"
@@ -234,6 +266,7 @@ def delete_custom_problem_ontroller(problem_id):
 
 @bp.get("<int:problem_id>/trend/csv")
 @bp.output(None, content_type="text/csv")
+@read_replica
 def trend_csv_controller(problem_id: int):
     graph_data = db.session.execute(
         select(ProblemIndicatorDataModel.trend_data).where(
@@ -264,6 +297,7 @@ def trend_csv_controller(problem_id: int):
 
 @bp.get("<int:problem_id>/performance/csv")
 @bp.output(None, content_type="text/csv")
+@read_replica
 def performance_csv_controller(problem_id: int):
     graph_data_ls = db.session.execute(
         select(ProblemIndicatorDataModel.performance_data).where(
@@ -301,6 +335,7 @@ def performance_csv_controller(problem_id: int):
 
 @bp.get("<int:problem_id>/relative-frequency/csv")
 @bp.output(None, content_type="text/csv")
+@read_replica
 def frequency_csv_controller(problem_id: int):
     buffer = io.StringIO()
     csv_writer = csv.DictWriter(
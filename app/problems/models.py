@@ -3,10 +3,13 @@ from typing import List
 
 from dateutil import relativedelta
 from dateutil.relativedelta import relativedelta
-from sqlalchemy import Column, String, Boolean, Integer, BigInteger, JSON, ForeignKey, REAL, ARRAY, DateTime
+from sqlalchemy import Column, String, Boolean, Integer, BigInteger, JSON, ForeignKey, REAL, ARRAY, DateTime, Index, \
+    asc, nulls_first, event, DDL
 from sqlalchemy.orm import Mapped, relationship
 
 from app.auth.models.user_model import UserModel
+from app.commons.sqlalchemy_utils import search_vector_index, trigram_index
+from app.problems.queries import Queries
 from db import db
 
 
@@ -40,6 +43,11 @@ class ProblemModel(db.Model):
     )
 
 
+PROBLEM_SEARCH_COLUMNS = [(ProblemModel.name, "A"), (ProblemModel.description, "B")]
+search_vector_index("ix_problem_search_vector", *PROBLEM_SEARCH_COLUMNS)
+trigram_index("ix_problem_name_trgm", ProblemModel.name)
+
+
 class AnnexCustomProblemModel(db.Model):
     __tablename__ = "annex_custom_problem_model"
 
@@ -47,6 +55,8 @@ class AnnexCustomProblemModel(db.Model):
     annexes_name = Column(String(100), nullable=True)
     custom_problem_id = Column(ForeignKey(ProblemModel.__tablename__ + ".id"))
     path = Column(String(255), nullable=True)
+    sha256 = Column(String(64), nullable=True)
+    size = Column(BigInteger(), nullable=True)
     date = Column(DateTime, default=datetime.utcnow, nullable=False)
 
 
@@ -112,3 +122,57 @@ class ProblemIndicatorDataModel(db.Model):
     @property
     def relative_frequency_range(self):
         return (self.updated_at - relativedelta(years=1)), self.updated_at
+
+
+# columns each kind of read needs, the JSON blobs of the other profiles stay in the database (see load_profile)
+PROBLEM_INDICATOR_LOAD_PROFILES = {
+    "kpi": (
+        "trend", "trend_data", "performance", "performance_data", "relative_frequency", "relative_frequency_data",
+        "concentration",
+    ),
+    # period backs the updated_at of the *_range properties read by the plan pdf
+    "export": (
+        "period", "trend", "trend_data", "performance", "performance_data", "relative_frequency",
+        "relative_frequency_data",
+    ),
+}
+
+
+RANKING_SORTABLE_FIELDS = ["trend", "relative_incidence", "performance", "harm_potential", "criticality_level"]
+
+
+class ProblemRankingModel(db.Model):
+    """
+    Normalized KPIs of the last period of every problem, kept up to date by `refresh_problem_ranking` and by the
+    triggers of problem_indicator_data, so the problem list can be paginated by any KPI without sorting the indicator
+    data.
+    """
+    __tablename__ = "problem_ranking"
+
+    problem_id = Column(ForeignKey(ProblemModel.__tablename__ + ".id", ondelete="CASCADE"), primary_key=True)
+    period = Column(Integer(), nullable=True)
+
+    trend = Column(Integer(), nullable=True)
+    relative_incidence = Column(Integer(), nullable=True)
+    performance = Column(Integer(), nullable=True)
+    harm_potential = Column(Integer(), nullable=True)
+    criticality_level = Column(Integer(), nullable=True)
+    has_data = Column(Boolean(), nullable=False, default=False)
+
+    prioritized = Column(Boolean(), nullable=False, default=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # the list sorts with NULLS FIRST ascending and NULLS LAST descending, both directions can scan these indexes
+    __table_args__ = tuple(
+        Index(f"ix_problem_ranking_{field}", nulls_first(asc(field)), "problem_id")
+        for field in RANKING_SORTABLE_FIELDS
+    ) + tuple(
+        Index(f"ix_problem_ranking_prioritized_{field}", "prioritized", nulls_first(asc(field)), "problem_id")
+        for field in RANKING_SORTABLE_FIELDS
+    )
+
+
+# the ETL writes problem_indicator_data directly, these triggers refresh the ranking of the problems it touches
+event.listen(db.metadata, "after_create", DDL(Queries.REFRESH_PROBLEM_RANKING_FUNCTION))
+event.listen(db.metadata, "after_create", DDL(Queries.REFRESH_PROBLEM_RANKING_TRIGGERS))
+event.listen(db.metadata, "before_drop", DDL(Queries.DROP_REFRESH_PROBLEM_RANKING_FUNCTION))
@@ -0,0 +1,57 @@
+class Queries:
+    # same upsert as app.problems.repositories.refresh_problem_ranking, limited to the problems whose indicator
+    # data changed in the statement, the indicator data is loaded by an external ETL
+    REFRESH_PROBLEM_RANKING_FUNCTION = """
+    CREATE OR REPLACE FUNCTION refresh_problem_ranking() RETURNS trigger AS $$
+    BEGIN
+        INSERT INTO problem_ranking (
+            problem_id, period, trend, relative_incidence, performance, harm_potential, criticality_level,
+            has_data, prioritized, updated_at
+        )
+        SELECT
+            p.id, d.period, d.trend_normalized, d.relative_frequency_normalized, d.performance_normalized,
+            d.harm_potential_normalized, d.criticality_level, d.problem_id IS NOT NULL, p.prioritized, now()
+        FROM problem p
+        LEFT JOIN (
+            SELECT DISTINCT ON (pid.problem_id)
+                pid.problem_id, pid.period, pid.trend_normalized, pid.relative_frequency_normalized,
+                pid.performance_normalized, pid.harm_potential_normalized, pid.criticality_level
+            FROM problem_indicator_data pid
+            WHERE pid.problem_id IN (SELECT changed_rows.problem_id FROM changed_rows)
+            ORDER BY pid.problem_id, pid.period DESC
+        ) d ON d.problem_id = p.code
+        WHERE p.code IN (SELECT changed_rows.problem_id FROM changed_rows)
+        ON CONFLICT (problem_id) DO UPDATE SET
+            period = excluded.period,
+            trend = excluded.trend,
+            relative_incidence = excluded.relative_incidence,
+            performance = excluded.performance,
+            harm_potential = excluded.harm_potential,
+            criticality_level = excluded.criticality_level,
+            has_data = excluded.has_data,
+            prioritized = excluded.prioritized,
+            updated_at = excluded.updated_at;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+    """
+
+    # statement level, a bulk load refreshes each problem once. Transition tables need one trigger per event
+    REFRESH_PROBLEM_RANKING_TRIGGERS = """
+    DROP TRIGGER IF EXISTS problem_indicator_data_insert_refresh_ranking ON problem_indicator_data;
+    CREATE TRIGGER problem_indicator_data_insert_refresh_ranking
+    AFTER INSERT ON problem_indicator_data REFERENCING NEW TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION refresh_problem_ranking();
+
+    DROP TRIGGER IF EXISTS problem_indicator_data_update_refresh_ranking ON problem_indicator_data;
+    CREATE TRIGGER problem_indicator_data_update_refresh_ranking
+    AFTER UPDATE ON problem_indicator_data REFERENCING NEW TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION refresh_problem_ranking();
+
+    DROP TRIGGER IF EXISTS problem_indicator_data_delete_refresh_ranking ON problem_indicator_data;
+    CREATE TRIGGER problem_indicator_data_delete_refresh_ranking
+    AFTER DELETE ON problem_indicator_data REFERENCING OLD TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION refresh_problem_ranking();
+    """
+
+    DROP_REFRESH_PROBLEM_RANKING_FUNCTION = "DROP FUNCTION IF EXISTS refresh_problem_ranking() CASCADE"
@@ -1,17 +1,16 @@
-import datetime
 import math
-from typing import Optional
+from typing import Optional, List
 
-from dateutil.relativedelta import relativedelta
-from sqlalchemy import select, func, update, exists, and_, case
+from sqlalchemy import select, func, update, exists, and_
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.sql.elements import and_
 
 from app.cause_problem_association.models import CauseAndProblemAssociation
 from app.causes.models import CauseModel, CauseIndicatorDataModel, CauseIndicatorModel, DefaultCauseModel
 from app.commons.dto.pagination import PaginationRequest, PaginationResponse
 from app.commons.sqlalchemy_utils import asc_, desc_
-from app.problems.models import ProblemModel, ProblemIndicatorDataModel
-from db import db
+from app.problems.models import ProblemModel, ProblemIndicatorDataModel, ProblemRankingModel, RANKING_SORTABLE_FIELDS
+from db import db, read_replica
 
 
 class ProblemRepository:
@@ -104,44 +103,13 @@ class ProblemRepository:
             return result
         return 0
 
+    @read_replica
     def list_problems(self, pagination_req: PaginationRequest, prioritized_filter: Optional[bool]):
-        column_names = [
-            "id", "name", "description", "prioritized", "isDefault", "trend", "relativeFrequency", "performance",
-            "harmPotential", "criticalityLevel", "hasData", "totalCauses", "totalPrioritizedCauses",
-        ]
         column_names = [
             "id", "name", "description", "prioritized", "is_default", "trend", "relative_incidence", "performance",
             "harm_potential", "criticality_level", "has_data", "total_causes", "total_prioritized_causes",
         ]
 
-        previous_year = datetime.date.today() - relativedelta(years=1)
-        start_period = int(f"{previous_year.year}{previous_year.month:02d}")
-
-        last_updated_period_subquery = select(
-            ProblemIndicatorDataModel.problem_id,
-            func.max(ProblemIndicatorDataModel.period).label("period"),
-        ).where(ProblemIndicatorDataModel.period >= start_period).group_by(
-            ProblemIndicatorDataModel.problem_id).subquery()
-
-        problem_indicator_data_subquery = (
-            select(
-                ProblemIndicatorDataModel.problem_id,
-                ProblemIndicatorDataModel.period,
-                ProblemIndicatorDataModel.trend_normalized,
-                ProblemIndicatorDataModel.performance_normalized,
-                ProblemIndicatorDataModel.relative_frequency_normalized,
-                ProblemIndicatorDataModel.harm_potential_normalized,
-                ProblemIndicatorDataModel.criticality_level,
-            )
-            .join(
-                last_updated_period_subquery,
-                and_(
-                    last_updated_period_subquery.c.problem_id == ProblemIndicatorDataModel.problem_id,
-                    last_updated_period_subquery.c.period == ProblemIndicatorDataModel.period)
-            )
-            .subquery()
-        )
-
         select_stmt = (
             select(
                 ProblemModel.id,
@@ -149,15 +117,12 @@ class ProblemRepository:
                 ProblemModel.description,
                 ProblemModel.prioritized,
                 ProblemModel.is_default,
-                problem_indicator_data_subquery.c.trend_normalized.label('trend'),
-                problem_indicator_data_subquery.c.relative_frequency_normalized.label('relative_incidence'),
-                problem_indicator_data_subquery.c.performance_normalized.label('performance'),
-                problem_indicator_data_subquery.c.harm_potential_normalized.label('harm_potential'),
-                problem_indicator_data_subquery.c.criticality_level.label('criticality_level'),
-                has_data_column := case(
-                    (problem_indicator_data_subquery.c.problem_id.isnot(None), True),
-                    else_=False
-                ).label("has_data"),
+                ProblemRankingModel.trend,
+                ProblemRankingModel.relative_incidence,
+                ProblemRankingModel.performance,
+                ProblemRankingModel.harm_potential,
+                ProblemRankingModel.criticality_level,
+                func.coalesce(ProblemRankingModel.has_data, False),
                 select(func.count(CauseAndProblemAssociation.id)).where(
                     CauseAndProblemAssociation.problem_id == ProblemModel.id,
                 ).label("total_causes"),
@@ -167,20 +132,28 @@ class ProblemRepository:
                 ).label("total_prioritized_causes")
             )
             .select_from(ProblemModel)
-            .outerjoin(
-                problem_indicator_data_subquery,
-                ProblemModel.code == problem_indicator_data_subquery.c.problem_id
-            )
+            # a problem without a ranking row yet (e.g. not refreshed) is listed without data instead of dropped
+            .outerjoin(ProblemRankingModel, ProblemRankingModel.problem_id == ProblemModel.id)
         )
 
+        count_stmt = select(func.count(ProblemModel.id))
+
         if prioritized_filter:
             select_stmt = select_stmt.where(ProblemModel.prioritized == prioritized_filter)
+            count_stmt = count_stmt.where(ProblemModel.prioritized == prioritized_filter)
 
-        total_items = db.session.execute(select(func.count("*")).select_from(select_stmt)).scalar()
+        total_items = db.session.execute(count_stmt).scalar()
         total_pages = math.ceil(total_items / pagination_req.page_size)
 
-        sort_method = asc_ if pagination_req.sort_type == "asc" else desc_
-        select_stmt = select_stmt.order_by(sort_method(pagination_req.order_field))
+        # the id breaks ties in the same direction so the pages are stable
+        if pagination_req.order_field in RANKING_SORTABLE_FIELDS:
+            order_column = getattr(ProblemRankingModel, pagination_req.order_field)
+        else:
+            order_column = pagination_req.order_field
+        if pagination_req.sort_type == "asc":
+            select_stmt = select_stmt.order_by(asc_(order_column), ProblemModel.id.asc())
+        else:
+            select_stmt = select_stmt.order_by(desc_(order_column), ProblemModel.id.desc())
         select_stmt = select_stmt.offset((pagination_req.page - 1) * pagination_req.page_size)
         select_stmt = select_stmt.limit(pagination_req.page_size)
 
@@ -193,6 +166,7 @@ class ProblemRepository:
             results=results
         )
 
+    @read_replica
     def list_associated_causes(self, problem_id, pagination_req: PaginationRequest):
         """
         List causes that are associated with a specific problem.
@@ -267,6 +241,60 @@ class ProblemRepository:
             results=results
         )
 
+    def compare_problems(self, problem_ids: List[int]):
+        """
+        Ranking scores of the given problems as a problem x metric matrix, in the order of `problem_ids`.
+        Problems without a ranking row have empty metrics, ids of missing problems are left out.
+        """
+        cause_counts_subquery = (
+            select(
+                CauseAndProblemAssociation.problem_id,
+                func.count(CauseAndProblemAssociation.id).label("total_causes"),
+                func.count(CauseAndProblemAssociation.id).filter(
+                    CauseAndProblemAssociation.prioritized == True
+                ).label("total_prioritized_causes"),
+            )
+            .where(CauseAndProblemAssociation.problem_id.in_(problem_ids))
+            .group_by(CauseAndProblemAssociation.problem_id)
+            .subquery()
+        )
+
+        select_stmt = (
+            select(
+                ProblemModel.id,
+                ProblemModel.name,
+                ProblemModel.prioritized,
+                func.coalesce(ProblemRankingModel.has_data, False).label("has_data"),
+                ProblemRankingModel.period,
+                *[getattr(ProblemRankingModel, field) for field in RANKING_SORTABLE_FIELDS],
+                func.coalesce(cause_counts_subquery.c.total_causes, 0).label("total_causes"),
+                func.coalesce(cause_counts_subquery.c.total_prioritized_causes, 0).label("total_prioritized_causes"),
+            )
+            .select_from(ProblemModel)
+            .outerjoin(ProblemRankingModel, ProblemRankingModel.problem_id == ProblemModel.id)
+            .outerjoin(cause_counts_subquery, cause_counts_subquery.c.problem_id == ProblemModel.id)
+            .where(ProblemModel.id.in_(problem_ids))
+        )
+        row_by_problem_id = {row.id: row for row in db.session.execute(select_stmt).all()}
+        rows = [row_by_problem_id[problem_id] for problem_id in problem_ids if problem_id in row_by_problem_id]
+
+        return {
+            "metrics": RANKING_SORTABLE_FIELDS,
+            "problems": [
+                {
+                    "id": row.id,
+                    "name": row.name,
+                    "prioritized": row.prioritized,
+                    "hasData": row.has_data,
+                    "period": row.period,
+                    "totalCauses": row.total_causes,
+                    "totalPrioritizedCauses": row.total_prioritized_causes,
+                }
+                for row in rows
+            ],
+            "matrix": [[getattr(row, field) for field in RANKING_SORTABLE_FIELDS] for row in rows],
+        }
+
     def count_all_problems(self) -> int:
         count_stmt = select(func.count(ProblemModel.id))
         return db.session.execute(count_stmt).scalar()
@@ -297,9 +325,68 @@ class ProblemRepository:
     def patch_problem_prioritization(self, problem_id: str, prioritized: bool) -> None:
         stmt = update(ProblemModel).where(ProblemModel.id == problem_id).values(prioritized=prioritized)
         db.session.execute(stmt)
+        stmt = update(ProblemRankingModel).where(ProblemRankingModel.problem_id == problem_id).values(
+            prioritized=prioritized
+        )
+        db.session.execute(stmt)
         db.session.commit()
 
 
 def count_prioritized_problems() -> int:
     count_stmt = select(func.count(ProblemModel.id)).where(ProblemModel.prioritized == True)
     return db.session.execute(count_stmt).scalar()
+
+
+def refresh_problem_ranking(problem_ids: Optional[List[int]] = None) -> None:
+    """
+    Upsert the ranking rows of the given problems (all when None) from the last period of their indicator data.
+    Must run after loading indicator data, the caller commits.
+    """
+    last_period_subquery = (
+        select(
+            ProblemIndicatorDataModel.problem_id,
+            ProblemIndicatorDataModel.period,
+            ProblemIndicatorDataModel.trend_normalized,
+            ProblemIndicatorDataModel.relative_frequency_normalized,
+            ProblemIndicatorDataModel.performance_normalized,
+            ProblemIndicatorDataModel.harm_potential_normalized,
+            ProblemIndicatorDataModel.criticality_level,
+        )
+        .distinct(ProblemIndicatorDataModel.problem_id)
+        .order_by(ProblemIndicatorDataModel.problem_id, ProblemIndicatorDataModel.period.desc())
+    )
+    if problem_ids is not None:
+        last_period_subquery = last_period_subquery.where(
+            ProblemIndicatorDataModel.problem_id.in_(select(ProblemModel.code).where(ProblemModel.id.in_(problem_ids)))
+        )
+    last_period_subquery = last_period_subquery.subquery()
+
+    select_stmt = (
+        select(
+            ProblemModel.id,
+            last_period_subquery.c.period,
+            last_period_subquery.c.trend_normalized,
+            last_period_subquery.c.relative_frequency_normalized,
+            last_period_subquery.c.performance_normalized,
+            last_period_subquery.c.harm_potential_normalized,
+            last_period_subquery.c.criticality_level,
+            last_period_subquery.c.problem_id.isnot(None),
+            ProblemModel.prioritized,
+            func.now(),
+        )
+        .select_from(ProblemModel)
+        .outerjoin(last_period_subquery, last_period_subquery.c.problem_id == ProblemModel.code)
+    )
+    if problem_ids is not None:
+        select_stmt = select_stmt.where(ProblemModel.id.in_(problem_ids))
+
+    columns = [
+        "problem_id", "period", "trend", "relative_incidence", "performance", "harm_potential", "criticality_level",
+        "has_data", "prioritized", "updated_at",
+    ]
+    insert_stmt = insert(ProblemRankingModel).from_select(columns, select_stmt)
+    insert_stmt = insert_stmt.on_conflict_do_update(
+        index_elements=[ProblemRankingModel.problem_id],
+        set_={column: insert_stmt.excluded[column] for column in columns if column != "problem_id"},
+    )
+    db.session.execute(insert_stmt)
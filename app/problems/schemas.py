@@ -67,6 +67,21 @@ class GetTrendRequest(Schema):
     #         raise ValidationError("start_date must be greater than end_date")
 
 
+class ProblemComparisonRequestSchema(Schema):
+    problem_ids = fields.List(
+        fields.Integer(),
+        required=True,
+        data_key="problem_ids",
+        validate=[validate.Length(min=1, max=20)]
+    )
+
+
+class PeriodRangeRequestSchema(Schema):
+    start_period = fields.Integer(required=False, data_key="start_period")
+    end_period = fields.Integer(required=False, data_key="end_period")
+    max_periods = fields.Integer(load_default=12, data_key="max_periods", validate=[validate.Range(min=1, max=60)])
+
+
 @dataclasses.dataclass
 class TrendItem:
     period: int
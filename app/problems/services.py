@@ -1,4 +1,5 @@
 import datetime
+import itertools
 import os
 from typing import Optional, Dict, List
 
@@ -9,10 +10,15 @@ from sqlalchemy.sql.functions import max
 from werkzeug.utils import secure_filename
 
 from app.commons.dto.pagination import PaginationRequest
-from app.constants import format_data_characteristics
-from app.problems.models import ProblemIndicatorDataModel, ProblemModel, AnnexCustomProblemModel
-from app.problems.repositories import ProblemRepository
-from db import db
+from app.commons.repositories.annex_metadata_repo import get_annex_previews
+from app.commons.sqlalchemy_utils import load_profile
+from app.commons.storage import stage_upload
+from app.constants import format_data_characteristics, format_data_characteristics_series, \
+    DATA_CHARACTERISTICS_FIELDS
+from app.problems.models import ProblemIndicatorDataModel, ProblemModel, AnnexCustomProblemModel, ProblemRankingModel, \
+    PROBLEM_INDICATOR_LOAD_PROFILES
+from app.problems.repositories import ProblemRepository, refresh_problem_ranking
+from db import db, read_replica
 
 repo = ProblemRepository()
 
@@ -27,10 +33,10 @@ def get_problem(
 def format_relative_frequency(data: list):
     if data:
         problem_ids = [item["issue_id"].lower() for item in data if "issue_id" in item]
-        problem_model_ls: List[ProblemModel] = db.session.execute(
-            select(ProblemModel)
+        problem_model_ls = db.session.execute(
+            select(ProblemModel.code, ProblemModel.name)
             .where(ProblemModel.code.in_(problem_ids))
-        ).scalars()
+        ).all()
 
         problem_subquery = (
             select(ProblemIndicatorDataModel.problem_id, max(ProblemIndicatorDataModel.period).label("period"))
@@ -38,8 +44,8 @@ def format_relative_frequency(data: list):
             .subquery()
         )
 
-        problem_ind_data_model_ls: List[ProblemIndicatorDataModel] = db.session.execute(
-            select(ProblemIndicatorDataModel)
+        problem_ind_data_model_ls = db.session.execute(
+            select(ProblemIndicatorDataModel.problem_id, ProblemIndicatorDataModel.total_city_incidents)
             .select_from(problem_subquery)
             .outerjoin(
                 ProblemIndicatorDataModel,
@@ -49,7 +55,7 @@ def format_relative_frequency(data: list):
                 )
             )
             .where(ProblemIndicatorDataModel.problem_id != None)
-        ).scalars()
+        ).all()
 
         problem_name_by_problem_code_dict = {
             item.code: item.name
@@ -101,6 +107,8 @@ def get_problem_kpi(
         ).where(
             ProblemIndicatorDataModel.problem_id == problem_code,
             ProblemIndicatorDataModel.period == period_subquery
+        ).options(
+            load_profile(ProblemIndicatorDataModel, PROBLEM_INDICATOR_LOAD_PROFILES, "kpi")
         ).limit(1)
     )
 
@@ -140,6 +148,7 @@ def calculate_frequency():
     print(rs)
 
 
+@read_replica
 def get_problem_data_characteristics(
         problem_id: str,
         period: Optional[int] = None
@@ -211,6 +220,79 @@ def get_problem_data_characteristics(
     return format_data_characteristics(result)
 
 
+@read_replica
+def get_problem_data_characteristics_history(
+        problem_id: str,
+        start_period: Optional[int] = None,
+        end_period: Optional[int] = None,
+        max_periods: int = 12,
+) -> Dict:
+    """Data characteristics of the last `max_periods` periods between `start_period` and `end_period`."""
+    select_stmt = (
+        select(
+            ProblemIndicatorDataModel.period,
+            *[getattr(ProblemIndicatorDataModel, db_field) for db_field in DATA_CHARACTERISTICS_FIELDS],
+        )
+        .join(ProblemModel, ProblemModel.code == ProblemIndicatorDataModel.problem_id)
+        .where(ProblemModel.id == problem_id)
+        .order_by(ProblemIndicatorDataModel.period.desc())
+        .limit(max_periods)
+    )
+    if start_period:
+        select_stmt = select_stmt.where(ProblemIndicatorDataModel.period >= start_period)
+    if end_period:
+        select_stmt = select_stmt.where(ProblemIndicatorDataModel.period <= end_period)
+
+    rows = [row._asdict() for row in reversed(db.session.execute(select_stmt).all())]
+    return {
+        "periods": [row["period"] for row in rows],
+        "dataCharacteristics": format_data_characteristics_series(rows),
+    }
+
+
+KPI_HISTORY_COLUMNS = {
+    "period": ProblemIndicatorDataModel.period,
+    "cityRate": ProblemIndicatorDataModel.city_rate,
+    "totalCityIncidents": ProblemIndicatorDataModel.total_city_incidents,
+    "trend": ProblemIndicatorDataModel.trend,
+    "performance": ProblemIndicatorDataModel.performance,
+    "criticalityLevel": ProblemIndicatorDataModel.criticality_level,
+}
+
+
+@read_replica
+def get_problem_kpi_history(
+        problem_id: str,
+        start_period: Optional[int] = None,
+        end_period: Optional[int] = None,
+        max_periods: int = 12,
+) -> Dict:
+    """KPIs of the last `max_periods` periods between `start_period` and `end_period`, one array per KPI."""
+    select_stmt = (
+        select(*KPI_HISTORY_COLUMNS.values())
+        .join(ProblemModel, ProblemModel.code == ProblemIndicatorDataModel.problem_id)
+        .where(ProblemModel.id == problem_id)
+        .order_by(ProblemIndicatorDataModel.period.desc())
+        .limit(max_periods)
+    )
+    if start_period:
+        select_stmt = select_stmt.where(ProblemIndicatorDataModel.period >= start_period)
+    if end_period:
+        select_stmt = select_stmt.where(ProblemIndicatorDataModel.period <= end_period)
+
+    rows = reversed(db.session.execute(select_stmt).all())
+    columns = zip(*rows)
+    return {
+        key: list(values)
+        for key, values in itertools.zip_longest(KPI_HISTORY_COLUMNS, columns, fillvalue=())
+    }
+
+
+@read_replica
+def compare_problems(problem_ids: List[int]):
+    return repo.compare_problems(list(dict.fromkeys(problem_ids)))
+
+
 def count_problems(problem_id):
     return repo.count_problems(problem_id)
 
@@ -300,7 +382,6 @@ from datetime import datetime
 
 def create_custom_problem(
         custom_cause: Dict,
-        path,
         user_id: int
 ):
     try:
@@ -312,14 +393,16 @@ def create_custom_problem(
         )
         db.session.add(custom_problem_obj)
         db.session.flush()
+        refresh_problem_ranking([custom_problem_obj.id])
 
         for annex_file in custom_cause.get("annexes", []):
-            filename = secure_filename(annex_file.filename)
-            annex_file.save(filepath := os.path.join(path, filename))
+            stored_file = stage_upload(annex_file)
             db.session.add(AnnexCustomProblemModel(
-                annexes_name=filename,
+                annexes_name=secure_filename(annex_file.filename),
                 custom_problem_id=custom_problem_obj.id,
-                path=filepath
+                path=stored_file.key,
+                sha256=stored_file.sha256,
+                size=stored_file.size,
             ))
 
         db.session.commit()
@@ -332,7 +415,6 @@ def create_custom_problem(
 def update_custom_problem_service(
         problem_model: ProblemModel,
         problem_dict: Dict,
-        path
 ):
     try:
         problem_model.name = problem_dict.get("name", problem_model.name)
@@ -351,12 +433,13 @@ def update_custom_problem_service(
             )
 
         for annex_file in problem_dict.get("annexes_to_add", []):
-            filename = secure_filename(annex_file.filename)
-            annex_file.save(filepath := os.path.join(path, filename))
+            stored_file = stage_upload(annex_file)
             db.session.add(AnnexCustomProblemModel(
-                annexes_name=filename,
+                annexes_name=secure_filename(annex_file.filename),
                 custom_problem_id=problem_model.id,
-                path=filepath
+                path=stored_file.key,
+                sha256=stored_file.sha256,
+                size=stored_file.size,
             ))
 
         db.session.commit()
@@ -389,6 +472,7 @@ def get_custom_problem(custom_problem_id: int) -> Optional[Dict]:
     )
     problem_model: ProblemModel = db.session.execute(select_stmt).scalar()
     if problem_model:
+        annex_previews = get_annex_previews(item.path for item in problem_model.annexes)
         return dict(
             id=problem_model.id,
             name=problem_model.name,
@@ -400,7 +484,8 @@ def get_custom_problem(custom_problem_id: int) -> Optional[Dict]:
                 dict(
                     id=item.id,
                     name=item.annexes_name,
-                    url=url_for("serve_uploaded_file", filename=item.annexes_name, _external=True)
+                    url=url_for("serve_uploaded_file", filename=os.path.basename(item.path), _external=True),
+                    preview=annex_previews.get(os.path.basename(item.path)),
                 ) for item in problem_model.annexes
             ],
             createdAt=problem_model.created_at and problem_model.created_at.isoformat(),
@@ -428,6 +513,7 @@ def delete_custom_problem(
     try:
         db.session.execute(
             delete(AnnexCustomProblemModel).where(AnnexCustomProblemModel.custom_problem_id == problem_id))
+        db.session.execute(delete(ProblemRankingModel).where(ProblemRankingModel.problem_id == problem_id))
         db.session.execute(delete(ProblemModel).where(ProblemModel.id == problem_id))
         db.session.commit()
     except Exception:
@@ -0,0 +1,5 @@
+from apiflask import APIBlueprint
+
+bp = APIBlueprint('search', __name__, url_prefix="/search")
+
+from . import controllers
\ No newline at end of file
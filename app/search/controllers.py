@@ -0,0 +1,19 @@
+from http import HTTPStatus
+
+from app.auth.auth_config import auth_token
+from app.commons.dto.pagination import PaginationRequest
+from app.search import bp
+from app.search.schemas import SearchRequestSchema
+from app.search.services import search
+
+
+@bp.get("")
+@bp.input(SearchRequestSchema, location="query")
+@bp.auth_required(auth_token)
+def search_controller(query):
+    pagination_req = PaginationRequest(page=query["page"], page_size=query["page_size"], order_field="rank")
+    pagination_res = search(query["q"], query["types"], pagination_req)
+    return {
+        "code": HTTPStatus.OK,
+        "data": pagination_res.to_dict()
+    }
@@ -0,0 +1,15 @@
+from apiflask import fields
+from marshmallow import validate
+
+from app.commons.schemas.request import PaginationReqSchema
+
+SEARCHABLE_TYPES = ["problem", "cause", "initiative"]
+
+
+class SearchRequestSchema(PaginationReqSchema):
+    q = fields.String(required=True, validate=[validate.Length(min=1, max=200)])
+    types = fields.List(
+        fields.String(validate=[validate.OneOf(SEARCHABLE_TYPES)]),
+        data_key="types[]",
+        load_default=SEARCHABLE_TYPES,
+    )
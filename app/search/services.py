@@ -0,0 +1,104 @@
+import math
+from typing import List
+
+from sqlalchemy import select, func, literal, union, union_all, or_
+
+from app.causes.models import CauseModel, CustomCauseModel, CAUSE_SEARCH_COLUMNS, CUSTOM_CAUSE_SEARCH_COLUMNS
+from app.commons.dto.pagination import PaginationRequest, PaginationResponse
+from app.commons.sqlalchemy_utils import search_vector, search_query
+from app.initiatives.models import InitiativeModel, INITIATIVE_SEARCH_COLUMNS
+from app.problems.models import ProblemModel, PROBLEM_SEARCH_COLUMNS
+from db import db, read_replica
+
+
+def _matches(vector, name_column, term: str):
+    """Full-text match on the indexed vector or trigram similarity of the name, for typos and partial words."""
+    query = search_query(term)
+    condition = or_(vector.op("@@")(query), name_column.op("%")(term))
+    rank = func.ts_rank_cd(vector, query) + func.similarity(name_column, term)
+    return condition, rank
+
+
+def _problems_select(term: str):
+    condition, rank = _matches(search_vector(*PROBLEM_SEARCH_COLUMNS), ProblemModel.name, term)
+    return select(
+        literal("problem").label("type"),
+        ProblemModel.id.label("id"),
+        ProblemModel.name.label("name"),
+        ProblemModel.is_default.label("is_default"),
+        rank.label("rank"),
+    ).where(condition)
+
+
+def _causes_select(term: str):
+    cause_condition, cause_rank = _matches(search_vector(*CAUSE_SEARCH_COLUMNS), CauseModel.name, term)
+    custom_vector = search_vector(*CUSTOM_CAUSE_SEARCH_COLUMNS)
+    query = search_query(term)
+    custom_cause_table = CustomCauseModel.__table__
+    # one select per table so each predicate is served by its own index, OR-ing them across the outer join can't
+    matching_ids = union(
+        select(CauseModel.id.label("id")).where(cause_condition),
+        select(custom_cause_table.c.id.label("id")).where(custom_vector.op("@@")(query)),
+    ).subquery("matching_causes")
+    return (
+        select(
+            literal("cause").label("type"),
+            CauseModel.id.label("id"),
+            CauseModel.name.label("name"),
+            (CauseModel.type == "default_cause").label("is_default"),
+            (cause_rank + func.coalesce(func.ts_rank_cd(custom_vector, query), 0)).label("rank"),
+        )
+        .select_from(matching_ids)
+        .join(CauseModel, CauseModel.id == matching_ids.c.id)
+        .outerjoin(custom_cause_table, custom_cause_table.c.id == CauseModel.id)
+    )
+
+
+def _initiatives_select(term: str):
+    condition, rank = _matches(search_vector(*INITIATIVE_SEARCH_COLUMNS), InitiativeModel.name, term)
+    return select(
+        literal("initiative").label("type"),
+        InitiativeModel.id.label("id"),
+        InitiativeModel.name.label("name"),
+        InitiativeModel.is_default.label("is_default"),
+        rank.label("rank"),
+    ).where(condition)
+
+
+SEARCH_SELECTS = {
+    "problem": _problems_select,
+    "cause": _causes_select,
+    "initiative": _initiatives_select,
+}
+
+
+@read_replica
+def search(term: str, types: List[str], pagination_req: PaginationRequest) -> PaginationResponse:
+    """Problems, causes and initiatives matching `term`, best ranked first."""
+    selects = [SEARCH_SELECTS[type_](term) for type_ in SEARCH_SELECTS if type_ in types]
+    if not selects:
+        return PaginationResponse(total_items=0, total_pages=0, results=[])
+
+    results = union_all(*selects).subquery("search_results")
+    total_items = db.session.execute(select(func.count()).select_from(results)).scalar()
+    rows = db.session.execute(
+        select(results)
+        .order_by(results.c.rank.desc(), results.c.name, results.c.type, results.c.id)
+        .offset(pagination_req.offset)
+        .limit(pagination_req.page_size)
+    ).all()
+
+    return PaginationResponse(
+        total_items=total_items,
+        total_pages=math.ceil(total_items / pagination_req.page_size),
+        results=[
+            {
+                "type": row.type,
+                "id": row.id,
+                "name": row.name,
+                "isDefault": row.is_default,
+                "rank": round(row.rank, 4),
+            }
+            for row in rows
+        ],
+    )
@@ -0,0 +1,333 @@
+"""
+Fill the benchmark database with synthetic data, `--scale` times the production volume.
+
+    python -m benchmarks.generate_data --scale 10
+
+The schema is dropped and created again, never point DB_NAME to a database with real data.
+"""
+import datetime
+import random
+
+import click
+from sqlalchemy import insert, text, Integer
+
+from app.auth.models.user_model import UserModel
+from app.cause_problem_association.models import CauseAndProblemAssociation
+from app.causes.models import CauseModel, DefaultCauseModel, CustomCauseModel, CauseIndicatorModel, \
+    CauseIndicatorDataModel
+from app.commons.models.municipal_department_model import MunicipalDepartmentModel
+from app.commons.models.neighborhood_model import NeighborhoodModel
+from app.initiatives.models import InitiativeModel, InitiativeCauseProblemAssociationModel, \
+    InitiativeCauseAssociationModel, InitiativePrioritizationModel, InitiativeOutcomeModel, \
+    InitiativeOutcomeAssociationModel, municipal_department_per_initiative_association_table
+from app.initiatives.repositories import refresh_initiative_coverage
+from app.plan.models import PlanModel, MacroObjectiveModel, MacroObjectiveProblemAssociationModel, FocusModel, \
+    FocusAssociationModel, MacroObjectiveGoalModel, FocusGoalModel, ProblemDiagnosisModel, \
+    CauseIndicatorDiagnosisModel, TacticalDimensionModel, TacticalDimensionGoalModel, \
+    TacticalDimensionDepartmentRoleModel
+from app.problems.models import ProblemModel, ProblemIndicatorDataModel
+from app.problems.repositories import refresh_problem_ranking
+from db import db
+from wsgi import app
+
+# approximate production volume, see the csv files in /data
+PRODUCTION_VOLUME = dict(
+    problems=21,
+    causes=59,
+    cause_indicators=38,
+    initiatives=65,
+    custom_causes=10,
+    custom_initiatives=10,
+    periods=36,  # monthly indicator data
+    macro_objectives=6,
+    focuses=7,
+    neighborhoods=53,
+    municipal_departments=27,
+    initiative_outcomes=81,
+)
+CAUSES_PER_PROBLEM = 6
+PROBLEMS_PER_INITIATIVE = 3
+BATCH_SIZE = 5000
+
+CHARACTERISTIC_FIELDS = [
+    "perpetrator_gender",
+    "perpetrator_age_range",
+    "victim_gender",
+    "victim_age_range",
+    "date_day_of_the_week",
+    "date_time_of_day",
+    "concentration",
+    "place_type",
+    "weapon",
+    "typology",
+]
+
+
+def _insert(model_or_table, rows):
+    table = getattr(model_or_table, "__table__", model_or_table)
+    for start in range(0, len(rows), BATCH_SIZE):
+        db.session.execute(insert(table), rows[start:start + BATCH_SIZE])
+
+
+def _periods(count: int):
+    today = datetime.date.today().replace(day=1)
+    for months_ago in range(count):
+        year, month = divmod(today.year * 12 + today.month - 1 - months_ago, 12)
+        yield (year * 100 + month + 1) * 100 + 1
+
+
+def _characteristics():
+    return [dict(name=f"category {i}", value=random.randint(0, 500)) for i in range(random.randint(2, 8))]
+
+
+def _problem_indicator_data(code: str, period: int, problem_codes):
+    data = dict(
+        problem_id=code,
+        period=period,
+        city_rate=random.uniform(0, 100),
+        total_city_incidents=random.randint(0, 10000),
+        trend=random.uniform(-5, 5),
+        trend_normalized=random.randint(1, 5),
+        trend_data=[
+            dict(year=period // 10000 - year, quarter=quarter, totalCityIncidents=random.randint(0, 3000),
+                 rateCityIncidents=random.uniform(0, 30))
+            for year in range(3) for quarter in range(1, 5)
+        ],
+        performance=random.uniform(0, 2),
+        performance_normalized=random.randint(1, 5),
+        performance_data=[
+            dict(year=period // 10000, month=month, cityRate=random.uniform(0, 10), stateRate=random.uniform(0, 10))
+            for month in range(1, 13)
+        ],
+        relative_frequency=random.uniform(0, 1),
+        relative_frequency_normalized=random.randint(1, 5),
+        relative_frequency_data=[
+            dict(issue_id=related_code.upper(), period_date=str(period), rate_relative_frequency=random.uniform(0, 1))
+            for related_code in random.sample(problem_codes, min(5, len(problem_codes)))
+        ],
+        harm_potential=random.randint(1, 5),
+        harm_potential_normalized=random.randint(1, 5),
+        criticality_level=random.randint(1, 25),
+    )
+    data.update({field: _characteristics() for field in CHARACTERISTIC_FIELDS})
+    return data
+
+
+def generate(scale: int, seed: int):
+    random.seed(seed)
+    volume = {key: value * scale for key, value in PRODUCTION_VOLUME.items()}
+    volume["periods"] = PRODUCTION_VOLUME["periods"]
+    periods = list(_periods(volume["periods"]))
+
+    db.session.add(UserModel(
+        id=1, email="benchmark@safecities.com", name="benchmark", last_name="user", is_active=True, is_admin=True,
+    ))
+    db.session.flush()
+
+    _insert(NeighborhoodModel, [dict(id=i, name=f"neighborhood {i}") for i in range(1, volume["neighborhoods"] + 1)])
+    _insert(MunicipalDepartmentModel, [
+        dict(id=i, name=f"department {i}") for i in range(1, volume["municipal_departments"] + 1)
+    ])
+    _insert(InitiativeOutcomeModel, [
+        dict(id=i, name=f"outcome {i}") for i in range(1, volume["initiative_outcomes"] + 1)
+    ])
+
+    # problems
+    problem_ids = list(range(1, volume["problems"] + 1))
+    problem_codes = [f"pe{problem_id:04d}" for problem_id in problem_ids]
+    _insert(ProblemModel, [
+        dict(
+            id=problem_id, code=code, name=f"problem {problem_id}", description=f"description {problem_id}",
+            indicator_name=f"indicator {problem_id}", measurement_unit="rate", indicator_code=code,
+            polarity="negative", is_default=True, prioritized=problem_id % 3 == 0, references=[],
+        )
+        for problem_id, code in zip(problem_ids, problem_codes)
+    ])
+    _insert(ProblemIndicatorDataModel, [
+        _problem_indicator_data(code, period, problem_codes) for code in problem_codes for period in periods
+    ])
+
+    # causes
+    default_cause_ids = list(range(1, volume["causes"] + 1))
+    custom_cause_ids = list(range(len(default_cause_ids) + 1, len(default_cause_ids) + volume["custom_causes"] + 1))
+    _insert(CauseModel, [
+        dict(id=cause_id, name=f"cause {cause_id}", justification="justification", type="default_cause")
+        for cause_id in default_cause_ids
+    ] + [
+        dict(id=cause_id, name=f"custom cause {cause_id}", justification="justification", type="custom_cause")
+        for cause_id in custom_cause_ids
+    ])
+    _insert(DefaultCauseModel, [dict(id=cause_id, code=f"c{cause_id:04d}") for cause_id in default_cause_ids])
+    _insert(CustomCauseModel, [
+        dict(id=cause_id, evidences="evidences", references=[], created_by_id=1) for cause_id in custom_cause_ids
+    ])
+
+    cause_indicators = [
+        dict(id=i, cause_id=random.choice(default_cause_ids), code=f"ci{i:04d}", name=f"cause indicator {i}",
+             measurement_unit="rate", polarity="negative")
+        for i in range(1, volume["cause_indicators"] + 1)
+    ]
+    _insert(CauseIndicatorModel, cause_indicators)
+    _insert(CauseIndicatorDataModel, [
+        dict(
+            cause_indicator_id=indicator["code"], period=period, city_rate=random.uniform(0, 100),
+            total_city_incidents=random.randint(0, 10000), trend=random.uniform(-5, 5),
+            trend_data=[dict(year=period // 10000, quarter=q, totalCityIncidents=random.randint(0, 3000),
+                             rateCityIncidents=random.uniform(0, 30)) for q in range(1, 5)],
+            **{field: _characteristics() for field in CHARACTERISTIC_FIELDS},
+        )
+        for indicator in cause_indicators for period in periods
+    ])
+
+    cause_problem_pairs = {
+        (cause_id, problem_id)
+        for problem_id in problem_ids
+        for cause_id in random.sample(default_cause_ids + custom_cause_ids, CAUSES_PER_PROBLEM)
+    }
+    _insert(CauseAndProblemAssociation, [
+        dict(cause_id=cause_id, problem_id=problem_id, prioritized=random.random() < 0.3)
+        for cause_id, problem_id in cause_problem_pairs
+    ])
+
+    # initiatives
+    default_initiative_ids = list(range(1, volume["initiatives"] + 1))
+    custom_initiative_ids = list(range(
+        len(default_initiative_ids) + 1, len(default_initiative_ids) + volume["custom_initiatives"] + 1
+    ))
+    _insert(InitiativeModel, [
+        dict(
+            id=initiative_id, code=f"i{initiative_id:04d}" if initiative_id in default_initiative_ids else None,
+            name=f"initiative {initiative_id}", justification="justification", evidences="evidences",
+            cost_level=random.randint(1, 3), efficiency_level=random.randint(1, 5), reference_urls=[],
+            annex_ids=[], is_default=initiative_id in default_initiative_ids,
+        )
+        for initiative_id in default_initiative_ids + custom_initiative_ids
+    ])
+    _insert(municipal_department_per_initiative_association_table, [
+        dict(initiative_id=initiative_id, municipal_department_id=department_id)
+        for initiative_id in default_initiative_ids + custom_initiative_ids
+        for department_id in random.sample(range(1, volume["municipal_departments"] + 1), 2)
+    ])
+    _insert(InitiativeOutcomeAssociationModel, [
+        dict(initiative_id=initiative_id, initiative_outcome_id=outcome_id)
+        for initiative_id in default_initiative_ids + custom_initiative_ids
+        for outcome_id in random.sample(range(1, volume["initiative_outcomes"] + 1), 3)
+    ])
+
+    initiative_associations = {
+        (initiative_id, cause_id, problem_id)
+        for initiative_id in default_initiative_ids
+        for cause_id, problem_id in random.sample(sorted(cause_problem_pairs), PROBLEMS_PER_INITIATIVE)
+    }
+    _insert(InitiativeCauseProblemAssociationModel, [
+        dict(initiative_id=initiative_id, cause_id=cause_id, problem_id=problem_id)
+        for initiative_id, cause_id, problem_id in initiative_associations
+    ])
+    _insert(InitiativeCauseAssociationModel, [
+        dict(initiative_id=initiative_id, cause_id=random.choice(custom_cause_ids))
+        for initiative_id in custom_initiative_ids
+    ])
+    prioritized_initiatives = [item for item in initiative_associations if random.random() < 0.3]
+    _insert(InitiativePrioritizationModel, [
+        dict(initiative_id=initiative_id, cause_id=cause_id, problem_id=problem_id)
+        for initiative_id, cause_id, problem_id in prioritized_initiatives
+    ])
+
+    # plan
+    db.session.add(PlanModel(
+        id=1, title="benchmark plan", start_at=datetime.date.today(),
+        end_at=datetime.date.today() + datetime.timedelta(days=365 * 4),
+    ))
+    macro_objective_ids = list(range(1, volume["macro_objectives"] + 1))
+    focus_ids = list(range(1, volume["focuses"] + 1))
+    _insert(MacroObjectiveModel, [dict(id=i, name=f"macro objective {i}") for i in macro_objective_ids])
+    _insert(FocusModel, [dict(id=i, name=f"focus {i}") for i in focus_ids])
+    _insert(MacroObjectiveProblemAssociationModel, [
+        dict(macro_objective_id=random.choice(macro_objective_ids), problem_id=problem_id)
+        for problem_id in problem_ids
+    ])
+    focus_associations = [
+        dict(focus_id=random.choice(focus_ids), macro_objective_id=random.choice(macro_objective_ids),
+             cause_indicator_id=indicator["id"])
+        for indicator in cause_indicators
+    ]
+    _insert(FocusAssociationModel, focus_associations)
+
+    goal_values = dict(initial_rate=10, goal_value=5, goal_justification="justification",
+                       end_at=datetime.date.today() + datetime.timedelta(days=365))
+    _insert(MacroObjectiveGoalModel, [
+        dict(plan_id=1, macro_objective_id=macro_objective_id, problem_id=problem_id, **goal_values)
+        for macro_objective_id, problem_id in db.session.execute(
+            text("SELECT macro_objective_id, problem_id FROM macro_objective_problem_association")
+        )
+    ])
+    _insert(FocusGoalModel, [
+        dict(plan_id=1, macro_objective_id=item["macro_objective_id"], focus_id=item["focus_id"],
+             cause_indicator_id=item["cause_indicator_id"], **goal_values)
+        for item in focus_associations
+    ])
+    _insert(ProblemDiagnosisModel, [
+        dict(plan_id=1, problem_id=problem_id, diagnosis="diagnosis",
+             kpi_graphs=["trend", "performance", "relative_frequency"])
+        for problem_id in problem_ids if problem_id % 3 == 0
+    ])
+    _insert(CauseIndicatorDiagnosisModel, [
+        dict(plan_id=1, cause_id=indicator["cause_id"], cause_indicator_id=indicator["id"], diagnosis="diagnosis",
+             kpi_graphs=["trend"])
+        for indicator in cause_indicators
+    ])
+
+    tactical_dimension_initiative_ids = sorted({initiative_id for initiative_id, _, _ in prioritized_initiatives})
+    _insert(TacticalDimensionModel, [
+        dict(
+            id=tactical_dimension_id, plan_id=1, initiative_id=initiative_id, diagnosis="diagnosis",
+            neighborhood_id=random.randint(1, volume["neighborhoods"]), sociodemographic_targeting="targeting",
+            start_at=datetime.date.today(), end_at=datetime.date.today() + datetime.timedelta(days=365),
+            total_cost=random.uniform(1000, 100000),
+        )
+        for tactical_dimension_id, initiative_id in enumerate(tactical_dimension_initiative_ids, start=1)
+    ])
+    _insert(TacticalDimensionGoalModel, [
+        dict(tactical_dimension_id=tactical_dimension_id, initiative_outcome_id=random.randint(1, 3),
+             goal=random.uniform(1, 100), date=datetime.date.today())
+        for tactical_dimension_id in range(1, len(tactical_dimension_initiative_ids) + 1)
+        for _ in range(3)
+    ])
+    _insert(TacticalDimensionDepartmentRoleModel, [
+        dict(tactical_dimension_id=tactical_dimension_id, department_id=random.randint(1, 3), role="role")
+        for tactical_dimension_id in range(1, len(tactical_dimension_initiative_ids) + 1)
+    ])
+
+    refresh_problem_ranking()
+    refresh_initiative_coverage()
+
+    # explicit ids were inserted, move the sequences so the API can keep creating rows
+    for table in db.metadata.sorted_tables:
+        primary_key = list(table.primary_key.columns)
+        if len(primary_key) == 1 and isinstance(primary_key[0].type, Integer) and not primary_key[0].foreign_keys:
+            column = primary_key[0].name
+            db.session.execute(text(
+                f"SELECT setval(pg_get_serial_sequence('{table.name}', '{column}'), "
+                f"COALESCE((SELECT MAX({column}) FROM {table.name}), 0) + 1, false) "
+                f"WHERE pg_get_serial_sequence('{table.name}', '{column}') IS NOT NULL"
+            ))
+    db.session.commit()
+    return volume
+
+
+@click.command()
+@click.option("--scale", default=1, show_default=True, help="Multiplier of the production volume.")
+@click.option("--seed", default=42, show_default=True, help="Random seed, keep it fixed to compare runs.")
+def main(scale: int, seed: int):
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        volume = generate(scale, seed)
+        db.session.execute(text("ANALYZE"))
+        db.session.commit()
+
+    click.echo(f"generated scale={scale} " + " ".join(f"{key}={value}" for key, value in volume.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+Measure latency percentiles and throughput of the hot endpoints against the benchmark database.
+
+    python -m benchmarks.run --requests 200 --save-baseline main
+    python -m benchmarks.run --requests 200 --compare main
+
+Requests go through the Flask test client, so no web server, broker or mail server is needed, only the
+Postgres database filled by `benchmarks.generate_data`.
+"""
+import datetime
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from http import HTTPStatus
+
+import click
+from sqlalchemy import select, func
+
+from app.auth.utils import encode_jwt_token
+from app.problems.models import ProblemModel, ProblemIndicatorDataModel
+from db import db
+from wsgi import app
+
+BASELINES_DIR = os.path.join(os.path.dirname(__file__), "baselines")
+
+ENDPOINTS = dict(
+    list_problems="/problems?page=1&page_size=10&order_field=criticality_level&sort_type=desc",
+    get_problem="/problems/{problem_id}",
+    list_initiatives="/initiatives?page=1&page_size=10&order_field=initiative_name",
+    plan_status="/plan/status",
+    list_focuses="/plan/macro-objectives/focus/all",
+    plan_pdf="/plan/pdf",
+)
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _percentile(quantiles, percentile: int):
+    return quantiles[percentile - 1]
+
+
+def measure(client, url: str, headers: dict, requests: int, warmup: int):
+    for _ in range(warmup):
+        client.get(url, headers=headers)
+
+    latencies = list()
+    started_at = time.perf_counter()
+    for _ in range(requests):
+        request_started_at = time.perf_counter()
+        response = client.get(url, headers=headers)
+        latencies.append((time.perf_counter() - request_started_at) * 1000)
+        if response.status_code != HTTPStatus.OK:
+            raise click.ClickException(f"{url} returned {response.status_code}: {response.data[:500]}")
+    elapsed = time.perf_counter() - started_at
+
+    quantiles = statistics.quantiles(latencies, n=100, method="inclusive")
+    return dict(
+        p50_ms=round(_percentile(quantiles, 50), 2),
+        p95_ms=round(_percentile(quantiles, 95), 2),
+        p99_ms=round(_percentile(quantiles, 99), 2),
+        throughput_rps=round(requests / elapsed, 2),
+    )
+
+
+def compare(results: dict, baseline: dict, max_regression: float) -> bool:
+    ok = True
+    click.echo(f"\ncompared with baseline {baseline.get('commit')} ({baseline.get('created_at')})")
+    for name, result in results.items():
+        previous = baseline["results"].get(name)
+        if not previous:
+            click.echo(f"{name:<20} no baseline")
+            continue
+        change = (result["p95_ms"] - previous["p95_ms"]) / previous["p95_ms"]
+        regression = change > max_regression
+        ok = ok and not regression
+        click.echo(
+            f"{name:<20} p95 {previous['p95_ms']:>9.2f} -> {result['p95_ms']:>9.2f} ms ({change:+.1%})"
+            + ("  REGRESSION" if regression else "")
+        )
+    return ok
+
+
+@click.command()
+@click.option("--requests", default=100, show_default=True, help="Measured requests per endpoint.")
+@click.option("--warmup", default=10, show_default=True, help="Requests per endpoint before measuring.")
+@click.option("--endpoint", "endpoints", multiple=True, type=click.Choice(list(ENDPOINTS)),
+              help="Only run these endpoints, all of them by default.")
+@click.option("--save-baseline", help="Store the results in benchmarks/baselines/<name>.json.")
+@click.option("--compare", "compare_with", help="Compare the p95 with benchmarks/baselines/<name>.json.")
+@click.option("--max-regression", default=0.15, show_default=True,
+              help="Allowed p95 increase over the baseline before failing, 0.15 means 15%.")
+def main(requests, warmup, endpoints, save_baseline, compare_with, max_regression):
+    app.config["QUERY_PROFILER_ENABLED"] = False
+    client = app.test_client()
+
+    with app.app_context():
+        problem_id = db.session.execute(
+            select(ProblemModel.id).where(ProblemModel.prioritized == True).order_by(ProblemModel.id).limit(1)
+        ).scalar()
+        indicator_data_rows = db.session.execute(select(func.count()).select_from(ProblemIndicatorDataModel)).scalar()
+        if problem_id is None:
+            raise click.ClickException("The database is empty, run `python -m benchmarks.generate_data` first")
+
+    token = encode_jwt_token({"id": 1}, "super-secret", datetime.timedelta(hours=1))
+    headers = {"Authorization": f"Bearer {token}"}
+
+    results = dict()
+    click.echo(f"{'endpoint':<20} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'req/s':>9}")
+    for name in endpoints or ENDPOINTS:
+        url = ENDPOINTS[name].format(problem_id=problem_id)
+        results[name] = measure(client, url, headers, requests, warmup)
+        click.echo(
+            f"{name:<20} {results[name]['p50_ms']:>9.2f} {results[name]['p95_ms']:>9.2f} "
+            f"{results[name]['p99_ms']:>9.2f} {results[name]['throughput_rps']:>9.2f}"
+        )
+
+    report = dict(
+        commit=_git_commit(),
+        created_at=datetime.datetime.utcnow().isoformat(timespec="seconds"),
+        requests=requests,
+        problem_indicator_data_rows=indicator_data_rows,
+        results=results,
+    )
+
+    if save_baseline:
+        os.makedirs(BASELINES_DIR, exist_ok=True)
+        path = os.path.join(BASELINES_DIR, f"{save_baseline}.json")
+        with open(path, "w") as baseline_file:
+            json.dump(report, baseline_file, indent=2)
+        click.echo(f"\nbaseline saved to {path}")
+
+    if compare_with:
+        with open(os.path.join(BASELINES_DIR, f"{compare_with}.json")) as baseline_file:
+            baseline = json.load(baseline_file)
+        if baseline.get("problem_indicator_data_rows") != indicator_data_rows:
+            click.echo("warning: the baseline was measured with a different data volume")
+        if not compare(results, baseline, max_regression):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -11,6 +11,9 @@ DB_URL = os.environ["DB_URL"]
 DB_NAME = os.environ["DB_NAME"]
 DB_PORT = int(os.environ["DB_PORT"])
 
+DB_REPLICA_URL = os.getenv("DB_REPLICA_URL")
+DB_REPLICA_PORT = int(os.getenv("DB_REPLICA_PORT", DB_PORT))
+
 RABBITMQ_HOST = os.environ["RABBITMQ_HOST"]
 RABBITMQ_PORT = int(os.environ["RABBITMQ_PORT"])
 RABBITMQ_USER = os.environ["RABBITMQ_USER"]
@@ -25,11 +28,56 @@ class BaseConfig(abc.ABC):
     SQLALCHEMY_ENGINE_OPTIONS = {
         'pool_pre_ping': True
     }
+    SQLALCHEMY_BINDS = {
+        "replica": {
+            "url": f"postgresql://{DB_USER}:{DB_PWD}@{DB_REPLICA_URL}:{DB_REPLICA_PORT}/{DB_NAME}",
+            "pool_pre_ping": True,
+        }
+    } if DB_REPLICA_URL else {}
+    REPLICA_MAX_LAG_SECONDS = float(os.getenv("DB_REPLICA_MAX_LAG_SECONDS", 10))
+    REPLICA_LAG_CHECK_INTERVAL = float(os.getenv("DB_REPLICA_LAG_CHECK_INTERVAL", 5))
+
+    QUERY_PROFILER_ENABLED = bool(int(os.getenv("QUERY_PROFILER_ENABLED", 1)))
+    QUERY_PROFILER_MAX_QUERIES = int(os.getenv("QUERY_PROFILER_MAX_QUERIES", 30))
+    QUERY_PROFILER_MAX_DB_TIME_MS = float(os.getenv("QUERY_PROFILER_MAX_DB_TIME_MS", 500))
+    QUERY_PROFILER_KEEP_SLOWEST = int(os.getenv("QUERY_PROFILER_KEEP_SLOWEST", 3))
+
+    # local: UPLOAD_FOLDER, s3: any S3 compatible service, S3_ENDPOINT_URL points to MinIO for local tests
+    STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "local")
+    S3_BUCKET = os.getenv("S3_BUCKET")
+    S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL")
+    S3_REGION = os.getenv("S3_REGION")
+    S3_ACCESS_KEY_ID = os.getenv("S3_ACCESS_KEY_ID")
+    S3_SECRET_ACCESS_KEY = os.getenv("S3_SECRET_ACCESS_KEY")
+    S3_URL_EXPIRATION = int(os.getenv("S3_URL_EXPIRATION", 3600))
+
+    # flask, x-accel (nginx X-Accel-Redirect to UPLOADS_ACCEL_PREFIX) or x-sendfile (Apache, lighttpd)
+    UPLOADS_SERVE_MODE = os.getenv("UPLOADS_SERVE_MODE", "flask")
+    UPLOADS_ACCEL_PREFIX = os.getenv("UPLOADS_ACCEL_PREFIX", "/protected-uploads/")
+    UPLOADS_MAX_AGE = int(os.getenv("UPLOADS_MAX_AGE", 3600))
+    USE_X_SENDFILE = UPLOADS_SERVE_MODE == "x-sendfile"
+
+    # annex metadata, thumbnails (Pillow) and pdf text (pypdf) are computed by a celery task after the upload
+    ANNEX_PROCESSING_ENABLED = bool(int(os.getenv("ANNEX_PROCESSING_ENABLED", 1)))
+    # import path of a callable(file_path) returning None for clean files or the threat found
+    ANNEX_SCAN_HOOK = os.getenv("ANNEX_SCAN_HOOK")
+
+    # orphaned uploads garbage collection, files younger than the grace period are never removed
+    UPLOADS_GC_GRACE_HOURS = float(os.getenv("UPLOADS_GC_GRACE_HOURS", 24))
+    UPLOADS_GC_QUARANTINE = bool(int(os.getenv("UPLOADS_GC_QUARANTINE", 0)))
+    UPLOADS_GC_INTERVAL_HOURS = float(os.getenv("UPLOADS_GC_INTERVAL_HOURS", 24))
 
     CELERY = dict(
         broker_url=f"amqp://{RABBITMQ_USER}:{RABBITMQ_PASSWORD}@{RABBITMQ_HOST}:{RABBITMQ_PORT}",
         # result_backend="redis://localhost",
         task_ignore_result=True,
+        # only runs with a `celery beat` process
+        beat_schedule={
+            "collect-orphaned-uploads": dict(
+                task="app.commons.tasks.task_collect_orphaned_uploads",
+                schedule=UPLOADS_GC_INTERVAL_HOURS * 60 * 60,
+            ),
+        },
     )
 
     MAIL_SERVER = os.environ["MAIL_SERVER"]
@@ -1,3 +1,87 @@
+import contextvars
+import logging
+import time
+from functools import wraps
+
+from flask import current_app
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
+from sqlalchemy import text, Select
+
+logger = logging.getLogger(__name__)
+
+REPLICA_BIND_KEY = "replica"
+
+_use_replica = contextvars.ContextVar("use_replica", default=False)
+_replica_lag_cache = dict(checked_at=0.0, lag=None)
+
+REPLICA_LAG_QUERY = text(
+    """
+    SELECT CASE
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+    """
+)
+
+
+def _get_replica_lag(engine) -> float:
+    """
+    Return the replication lag of the replica in seconds, cached for REPLICA_LAG_CHECK_INTERVAL seconds.
+    Any error while checking is reported as an infinite lag so reads go to the primary.
+    """
+    check_interval = current_app.config.get("REPLICA_LAG_CHECK_INTERVAL", 5)
+    now = time.monotonic()
+    if _replica_lag_cache["lag"] is not None and now - _replica_lag_cache["checked_at"] < check_interval:
+        return _replica_lag_cache["lag"]
+
+    try:
+        with engine.connect() as connection:
+            lag = float(connection.execute(REPLICA_LAG_QUERY).scalar() or 0)
+    except Exception:
+        logger.exception("Replica lag check failed, reading from primary")
+        lag = float("inf")
+
+    _replica_lag_cache.update(checked_at=now, lag=lag)
+    return lag
+
+
+class RoutingSession(Session):
+    """
+    Session that sends SELECT statements to the read replica while a `read_replica` decorated function is
+    running. Flushes, writes and every statement issued outside those functions stay on the primary.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (
+                bind is None
+                and _use_replica.get()
+                and not self._flushing
+                and isinstance(clause, Select)
+                and REPLICA_BIND_KEY in self._db.engines
+        ):
+            replica_engine = self._db.engines[REPLICA_BIND_KEY]
+            max_lag = current_app.config.get("REPLICA_MAX_LAG_SECONDS", 10)
+            if _get_replica_lag(replica_engine) <= max_lag:
+                return replica_engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def read_replica(func):
+    """
+    Run the read-only queries of the decorated function against the replica configured in SQLALCHEMY_BINDS.
+    Falls back to the primary when no replica is configured or the replica lags behind.
+    """
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        token = _use_replica.set(True)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _use_replica.reset(token)
+
+    return wrapper
+
 
-db = SQLAlchemy()
\ No newline at end of file
+db = SQLAlchemy(session_options={"class_": RoutingSession})
@@ -5,6 +5,8 @@ from flask import current_app
 
 from alembic import context
 
+from app.commons.sqlalchemy_utils import CREATE_TRIGRAM_EXTENSION
+
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
 config = context.config
@@ -69,6 +71,8 @@ def run_migrations_offline():
     )
 
     with context.begin_transaction():
+        # the trigram indexes of the autogenerated migrations need the extension, metadata events don't run here
+        context.execute(CREATE_TRIGRAM_EXTENSION)
         context.run_migrations()
 
 
@@ -101,6 +105,7 @@ def run_migrations_online():
         )
 
         with context.begin_transaction():
+            context.execute(CREATE_TRIGRAM_EXTENSION)
             context.run_migrations()
 
 
@@ -0,0 +1,167 @@
+import hashlib
+import io
+import os
+import time
+
+import pytest
+from werkzeug.datastructures import FileStorage
+
+from app import app
+from app.commons.storage import LocalStorage, S3Storage, stage_upload, upload_promoted
+from db import db
+
+moto = pytest.importorskip("moto")
+
+CONTENT = b"annex content"
+KEY = hashlib.sha256(CONTENT).hexdigest() + ".pdf"
+BUCKET = "safecities-test"
+
+
+def _upload(content: bytes = CONTENT, filename: str = "annex.pdf") -> FileStorage:
+    return FileStorage(io.BytesIO(content), filename=filename)
+
+
+@pytest.fixture
+def local_storage(tmp_path):
+    return LocalStorage(str(tmp_path))
+
+
+@pytest.fixture
+def s3_storage(monkeypatch):
+    for name in ("AWS_ACCESS_KEY_ID", "AWS_SECRET_ACCESS_KEY", "AWS_SECURITY_TOKEN", "AWS_SESSION_TOKEN"):
+        monkeypatch.setenv(name, "testing")
+    with moto.mock_s3():
+        storage = S3Storage(BUCKET, region_name="us-east-1")
+        storage.client.create_bucket(Bucket=BUCKET)
+        yield storage
+
+
+@pytest.fixture(params=["local", "s3"])
+def storage(request):
+    return request.getfixturevalue(f"{request.param}_storage")
+
+
+@pytest.fixture
+def storage_app(local_storage, monkeypatch):
+    # the session is never flushed, the commit and rollback events run without a database
+    monkeypatch.setitem(app.config, "ANNEX_PROCESSING_ENABLED", False)
+    with app.app_context():
+        app.extensions["storage"] = local_storage
+        yield app
+        db.session.remove()
+        app.extensions.pop("storage", None)
+
+
+def _read(storage, key: str) -> bytes:
+    stream = storage.open(key)
+    try:
+        return stream.read()
+    finally:
+        stream.close()
+
+
+def test_stage(storage):
+    stored_file = storage.stage(_upload())
+
+    assert stored_file.key == KEY
+    assert stored_file.size == len(CONTENT)
+    assert os.path.isfile(stored_file.staged_path)
+    assert not storage.exists(KEY)
+
+
+def test_promote(storage):
+    stored_file = storage.stage(_upload())
+    staged_path = stored_file.staged_path
+
+    storage.promote(stored_file)
+
+    assert storage.exists(KEY)
+    assert _read(storage, KEY) == CONTENT
+    assert stored_file.staged_path is None
+    assert not os.path.exists(staged_path)
+    assert [key for key, _, _ in storage.iter_keys()] == [KEY]
+
+
+def test_discard(storage):
+    stored_file = storage.stage(_upload())
+
+    storage.discard(stored_file)
+
+    assert not os.path.exists(stored_file.staged_path)
+    assert not storage.exists(KEY)
+
+
+def test_promote_existing_key_refreshes_modified_at(storage):
+    storage.promote(storage.stage(_upload()))
+    [(_, _, first_modified_at)] = storage.iter_keys()
+
+    time.sleep(1.1)
+    duplicate = storage.stage(_upload(filename="copy.pdf"))
+    staged_path = duplicate.staged_path
+    storage.promote(duplicate)
+
+    [(key, size, modified_at)] = storage.iter_keys()
+    assert (key, size) == (KEY, len(CONTENT))
+    assert modified_at > first_modified_at
+    assert not os.path.exists(staged_path)
+
+
+def test_quarantine(storage):
+    storage.promote(storage.stage(_upload()))
+
+    storage.quarantine(KEY)
+
+    assert not storage.exists(KEY)
+    assert list(storage.iter_keys()) == []
+
+
+def test_local_promote_is_readable_by_the_proxy(local_storage):
+    local_storage.promote(local_storage.stage(_upload()))
+
+    assert os.stat(local_storage.path(KEY)).st_mode & 0o777 == 0o644
+
+
+def test_s3_url(s3_storage):
+    s3_storage.promote(s3_storage.stage(_upload()))
+
+    url = s3_storage.url(KEY)
+
+    assert BUCKET in url and KEY in url
+
+
+def test_commit_promotes_staged_uploads(storage_app, local_storage):
+    promoted = list()
+
+    def on_promoted(sender, stored_file, **kwargs):
+        promoted.append(stored_file.key)
+
+    with upload_promoted.connected_to(on_promoted):
+        db.session.begin()
+        stored_file = stage_upload(_upload())
+        assert not local_storage.exists(KEY)
+        db.session.commit()
+
+    assert local_storage.exists(KEY)
+    assert stored_file.staged_path is None
+    assert promoted == [KEY]
+
+
+def test_rollback_discards_staged_uploads(storage_app, local_storage):
+    db.session.begin()
+    stored_file = stage_upload(_upload())
+    db.session.rollback()
+
+    assert not os.path.exists(stored_file.staged_path)
+    assert not local_storage.exists(KEY)
+    assert list(local_storage.iter_staged()) == []
+
+
+def test_commit_deduplicates_uploads(storage_app, local_storage):
+    db.session.begin()
+    first = stage_upload(_upload(filename="a.pdf"))
+    second = stage_upload(_upload(filename="b.pdf"))
+    db.session.commit()
+
+    assert first.key == second.key == KEY
+    assert [key for key, _, _ in local_storage.iter_keys()] == [KEY]
+    assert list(local_storage.iter_staged()) == []